@@ -1,13 +1,15 @@
 import os
 import random
 
-import bitstring
-import treelib
-
 import circuit
 import config
 import crypto_utils
+import flexor
+import gcfile
+import gf128
 import label
+import parallel
+import tracing
 
 
 class Alice:
@@ -24,71 +26,318 @@ class Alice:
         # a mapping of encrypted values to entry pairs. We cache this so that, if point-and-permute is enabled we can
         # sort encrypted values according to their select bits without having to decrypt. We intentionally garble
         # gates separately from permuting gates, and do it after encryption, to match the accompanying written
-        # tutorial.
+        # tutorial. Unused when garbling in a single pass (see config.USE_SINGLE_PASS_PERMUTE).
         self.encrypted_entries = dict()
 
+        # the pseudorandom generator from which Alice derives fresh wire labels. Its seed is secret!
+        self.label_generator = label.LabelGenerator()
+
         # the random R value for free-XOR. Only used if free-XOR is enabled
 
         if config.USE_FREE_XOR:
+            # R is a 128-bit integer whose last bit is 1, so that XORing a label with R flips its point-and-permute bit
             if config.USE_POINT_PERMUTE:
-                self.R = bitstring.Bits(bytes=os.urandom(16))
+                self.R = int.from_bytes(os.urandom(16), 'big') | 1
             else:
                 # if we are using free-xor and NOT using point-and-permute, we need to to make sure R has the proper
                 # zero bits just like the labels, otherwise things get messed up!
-                self.R = bitstring.Bits(bytes=bytes(config.CLASSIC_SECURITY_PARAMETER)) + bitstring.Bits(
-                    bytes=os.urandom(16 - config.CLASSIC_SECURITY_PARAMETER))
+                self.R = int.from_bytes(os.urandom(16 - config.CLASSIC_SECURITY_PARAMETER), 'big') | 1
             config.R = self.R
-            print("ALICE: Generating random R = {}".format(self.R.hex))
+            tracing.log(tracing.SUMMARY, "ALICE: Generating random R = {:032x}", self.R)
+
+        # the random offsets Delta_c of each offset class for FleXOR, generated once the circuit is known. Secret, too!
+        self.deltas = []
+
+        # Alice's half of the precomputed random OTs, if Bob's input labels are transferred with them
+        self.ot_pool = None
+
+        # the largest number of wires whose labels Alice held at once while garbling, with wire liveness
+        self.peak_live_wires = None
+
+    '''
+    Returns the offset between the two labels of wire w: R under free-XOR, the offset of the wire's class under 
+    FleXOR, or None if the two labels of the wire are unrelated.
+    '''
+
+    def wire_delta(self, w):
+        if config.USE_FREE_XOR:
+            return self.R
+        if config.USE_FLEXOR:
+            return self.deltas[self.circuit.offsets[w]]
+        return None
+
+    '''
+    Generate labels for every input wire. Input wires have ids 0..n-1, so this takes a single bulk AES call.
+    '''
 
     def generate_labels(self):
-        for w in self.circuit.wires:
-            self.wire_labels[w] = label.generate_pair()
-            print("ALICE: Generating labels for wire {}: 0 = {}, 1 = {}".format(w, self.wire_labels[w][0],
-                                                                                self.wire_labels[w][1]))
+        # all input wires share the same offset, whichever optimizations are enabled
+        delta = self.wire_delta(0) if self.circuit.input_wires else None
+        pairs = self.label_generator.pairs(0, len(self.circuit.input_wires), delta)
+        for w in self.circuit.input_wires:
+            self.wire_labels[w] = pairs[w]
+            tracing.log(tracing.GATE, "ALICE: Generating labels for wire {}: 0 = {}, 1 = {}", self.circuit.wires[w],
+                        self.wire_labels[w][0], self.wire_labels[w][1])
 
     '''
-    Generate labels for wires, and garble gates accordingly. We do this by recursively garbling the current gate's
-    two parent gates, and then garbling the current gate.
+    Generate labels for wires, and garble gates accordingly. We first generate fresh labels for every input wire, and 
+    then garble the gates one by one in topological order.
     
     In the writeup, we generate labels (in no specific order) for each wire, and once all labels are generated THEN 
     we garble the gates (in no specific order) according to these labels. In this implementation, however, 
-    we generate labels and garble gates at the same time, and we do so in an ordered depth-first fashion. 
+    we generate labels for the output wire of each gate at the same time as we garble it.
     
     The reason for this discrepancy is that when Free-XOR is enabled, an XOR gate's output wire labels depend on the 
     input wire labels. And those input wires may be the output wires for another gate, and so on and so forth. This 
     imposes a dependency structure on the circuit in which gates cannot be garbled until their preceding gates have been 
-    garbled. Therefore, we cannot generate labels and garble gates in any order we like; a hierarchical label 
-    generation/garbling process is required. '''
+    garbled. Fortunately, the circuit keeps its gates in topological order, so a single linear pass over the gates 
+    always garbles a gate after the gates driving its inputs. The gates of a dependency layer may also be garbled 
+    by several processes at once (see parallel.py). '''
 
     def garble_gates(self):
-        self.garble_gate(self.circuit.tree.root)
+        self.prepare_labels()
+
+        if config.USE_PARALLEL_GARBLING:
+            parallel.garble(self)
+            return
+
+        if config.USE_BATCHED_GARBLING:
+            layers = self.circuit.layers()
+            dead = self.circuit.dead_wires(layers) if config.USE_WIRE_LIVENESS else None
+            for i, layer in enumerate(layers):
+                self.garble_layer(layer)
+                if dead is not None:
+                    self.drop_labels(dead[i])
+            self.report_liveness()
+            return
+
+        # Choose the garbling method for each kind of gate once, up front, instead of re-checking the configuration
+        # for every gate. The loop below then costs a single lookup and call per gate, and since it is a plain loop
+        # rather than a recursion, circuits of any depth can be garbled.
+        garblers = {op: self.gate_garbler(op) for op in {gate.op for gate in self.circuit.gates}}
+        wire_labels = self.wire_labels
+        if config.USE_WIRE_LIVENESS:
+            dead = self.circuit.dead_wires()
+            for i, gate in enumerate(self.circuit.gates):
+                garblers[gate.op](gate, wire_labels[gate.in1_id], wire_labels[gate.in2_id])
+                self.drop_labels(dead[i])
+            self.report_liveness()
+            return
+        for gate in self.circuit.gates:
+            garblers[gate.op](gate, wire_labels[gate.in1_id], wire_labels[gate.in2_id])
+
+    '''
+    Make room for the labels of every wire, assign offset classes under FleXOR, and generate the labels of the input 
+    wires, so that gates can be garbled. With wire liveness, the labels of a wire are dropped as soon as no gate left 
+    to garble needs them (see Circuit.dead_wires), so there is only room for the labels of live wires.
+    '''
+
+    def prepare_labels(self):
+        if config.USE_WIRE_LIVENESS:
+            # labels come and go as wires come alive and die, so they are kept by wire id rather than in a list as
+            # long as the circuit
+            self.wire_labels = dict()
+            self.peak_live_wires = 0
+        else:
+            self.wire_labels = [None] * len(self.circuit.wires)
+        if config.USE_FLEXOR:
+            self.assign_offsets()
+        self.generate_labels()
+
+    '''
+    Garble the circuit as a stream: a generator of (gate id, garbled table) pairs, in the order in which Bob should 
+    evaluate them (see Bob.evaluate_stream), which garbles each gate only when Bob asks for its table. Gates are 
+    garbled in topological order, or one layer at a time with batched garbling. The labels of the input wires must 
+    already have been generated (see prepare_labels).
+
+    The tables are handed over rather than kept: once a table has been yielded, its gate no longer holds it, so that 
+    only the tables in flight (at most one layer's worth) are ever in memory, however large the circuit. Requires 
+    single-pass garbling, since a table must be in its final order by the time it is sent.
+    '''
+
+    def garble_stream(self):
+        if config.USE_BATCHED_GARBLING:
+            layers = self.circuit.layers()
+            dead = self.circuit.dead_wires(layers) if config.USE_WIRE_LIVENESS else None
+            for i, layer in enumerate(layers):
+                self.garble_layer(layer)
+                if dead is not None:
+                    self.drop_labels(dead[i])
+                for gate in layer:
+                    table, gate.table = gate.table, None
+                    yield gate.id, table
+            self.report_liveness()
+            return
+
+        garblers = {op: self.gate_garbler(op) for op in {gate.op for gate in self.circuit.gates}}
+        wire_labels = self.wire_labels
+        dead = self.circuit.dead_wires() if config.USE_WIRE_LIVENESS else None
+        for i, gate in enumerate(self.circuit.gates):
+            garblers[gate.op](gate, wire_labels[gate.in1_id], wire_labels[gate.in2_id])
+            if dead is not None:
+                self.drop_labels(dead[i])
+            table, gate.table = gate.table, None
+            yield gate.id, table
+        self.report_liveness()
+
+    '''
+    Drop the labels of the given dead wires, keeping track of the largest number of wires whose labels were ever held 
+    at once.
+    '''
+
+    def drop_labels(self, wires):
+        if len(self.wire_labels) > self.peak_live_wires:
+            self.peak_live_wires = len(self.wire_labels)
+        for w in wires:
+            del self.wire_labels[w]
+
+    '''
+    Report how many wires had live labels at once, with wire liveness.
+    '''
+
+    def report_liveness(self):
+        if config.USE_WIRE_LIVENESS:
+            tracing.log(tracing.SUMMARY, "ALICE: At most {} of the circuit's {} wires had live labels at once",
+                        self.peak_live_wires, len(self.circuit.wires))
 
     '''
-    Recursively garble a gate. Returns a pair label of labels corresponding to the gate's output wire. 
-    This method is similar to the evaluator's recursive evaluation method; both traverse the tree in the same way.
+    Garble a single gate, whose input wires must already have labels. Returns the pair of labels corresponding to the 
+    gate's output wire. 
     '''
 
-    def garble_gate(self, wire):
-        gate_node = self.circuit.tree.get_node(wire)
+    def garble_gate(self, gate):
+        return self.gate_garbler(gate.op)(gate, self.wire_labels[gate.in1_id], self.wire_labels[gate.in2_id])
+
+    '''
+    Returns the method used to garble gates with the given operation, according to the enabled optimizations.
+    '''
+
+    def gate_garbler(self, op):
+        if op == 'XOR' and config.USE_FREE_XOR:
+            return self.garble_gate_free_XOR
+        elif op == 'XOR' and config.USE_FLEXOR:
+            return self.garble_gate_flexor_XOR
+        elif config.USE_HALF_AND and op in ('AND', 'OR'):
+            return self.garble_gate_half_and
+        elif config.USE_GRR2 and op in ('AND', 'OR'):
+            return self.garble_gate_grr2
+        elif config.USE_GRR3:
+            return self.garble_gate_grr3
+        else:
+            return self.garble_gate_standard
+
+    '''
+    Garble an entire dependency layer of the circuit at once. Requires fixed-key AES.
 
-        # in the tree, gates are identified by the identifiers of their output wires.
-        # if the gate corresponding to this wire exists, evaluate it recursively,
-        # otherwise the wire must be an input wire
-        if gate_node:
-            gate = gate_node.data
-            in1_labels = self.garble_gate(gate.in1)
-            in2_labels = self.garble_gate(gate.in2)
+    Since no gate in a layer depends on another, every row of every gate in the layer can be garbled independently. 
+    We first derive the labels of free-XOR gates (which need no encryption at all), then collect the input label pairs 
+    of all four rows of every other gate, and compute all of their pads H(A, B, T) with a single bulk AES call. The 
+    tables are then filled in exactly as garble_gate_standard and garble_gate_grr3 would fill them.
+    '''
+
+    def garble_layer(self, layer):
+        garbled_gates = []
+        keys = []
+        for gate in layer:
+            in1_labels = self.wire_labels[gate.in1_id]
+            in2_labels = self.wire_labels[gate.in2_id]
             if gate.op == 'XOR' and config.USE_FREE_XOR:
-                return self.garble_gate_free_XOR(gate, in1_labels, in2_labels)
-            elif config.USE_GRR3:
-                return self.garble_gate_grr3(gate, in1_labels, in2_labels)
+                self.garble_gate_free_XOR(gate, in1_labels, in2_labels)
+            elif gate.op == 'XOR' and config.USE_FLEXOR:
+                # translations cost at most two hashes, so FleXOR gates are not worth batching
+                self.garble_gate_flexor_XOR(gate, in1_labels, in2_labels)
+            elif config.USE_HALF_AND and gate.op in ('AND', 'OR'):
+                # the four hashes H(A0, j), H(A1, j), H(B0, j'), H(B1, j') needed by the two halves
+                garbled_gates.append(gate)
+                keys.append((in1_labels[0], 0, 2 * gate.id))
+                keys.append((in1_labels[1], 0, 2 * gate.id))
+                keys.append((in2_labels[0], 0, 2 * gate.id + 1))
+                keys.append((in2_labels[1], 0, 2 * gate.id + 1))
+            else:
+                garbled_gates.append(gate)
+                for selection in [(0, 0), (0, 1), (1, 0), (1, 1)]:
+                    keys.append((in1_labels[selection[0]], in2_labels[selection[1]], gate.id))
+
+        tracing.log(tracing.GATE, "ALICE: Garbling {} gates ({} rows) of a layer with a single AES call",
+                    len(garbled_gates), len(keys))
+        pads = crypto_utils.fixed_key_hash_batch(keys)
+        for i, gate in enumerate(garbled_gates):
+            if config.USE_HALF_AND and gate.op in ('AND', 'OR'):
+                self.garble_gate_half_and(gate, self.wire_labels[gate.in1_id], self.wire_labels[gate.in2_id],
+                                          pads[4 * i:4 * i + 4])
+            elif config.USE_GRR2 and gate.op in ('AND', 'OR'):
+                self.garble_gate_grr2(gate, self.wire_labels[gate.in1_id], self.wire_labels[gate.in2_id],
+                                      pads[4 * i:4 * i + 4])
             else:
-                return self.garble_gate_standard(gate, in1_labels, in2_labels)
+                self.fill_table(gate, pads[4 * i:4 * i + 4])
+
+    '''
+    Fill in the garbled table of a gate, given the pads H(A, B, T) of its four rows, in the order (0, 0), (0, 1), 
+    (1, 0), (1, 1). Each row is the output label XORed with its pad. With GRR3, the pad of the row whose select bits 
+    are both zero is itself used as an output label, so that row need not be sent.
+    '''
+
+    def fill_table(self, gate, pads):
+        in1_labels = self.wire_labels[gate.in1_id]
+        in2_labels = self.wire_labels[gate.in2_id]
+        slots = self.start_table(gate, in1_labels, in2_labels)
+        zero_row = None
+        if config.USE_GRR3:
+            zero_row = (int(in1_labels[1].pp_bit == 0), int(in2_labels[1].pp_bit == 0))
+            zero_label = label.Label(pads[2 * zero_row[0] + zero_row[1]])
+            delta = self.wire_delta(gate.out_id)
+            if delta is not None:
+                zero_label_other = zero_label ^ delta
+            else:
+                zero_label_other = self.label_generator.label(gate.out_id, zero_label.pp_bit ^ 1)
+            zero_label_value = gate.run(zero_row[0], zero_row[1])
+            out_labels = [None] * 2
+            out_labels[zero_label_value] = zero_label
+            out_labels[not zero_label_value] = zero_label_other
+        else:
+            out_labels = self.label_generator.pair(gate.out_id, self.wire_delta(gate.out_id))
+        self.wire_labels[gate.out_id] = out_labels
+
+        for i, selection in enumerate([(0, 0), (0, 1), (1, 0), (1, 1)]):
+            if selection != zero_row:
+                lout = out_labels[gate.run(selection[0], selection[1])]
+                encrypted_label = lout.value ^ pads[i]
+                self.add_row(gate, slots, i, in1_labels[selection[0]], in2_labels[selection[1]], encrypted_label)
+        return out_labels
+
+    '''
+    Start the garbled table of a gate. When garbling in a single pass, the table starts out with an empty slot for 
+    each row, and we return the slot of each row, in the order (0, 0), (0, 1), (1, 0), (1, 1): with point-and-permute, 
+    the slot given by the select bits of its input labels (shifted by one with GRR3, since the row whose select bits 
+    are both zero is never sent), and otherwise a random slot. Otherwise, the table starts out empty and rows are 
+    appended to it, to be permuted later by permute_entries, and we return None.
+    '''
+
+    def start_table(self, gate, in1_labels, in2_labels):
+        if not config.USE_SINGLE_PASS_PERMUTE:
+            gate.table = []
+            return None
+        if config.USE_POINT_PERMUTE:
+            shift = 1 if config.USE_GRR3 else 0
+            gate.table = [None] * (4 - shift)
+            return [2 * in1_labels[s1].pp_bit + in2_labels[s2].pp_bit - shift
+                    for s1, s2 in [(0, 0), (0, 1), (1, 0), (1, 1)]]
+        gate.table = [None] * 4
+        return random.sample(range(4), 4)
+
+    '''
+    Add the encrypted row i of a gate, whose input labels are l1, l2, to its garbled table: directly into its slot 
+    when garbling in a single pass, and otherwise at the end of the table, remembering its input labels so that 
+    permute_entries can sort the table later.
+    '''
+
+    def add_row(self, gate, slots, i, l1, l2, encrypted_label):
+        if slots is not None:
+            gate.table[slots[i]] = encrypted_label
+            tracing.log(tracing.ROW, "    Placing it in slot {} of the table", slots[i])
         else:
-            labels = label.generate_pair()
-            self.wire_labels[wire] = labels
-            print("ALICE: Generating labels for wire {}: 0 = {}, 1 = {}".format(wire, labels[0], labels[1]))
-            return labels  # wire is an input wire, so just generate a fresh pair of labels
+            self.encrypted_entries[encrypted_label] = (l1, l2)  # cache ciphertext -> keys, to make it easier to p&p
+            gate.table.append(encrypted_label)
 
     '''
     Garble a gate using the GRR3 optimization. Compatible with Free-XOR. 
@@ -97,38 +346,37 @@ class Alice:
     '''
 
     def garble_gate_grr3(self, gate, in1_labels, in2_labels):
-        print("ALICE: Garbling gate {} ".format(gate))
-        gate.table = []
+        tracing.log(tracing.GATE, "ALICE: Garbling gate {} ", gate)
+        slots = self.start_table(gate, in1_labels, in2_labels)
 
         # grab the input labels that will be placed first in the table
         in1_zero_pp = in1_labels[0] if in1_labels[0].pp_bit == 0 else in1_labels[1]
         in2_zero_pp = in2_labels[0] if in2_labels[0].pp_bit == 0 else in2_labels[1]
-        print("ALICE: Generating zero label for labels {}, {}".format(in1_zero_pp, in2_zero_pp))
-        zero_label = label.from_bitstring(
-            crypto_utils.decrypt(in2_zero_pp, crypto_utils.decrypt(in1_zero_pp, bitstring.Bits(128))))
-        print("ALICE: Found c = {}, where that 0^N encrypted under {}, {} = c".format(zero_label, in1_zero_pp, in2_zero_pp))
+        tracing.log(tracing.ROW, "ALICE: Generating zero label for labels {}, {}", in1_zero_pp, in2_zero_pp)
+        zero_label = label.Label(crypto_utils.ungarble(in1_zero_pp, in2_zero_pp, gate.id, 0))
+        tracing.log(tracing.ROW, "ALICE: Found c = {}, where that 0^N encrypted under {}, {} = c", zero_label, in1_zero_pp,
+                    in2_zero_pp)
 
         # Compute the underlying value of the zero label. Since label objects don't track their underlying semantic
         # value, we have do this in a slightly roundabout wy
         zero_label_value = gate.run(in1_labels.index(in1_zero_pp), in2_labels.index(in2_zero_pp))
 
-        # manually generate the other output label
-        if config.USE_FREE_XOR:
-            zero_label_other = label.from_bitstring(zero_label.to_bitstring() ^ self.R)
+        # manually generate the other output label, whose point&permute bit needs to be the opposite of the zero
+        # label--whatever its one is. With free-XOR (or FleXOR), this is taken care of by the last bit of the offset.
+        delta = self.wire_delta(gate.out_id)
+        if delta is not None:
+            zero_label_other = zero_label ^ delta
         else:
-            zero_label_other = label.from_bitstring(bitstring.BitArray(bytes=os.urandom(16)))
-
-        # fix the other label point&permute bit, which needs to be the opposite of the zero label--whatever its one is
-        zero_label_other.pp_bit = not zero_label.pp_bit
+            zero_label_other = self.label_generator.label(gate.out_id, zero_label.pp_bit ^ 1)
 
         out_labels = [None] * 2
 
         out_labels[zero_label_value] = zero_label
         out_labels[not zero_label_value] = zero_label_other
-        self.wire_labels[gate.out] = out_labels
+        self.wire_labels[gate.out_id] = out_labels
 
         # now we proceed in a very similar way to the vanilla garbling
-        for selection in [(0, 0), (0, 1), (1, 0), (1, 1)]:  # for each possible input configuration...
+        for i, selection in enumerate([(0, 0), (0, 1), (1, 0), (1, 1)]):  # for each possible input configuration...
             # grab the labels corresponding to that configuration
             l1 = in1_labels[selection[0]]
             l2 = in2_labels[selection[1]]
@@ -136,43 +384,212 @@ class Alice:
             if l1 != in1_zero_pp or l2 != in2_zero_pp:
                 output_bit = gate.run(selection[0], selection[1])
                 lout = out_labels[output_bit]
-                print(
-                    "    Encrypting label {} with {}, {}, for {} = {} {} {}".format(lout, l1, l2, output_bit,
-                                                                                    selection[0], gate.op,
-                                                                                    selection[1]))
-                encrypted_label = crypto_utils.encrypt(l1, crypto_utils.encrypt(l2, lout))
-                self.encrypted_entries[encrypted_label] = (l1, l2)  # cache ciphertext -> keys, to make it easier to p&p
-                print("    Encrypted label: " + str(encrypted_label.hex))
-                gate.table.append(encrypted_label)
+                tracing.log(tracing.ROW, "    Encrypting label {} with {}, {}, for {} = {} {} {}", lout, l1, l2, output_bit,
+                            selection[0], gate.op, selection[1])
+                encrypted_label = crypto_utils.garble(l1, l2, gate.id, lout)
+                tracing.log(tracing.ROW, "    Encrypted label: {:032x}", encrypted_label)
+                self.add_row(gate, slots, i, l1, l2, encrypted_label)
+        return out_labels
+
+    '''
+    Garble an AND or OR gate using GRR2 (Pinkas, Schneider, Smart and Williams, "Secure Two-Party Computation Is 
+    Practical"). Requires point-and-permute, and produces only two ciphertexts per gate, plus four bits.
+
+    The pad K_x of each row is seen as a point (x, K_x) in the field GF(2^128), where x = 1 + 2 * (select bit of the 
+    first label) + (select bit of the second label). Three of the four rows share the same output value (the 
+    "majority" rows), and the other row is the "minority" row:
+     - the majority rows define a polynomial P of degree 2; the output label for the majority value is P(0),
+     - the minority row, together with (5, P(5)) and (6, P(6)), defines another polynomial Q of degree 2; the output 
+       label for the minority value is Q(0).
+    Only P(5) and P(6) are sent. Whatever row Bob is in, he interpolates his own point with (5, P(5)) and (6, P(6)) 
+    and evaluates the result at 0, which gives him P(0) or Q(0) without knowing which. 
+
+    Since both output labels are fixed by the pads, they cannot share the free-XOR offset, and their last bits are 
+    random. Alice overwrites the last bit of each with a point-and-permute bit, and sends the point-and-permute bit of 
+    the output of each row, masked with the last bit of the row's pad, in the four extra bits. Under FleXOR, the 
+    offset of the output wire's class is simply whatever the difference between the two labels turns out to be.
+
+    The four pads, in the order (0, 0), (0, 1), (1, 0), (1, 1), may be supplied if they have already been computed in 
+    bulk.
+    '''
+
+    def garble_gate_grr2(self, gate, in1_labels, in2_labels, pads=None):
+        tracing.log(tracing.GATE, "ALICE: Garbling gate {} with GRR2", gate)
+        selections = [(0, 0), (0, 1), (1, 0), (1, 1)]
+        if pads is None:
+            pads = [crypto_utils.ungarble(in1_labels[s1], in2_labels[s2], gate.id, 0) for s1, s2 in selections]
+
+        # the point, mask bit and output value of each row, indexed by x - 1
+        rows = [None] * 4
+        for pad, (s1, s2) in zip(pads, selections):
+            x = 1 + 2 * in1_labels[s1].pp_bit + in2_labels[s2].pp_bit
+            rows[x - 1] = (x, pad & ~1, pad & 1, gate.run(s1, s2))
+        majority_value = int(sum(row[3] for row in rows) >= 2)
+        majority = [(x, k) for x, k, mask, value in rows if value == majority_value]
+        minority = [(x, k) for x, k, mask, value in rows if value != majority_value]
+
+        p5 = gf128.interpolate(majority, 5)
+        p6 = gf128.interpolate(majority, 6)
+        majority_label = gf128.interpolate(majority, 0)
+        minority_label = gf128.interpolate(minority + [(5, p5), (6, p6)], 0)
+
+        # a random point-and-permute bit for the majority label, taken from Alice's generator
+        majority_pp_bit = self.label_generator.label(gate.out_id, 0).value >> 127
+        out_labels = [None] * 2
+        out_labels[majority_value] = label.Label((majority_label & ~1) | majority_pp_bit)
+        out_labels[1 - majority_value] = label.Label((minority_label & ~1) | (majority_pp_bit ^ 1))
+        if config.USE_FLEXOR:
+            self.deltas[self.circuit.offsets[gate.out_id]] = out_labels[0].value ^ out_labels[1].value
+
+        masked_pp_bits = 0
+        for x, k, mask, value in rows:
+            masked_pp_bits |= (out_labels[value].pp_bit ^ mask) << (x - 1)
+
+        tracing.log(tracing.GATE, "ALICE: Generating labels for wire {}: 0 = {}, 1 = {}", gate.out, out_labels[0],
+                    out_labels[1])
+        tracing.log(tracing.ROW, "    P(5) = {:032x}, P(6) = {:032x}, masked select bits {:04b}", p5, p6, masked_pp_bits)
+        gate.table = [p5, p6, masked_pp_bits]
+        self.wire_labels[gate.out_id] = out_labels
         return out_labels
     '''
     Garble a XOR gate using the free-XOR technique. 
     '''
 
     def garble_gate_free_XOR(self, gate, in1_labels, in2_labels):
-        out_labels = label.generate_pair()
-        print("ALICE: Generating labels for wire {}: 0 = {}, 1 = {}".format(gate.out, out_labels[0], out_labels[1]))
-        out_labels[0].bits = in1_labels[0].bits ^ in2_labels[0].bits
-        out_labels[1].bits = out_labels[0].bits ^ self.R
-        out_labels[0].pp_bit = in1_labels[0].pp_bit ^ in2_labels[0].pp_bit
-        out_labels[1].pp_bit = in1_labels[0].pp_bit ^ in2_labels[0].pp_bit ^ True
-        self.wire_labels[gate.out] = out_labels
+        gate.table = []  # nothing to send!
+        zero_label = in1_labels[0] ^ in2_labels[0]
+        out_labels = (zero_label, zero_label ^ self.R)
+        if config.TRACE_LEVEL >= tracing.GATE:
+            tracing.log(tracing.GATE, "ALICE: Generating labels for wire {}: 0 = {}, 1 = {}", gate.out, out_labels[0],
+                        out_labels[1])
+        self.wire_labels[gate.out_id] = out_labels
         return out_labels
 
+    '''
+    Garble an AND gate using half-gates (Zahur, Rosulek and Evans, "Two Halves Make a Whole"). Requires free-XOR and 
+    point-and-permute, and produces only two ciphertexts per gate instead of four (or three with GRR3).
+
+    The AND gate c = a AND b is split into two "half gates", each of which has one input known to one party:
+     - the generator half computes a AND r for a bit r known to Alice (namely the select bit of b's zero label),
+     - the evaluator half computes a AND (r XOR b), where Bob knows r XOR b (namely the select bit of his label for b).
+    XORing the two halves gives a AND b. Thanks to point-and-permute, each half needs only one ciphertext, T_G and T_E 
+    respectively, and thanks to free-XOR, combining the halves is free.
+
+    OR gates are garbled as a OR b = NOT(NOT a AND NOT b). Under free-XOR, negating a wire just swaps its two labels, 
+    so we garble an AND gate with the input labels swapped, and swap the resulting output labels.
+
+    The four hashes H(A0, j), H(A1, j), H(B0, j'), H(B1, j') may be supplied if they have already been computed in bulk.
+    '''
+
+    def garble_gate_half_and(self, gate, in1_labels, in2_labels, hashes=None):
+        tracing.log(tracing.GATE, "ALICE: Garbling gate {} with half-gates", gate)
+        if gate.op == 'OR':
+            in1_labels = (in1_labels[1], in1_labels[0])
+            in2_labels = (in2_labels[1], in2_labels[0])
+            if hashes is not None:
+                hashes = (hashes[1], hashes[0], hashes[3], hashes[2])
+
+        a0, a1 = in1_labels
+        b0, b1 = in2_labels
+        j = 2 * gate.id
+        j_prime = 2 * gate.id + 1
+        if hashes is None:
+            hashes = (crypto_utils.hash_label(a0, j), crypto_utils.hash_label(a1, j),
+                      crypto_utils.hash_label(b0, j_prime), crypto_utils.hash_label(b1, j_prime))
+        ha0, ha1, hb0, hb1 = hashes
+        pa = a0.pp_bit
+        pb = b0.pp_bit
+
+        # the generator half
+        t_g = ha0 ^ ha1 ^ (self.R if pb else 0)
+        w_g = ha0 ^ (t_g if pa else 0)
+
+        # the evaluator half
+        t_e = hb0 ^ hb1 ^ a0.value
+        w_e = hb0 ^ (t_e ^ a0.value if pb else 0)
+
+        zero_label = label.Label(w_g ^ w_e)
+        out_labels = (zero_label, zero_label ^ self.R)
+        if gate.op == 'OR':
+            out_labels = (out_labels[1], out_labels[0])
+        tracing.log(tracing.GATE, "ALICE: Generating labels for wire {}: 0 = {}, 1 = {}", gate.out, out_labels[0],
+                    out_labels[1])
+        tracing.log(tracing.ROW, "    Generator half: T_G = {:032x}", t_g)
+        tracing.log(tracing.ROW, "    Evaluator half: T_E = {:032x}", t_e)
+        gate.table = [t_g, t_e]
+        self.wire_labels[gate.out_id] = out_labels
+        return out_labels
+
+    '''
+    Assign an offset class to every wire for FleXOR, and generate a random offset for each class. The classes are 
+    stored with the circuit, since they are public and Bob needs them too.
+    '''
+
+    def assign_offsets(self):
+        self.circuit.offsets = flexor.assign_offsets(self.circuit)
+        counts = flexor.ciphertext_counts(self.circuit, self.circuit.offsets)
+        self.deltas = [int.from_bytes(os.urandom(16), 'big') | 1 for _ in range(counts['classes'])]
+        tracing.log(tracing.SUMMARY, "ALICE: FleXOR assigns wires to {} offset classes; {} XOR gates are free, the others "
+                                     "need {} translation ciphertexts in total", counts['classes'],
+                    counts['free_xor_gates'], counts['translation_ciphertexts'])
+        tracing.log(tracing.SUMMARY, "ALICE: Garbling takes {} ciphertexts with FleXOR, instead of {} without",
+                    counts['flexor_ciphertexts'], counts['conventional_ciphertexts'])
+
+    '''
+    Garble a XOR gate using FleXOR. Any input wire whose offset class differs from the output wire's class is first 
+    translated into the output's class, with one ciphertext per translation. The output labels are then simply the 
+    XOR of the (translated) input labels, just like free-XOR.
+    '''
+
+    def garble_gate_flexor_XOR(self, gate, in1_labels, in2_labels):
+        tracing.log(tracing.GATE, "ALICE: Garbling gate {} with FleXOR", gate)
+        delta = self.wire_delta(gate.out_id)
+        gate.table = []
+        translate1, translate2 = flexor.translations(gate, self.circuit.offsets)
+        if translate1:
+            in1_labels = self.translate(in1_labels, delta, 2 * gate.id, gate.table)
+        if translate2:
+            in2_labels = self.translate(in2_labels, delta, 2 * gate.id + 1, gate.table)
+        zero_label = in1_labels[0] ^ in2_labels[0]
+        out_labels = (zero_label, zero_label ^ delta)
+        tracing.log(tracing.GATE, "ALICE: Generating labels for wire {}: 0 = {}, 1 = {}", gate.out, out_labels[0],
+                    out_labels[1])
+        self.wire_labels[gate.out_id] = out_labels
+        return out_labels
+
+    '''
+    Translate a pair of labels into a new pair whose labels differ by delta, using a unary garbled gate with a single 
+    ciphertext, which is appended to the given table. The new label for the input label whose select bit is 0 is 
+    simply H(label, tweak), so that row needs no ciphertext (like GRR3); the other row encrypts the other new label.
+    '''
+
+    def translate(self, labels, delta, tweak, table):
+        zero_pp_value = 0 if labels[0].pp_bit == 0 else 1
+        translated = [None] * 2
+        translated[zero_pp_value] = label.Label(crypto_utils.hash_label(labels[zero_pp_value], tweak))
+        translated[1 - zero_pp_value] = translated[zero_pp_value] ^ delta
+        ciphertext = crypto_utils.hash_label(labels[1 - zero_pp_value], tweak) ^ translated[1 - zero_pp_value].value
+        tracing.log(tracing.ROW, "    Translating labels {}, {} to {}, {}: ciphertext {:032x}", labels[0], labels[1],
+                    translated[0], translated[1], ciphertext)
+        table.append(ciphertext)
+        return translated
+
     '''
     Garble a gate using the standard vanilla approach. No frills! 
     '''
 
     def garble_gate_standard(self, gate, in1_labels, in2_labels):
-        print("ALICE: Garbling gate {} ".format(gate))
-        gate.table = []
-        out_labels = label.generate_pair()  # grab us a fresh set of labels
+        tracing.log(tracing.GATE, "ALICE: Garbling gate {} ", gate)
+        slots = self.start_table(gate, in1_labels, in2_labels)
+        # grab us a fresh set of labels
+        out_labels = self.label_generator.pair(gate.out_id, self.wire_delta(gate.out_id))
         if config.USE_GRR3:
             l1 = in1_labels[0] if in1_labels[0].pp_bit == 0 else in1_labels[1]
             l2 = in2_labels[0] if in2_labels[0].pp_bit == 0 else in2_labels[0]
-        print("ALICE: Generating labels for wire {}: 0 = {}, 1 = {}".format(gate.out, out_labels[0], out_labels[1]))
-        self.wire_labels[gate.out] = out_labels
-        for selection in [(0, 0), (0, 1), (1, 0), (1, 1)]:  # for each possible input configuration...
+        tracing.log(tracing.GATE, "ALICE: Generating labels for wire {}: 0 = {}, 1 = {}", gate.out, out_labels[0],
+                    out_labels[1])
+        self.wire_labels[gate.out_id] = out_labels
+        for i, selection in enumerate([(0, 0), (0, 1), (1, 0), (1, 1)]):  # for each possible input configuration...
             # grab the labels corresponding to that configuration
             l1 = in1_labels[selection[0]]
             l2 = in2_labels[selection[1]]
@@ -186,14 +603,11 @@ class Alice:
             else:
                 raise ValueError("Gate {} has an invalid binary operation ({})".format(gate, gate.op))
             lout = out_labels[output_bit]
-            print(
-                "    Encrypting label {} with {}, {}, for {} = {} {} {}".format(lout, l1, l2, output_bit,
-                                                                                selection[0], gate.op,
-                                                                                selection[1]))
-            encrypted_label = crypto_utils.encrypt(l1, crypto_utils.encrypt(l2, lout))
-            self.encrypted_entries[encrypted_label] = (l1, l2)  # cache ciphertext -> keys, to make it easier to p&p
-            print("    Encrypted label: " + str(encrypted_label.hex))
-            gate.table.append(encrypted_label)
+            tracing.log(tracing.ROW, "    Encrypting label {} with {}, {}, for {} = {} {} {}", lout, l1, l2, output_bit,
+                        selection[0], gate.op, selection[1])
+            encrypted_label = crypto_utils.garble(l1, l2, gate.id, lout)
+            tracing.log(tracing.ROW, "    Encrypted label: {:032x}", encrypted_label)
+            self.add_row(gate, slots, i, l1, l2, encrypted_label)
         return out_labels
 
     # Legacy gate garbling function
@@ -225,33 +639,84 @@ class Alice:
     #             print("    Encrypted label: " + str(encrypted_label.hex))
     #             gate.table.append(encrypted_label)
 
-    def permute_entries(self):
-        for gate_id in self.circuit.tree.expand_tree(mode=treelib.Tree.DEPTH):
-            gate = self.circuit.tree.get_node(gate_id).data
+    '''
+    Permute the rows of every garbled table, so that their order doesn't reveal which row encrypts which output: sort 
+    them by the select bits of their input labels with point-and-permute, and shuffle them randomly otherwise. When 
+    garbling in a single pass, the rows were already placed in their slots as they were garbled, so there is nothing 
+    left to do.
+    '''
 
+    def permute_entries(self):
+        if config.USE_SINGLE_PASS_PERMUTE:
+            tracing.log(tracing.GATE, "ALICE: Nothing to permute; every row was placed in its slot as it was garbled")
+            return
+        for gate in self.circuit.gates:
+            if config.USE_HALF_AND and gate.op in ('AND', 'OR'):
+                tracing.log(tracing.GATE, "ALICE: Nothing to permute for gate {}; half-gates tables have a fixed order",
+                            gate)
+            elif config.USE_GRR2 and gate.op in ('AND', 'OR'):
+                tracing.log(tracing.GATE, "ALICE: Nothing to permute for gate {}; GRR2 rows are identified by their "
+                                          "select bits", gate)
+            elif config.USE_FLEXOR and gate.op == 'XOR':
+                tracing.log(tracing.GATE, "ALICE: Nothing to permute for gate {}; FleXOR translations have a fixed "
+                                          "order", gate)
             #  if it is not the case that the gate is XOR AND we are using free-xor, then process normally
-            if not (gate.op == 'XOR' and config.USE_FREE_XOR):
+            elif not (gate.op == 'XOR' and config.USE_FREE_XOR):
                 if config.USE_POINT_PERMUTE:
                     gate.table = sorted(gate.table,
                                         key=lambda entry:
                                         2 * self.encrypted_entries[entry][0].pp_bit + self.encrypted_entries[entry][
                                             1].pp_bit)
-                    print("ALICE: Shuffling garbled table according to select bits. The final order is:")
-                    for e in gate.table:
-                        print("    {}{}: {}".format(int(self.encrypted_entries[e][0].pp_bit),
-                                                    int(self.encrypted_entries[e][1].pp_bit), e.hex))
+                    tracing.log(tracing.GATE, "ALICE: Shuffling garbled table according to select bits. The final "
+                                              "order is:")
+                    if config.TRACE_LEVEL >= tracing.ROW:
+                        for e in gate.table:
+                            tracing.log(tracing.ROW, "    {}{}: {:032x}", self.encrypted_entries[e][0].pp_bit,
+                                        self.encrypted_entries[e][1].pp_bit, e)
                 else:
-                    print("ALICE: Randomly shuffling garbled table for gate " + str(gate))
+                    tracing.log(tracing.GATE, "ALICE: Randomly shuffling garbled table for gate {}", gate)
                     random.shuffle(gate.table)
             else:
-                print("ALICE: Nothing to permute for gate {}; XOR gates under free-XOR have no entries".format(gate))
+                tracing.log(tracing.GATE, "ALICE: Nothing to permute for gate {}; XOR gates under free-XOR have no "
+                                          "entries", gate)
 
-    def reveal_result(self, l):
-        labels = self.wire_labels[self.circuit.tree.root]
+    '''
+    Save the garbled circuit to the file at the given path (see gcfile.py), from which Bob can evaluate it.
+    '''
+
+    def save_garbled(self, path):
+        gcfile.write(path, self)
+
+    '''
+    Returns the two labels of input wire w, regenerated from Alice's seed and the wire id rather than looked up in 
+    wire_labels: with wire liveness, the labels of an input wire are dropped as soon as no gate left to garble needs 
+    them, which when streaming may well be before the OTs of Bob's inputs are done.
+    '''
+
+    def input_labels(self, w):
+        return self.label_generator.pair(w, self.wire_delta(w))
+
+    '''
+    Decode the label Bob computed for output wire w into the boolean value it encodes.
+    '''
+
+    def decode_output(self, w, l):
+        labels = self.wire_labels[w]
         if labels[0] == l:
-            print("Alice reveals the label {} for output wire {} equals: 0".format(l, self.circuit.tree.root))
+            return 0
         elif labels[1] == l:
-            print("Alice reveals the label {} for output wire {} equals: 1".format(l, self.circuit.tree.root))
-        else:
-            raise ValueError("The output label Bob computed, {}, does not match either of the output labels ({}, "
-                             "{}). This should never happen.".format(l, labels[0], labels[1]))
+            return 1
+        raise ValueError("The output label Bob computed, {}, does not match either of the output labels ({}, "
+                         "{}). This should never happen.".format(l, labels[0], labels[1]))
+
+    '''
+    Decode and announce the labels Bob computed for the circuit's output wires. Returns the decoded values.
+    '''
+
+    def reveal_result(self, output_labels):
+        values = []
+        for w, name, l in zip(self.circuit.output_wires, self.circuit.output_names, output_labels):
+            values.append(self.decode_output(w, l))
+            tracing.log(tracing.SUMMARY, "Alice reveals the label {} for output wire {} equals: {}", l, name,
+                        values[-1])
+        return values
@@ -0,0 +1,612 @@
+import argparse
+import asyncio
+import bristol
+import multiprocessing
+import network
+import os
+import overlap
+import random
+import socket
+import tempfile
+import time
+import tracemalloc
+
+import config
+import optimizer
+import ot
+import tracing
+from alice import Alice
+from bob import Bob
+from circuit import Circuit
+from gate import Gate
+from label import Label
+
+'''
+Benchmarks for the garbling and evaluation engines. Unlike main.py, everything here runs without any user interaction,
+and the step-by-step output of the protocol is discarded so that it doesn't dominate the measurements.
+'''
+
+OPS = ['AND', 'OR', 'XOR']
+
+'''
+Generate a random circuit with the given number of gates and input wires.
+
+ - A "chain" circuit is as deep as possible: every gate consumes the output of the previous gate, so the circuit has
+   one level per gate.
+ - A "wide" circuit draws each gate's inputs from anywhere among the input wires and the outputs of earlier gates,
+   which gives a shallow circuit with plenty of fan-out.
+
+Returns the table of output wires -> gates expected by Circuit.build, along with the circuit's output wires.
+'''
+
+
+def random_circuit(num_gates, num_inputs=16, shape='wide', seed=0):
+    rng = random.Random(seed)
+    wires = ['i{}'.format(i) for i in range(num_inputs)]
+    gates = dict()
+    consumed = set()
+    for k in range(num_gates):
+        gate = Gate()
+        gate.op = rng.choice(OPS)
+        gate.out = 'g{}'.format(k)
+        if shape == 'chain':
+            gate.in1 = wires[-1]
+            gate.in2 = wires[rng.randrange(num_inputs)]
+        else:
+            gate.in1 = wires[rng.randrange(len(wires))]
+            gate.in2 = wires[rng.randrange(len(wires))]
+        consumed.add(gate.in1)
+        consumed.add(gate.in2)
+        gates[gate.out] = gate
+        wires.append(gate.out)
+    outputs = [out for out in gates if out not in consumed]
+    return gates, outputs
+
+
+'''
+Garble and evaluate the circuit once, using the optimizations currently enabled in config. The inputs are split
+evenly between Alice and Bob; Bob's labels are handed over directly rather than through OT, since OT is not what we're
+measuring here. Returns the time spent garbling and evaluating, and checks the result against a plain evaluation.
+'''
+
+
+def garble_and_evaluate(circuit):
+    rng = random.Random(1)
+    input_values = [rng.randrange(2) for _ in circuit.input_wires]
+
+    with tracing.at_level(tracing.OFF):
+        alice = Alice()
+        bob = Bob()
+        alice.circuit = circuit
+
+        start = time.perf_counter()
+        alice.garble_gates()
+        alice.permute_entries()
+        garble_time = time.perf_counter() - start
+
+        bob.receive_circuit(circuit)
+        for w, v in zip(circuit.input_wires, input_values):
+            bob.known_labels[w] = alice.input_labels(w)[v]
+
+        start = time.perf_counter()
+        output_labels = bob.evaluate()
+        evaluate_time = time.perf_counter() - start
+
+    result = [alice.decode_output(w, l) for w, l in zip(circuit.output_wires, output_labels)]
+    if result != circuit.run(input_values):
+        raise ValueError("The garbled circuit computed the wrong result")
+    return garble_time, evaluate_time
+
+
+'''
+Time a linear walk over the circuit that does no cryptographic work at all. This is the overhead that the execution
+engine itself adds to every gate.
+'''
+
+
+def walk_overhead(circuit):
+    values = [0] * len(circuit.wires)
+    noop = {op: (lambda gate, a, b: a) for op in OPS}
+    start = time.perf_counter()
+    for gate in circuit.gates:
+        values[gate.out_id] = noop[gate.op](gate, values[gate.in1_id], values[gate.in2_id])
+    return time.perf_counter() - start
+
+
+def engine(args):
+    gates, outputs = random_circuit(args.gates, args.inputs, args.shape)
+    start = time.perf_counter()
+    circuit = Circuit()
+    circuit.build(outputs, gates)
+    build_time = time.perf_counter() - start
+
+    garble_time, evaluate_time = garble_and_evaluate(circuit)
+    overhead = walk_overhead(circuit)
+
+    n = len(circuit.gates)
+    print("{} circuit with {} gates and {} outputs".format(args.shape, n, len(circuit.output_wires)))
+    print("  build:    {:10.3f} s  {:8.2f} us/gate".format(build_time, 1e6 * build_time / n))
+    print("  garble:   {:10.3f} s  {:8.2f} us/gate".format(garble_time, 1e6 * garble_time / n))
+    print("  evaluate: {:10.3f} s  {:8.2f} us/gate".format(evaluate_time, 1e6 * evaluate_time / n))
+    print("  engine overhead (no-op walk): {:8.3f} us/gate".format(1e6 * overhead / n))
+
+
+'''
+Returns the number of bytes of garbled tables that Alice would send to Bob for the circuit. Every entry is a 16-byte
+ciphertext, except for the four masked select bits of a GRR2 table, which fit in a single byte.
+'''
+
+
+def table_bytes(circuit):
+    size = 0
+    for gate in circuit.gates:
+        if config.USE_GRR2 and gate.op in ('AND', 'OR'):
+            size += 16 * 2 + 1
+        else:
+            size += 16 * len(gate.table)
+    return size
+
+
+'''
+Garble and evaluate the same random circuit under several garbling schemes, each given as a name and the config 
+settings it needs on top of the command-line flags, and report the size of the garbled tables and the throughput.
+'''
+
+
+def compare(args, schemes):
+    gates, outputs = random_circuit(args.gates, args.inputs, args.shape)
+    circuit = Circuit()
+    circuit.build(outputs, gates)
+    n = len(circuit.gates)
+    print("{} circuit with {} gates ({} XOR)".format(args.shape, n, sum(gate.op == 'XOR' for gate in circuit.gates)))
+    print("  {:12} {:>14} {:>10} {:>18} {:>18}".format("scheme", "table bytes", "bytes/gate", "garbled gates/s",
+                                                        "evaluated gates/s"))
+    for name, settings in schemes:
+        saved = {key: getattr(config, key) for key in settings}
+        for key, value in settings.items():
+            setattr(config, key, value)
+        garble_time, evaluate_time = garble_and_evaluate(circuit)
+        size = table_bytes(circuit)
+        print("  {:12} {:>14} {:>10.2f} {:>18.0f} {:>18.0f}".format(name, size, size / n, n / garble_time,
+                                                                    n / evaluate_time))
+        for key, value in saved.items():
+            setattr(config, key, value)
+
+
+def half_and(args):
+    compare(args, [('GRR3', dict(USE_POINT_PERMUTE=True, USE_FREE_XOR=True, USE_GRR3=True)),
+                   ('half-gates', dict(USE_POINT_PERMUTE=True, USE_FREE_XOR=True, USE_HALF_AND=True))])
+
+
+def flexor(args):
+    compare(args, [('GRR3', dict(USE_POINT_PERMUTE=True, USE_GRR3=True)),
+                   ('FleXOR', dict(USE_POINT_PERMUTE=True, USE_GRR3=True, USE_FLEXOR=True)),
+                   ('free-XOR', dict(USE_POINT_PERMUTE=True, USE_GRR3=True, USE_FREE_XOR=True))])
+
+
+def grr2(args):
+    compare(args, [('GRR3', dict(USE_POINT_PERMUTE=True, USE_GRR3=True)),
+                   ('GRR2', dict(USE_POINT_PERMUTE=True, USE_GRR3=True, USE_GRR2=True)),
+                   ('GRR2+FleXOR', dict(USE_POINT_PERMUTE=True, USE_GRR3=True, USE_GRR2=True, USE_FLEXOR=True))])
+
+
+'''
+Garble and evaluate the same random circuit sequentially, and then with parallel garbling and evaluation, doubling the 
+number of processes up to the given maximum, and report the throughput of each, and its speedup over the sequential 
+engines. Rows are placed in their slots as they are garbled in every case, since parallel garbling requires it.
+'''
+
+
+def parallel_engines(args):
+    gates, outputs = random_circuit(args.gates, args.inputs, args.shape)
+    circuit = Circuit()
+    circuit.build(outputs, gates)
+    n = len(circuit.gates)
+    layers = circuit.layers()
+    print("{} circuit with {} gates in {} layers (up to {} gates per layer), {} cores".format(
+        args.shape, n, len(layers), max(len(layer) for layer in layers), os.cpu_count()))
+    print("  {:12} {:>18} {:>10} {:>18} {:>10}".format("processes", "garbled gates/s", "speedup", "evaluated gates/s",
+                                                       "speedup"))
+    config.USE_SINGLE_PASS_PERMUTE = True
+    sequential_garble, sequential_evaluate = garble_and_evaluate(circuit)
+    print("  {:12} {:>18.0f} {:>10} {:>18.0f} {:>10}".format("sequential", n / sequential_garble, "",
+                                                             n / sequential_evaluate, ""))
+
+    config.USE_PARALLEL_GARBLING = True
+    config.USE_PARALLEL_EVALUATION = True
+    processes = 1
+    while True:
+        config.PARALLEL_PROCESSES = processes
+        garble_time, evaluate_time = garble_and_evaluate(circuit)
+        print("  {:12} {:>18.0f} {:>9.2f}x {:>18.0f} {:>9.2f}x".format(processes, n / garble_time,
+                                                                      sequential_garble / garble_time,
+                                                                      n / evaluate_time,
+                                                                      sequential_evaluate / evaluate_time))
+        if processes >= args.max_processes:
+            break
+        processes = min(2 * processes, args.max_processes)
+
+
+'''
+Garble and evaluate the same random circuit in four ways: by garbling the whole circuit before evaluating it, or by 
+streaming the garbled tables from Alice to Bob, each with and without wire liveness. Report the time taken and the 
+peak memory allocated by each, and with wire liveness, the largest number of wires whose labels either party held at 
+once. The inputs are handed to Bob directly, as in garble_and_evaluate. Rows are placed in their slots as they are 
+garbled in every case, since streaming requires it.
+'''
+
+
+def memory(args):
+    gates, outputs = random_circuit(args.gates, args.inputs, args.shape)
+    circuit = Circuit()
+    circuit.build(outputs, gates)
+    rng = random.Random(1)
+    input_values = [rng.randrange(2) for _ in circuit.input_wires]
+    print("{} circuit with {} gates and {} wires".format(args.shape, len(circuit.gates), len(circuit.wires)))
+    print("  {:24} {:>10} {:>18} {:>16}".format("mode", "time (s)", "peak memory (MB)", "peak live wires"))
+    config.USE_SINGLE_PASS_PERMUTE = True
+    for stream in (False, True):
+        for liveness in (False, True):
+            config.USE_WIRE_LIVENESS = liveness
+            for gate in circuit.gates:
+                gate.table = None
+            tracemalloc.start()
+            start = time.perf_counter()
+            with tracing.at_level(tracing.OFF):
+                alice = Alice()
+                bob = Bob()
+                alice.circuit = circuit
+                if stream:
+                    alice.prepare_labels()
+                else:
+                    alice.garble_gates()
+                bob.receive_circuit(circuit)
+                for w, v in zip(circuit.input_wires, input_values):
+                    bob.known_labels[w] = alice.input_labels(w)[v]
+                output_labels = bob.evaluate_stream(alice.garble_stream()) if stream else bob.evaluate()
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            result = [alice.decode_output(w, l) for w, l in zip(circuit.output_wires, output_labels)]
+            if result != circuit.run(input_values):
+                raise ValueError("The garbled circuit computed the wrong result")
+            name = ("streaming" if stream else "whole circuit") + (" + liveness" if liveness else "")
+            live = max(alice.peak_live_wires, bob.peak_live_wires) if liveness else len(circuit.wires)
+            print("  {:24} {:>10.3f} {:>18.1f} {:>16}".format(name, elapsed, peak / 2 ** 20, live))
+
+
+'''
+Time loading a circuit from a Bristol (or Bristol Fashion) file, and then garbling and evaluating it.
+'''
+
+
+def load(args):
+    start = time.perf_counter()
+    circuit, input_groups, output_groups = bristol.load(args.file)
+    load_time = time.perf_counter() - start
+    n = len(circuit.gates)
+    print("{}: {} gates ({} AND/OR), {} inputs, {} outputs".format(args.file, n,
+                                                                   sum(gate.op != 'XOR' for gate in circuit.gates),
+                                                                   len(circuit.input_wires),
+                                                                   len(circuit.output_wires)))
+    print("  load:     {:10.3f} s  {:8.2f} us/gate".format(load_time, 1e6 * load_time / n))
+    garble_time, evaluate_time = garble_and_evaluate(circuit)
+    print("  garble:   {:10.3f} s  {:8.2f} us/gate".format(garble_time, 1e6 * garble_time / n))
+    print("  evaluate: {:10.3f} s  {:8.2f} us/gate".format(evaluate_time, 1e6 * evaluate_time / n))
+
+
+'''
+Load a Bristol circuit as it is, with the circuit optimizer (see optimizer.py), and with AND minimization on top, check
+that all of them compute the same outputs on random inputs, and report the gates and ciphertexts of each, with the
+optimizations currently enabled in config.
+'''
+
+
+def optimize(args):
+    rng = random.Random(1)
+    circuits = dict()
+    for name, optimized, minimized in (('original', False, False), ('optimized', True, False),
+                                       ('minimized', True, True)):
+        config.USE_CIRCUIT_OPTIMIZER = optimized
+        config.USE_AND_MINIMIZATION = minimized
+        start = time.perf_counter()
+        with tracing.at_level(tracing.OFF):
+            circuits[name] = circuit = bristol.load(args.file)[0]
+        load_time = time.perf_counter() - start
+        print("  {:9} {:>10} gates {:>10} AND/OR {:>12} ciphertexts  {:8.3f} s to load".format(
+            name, len(circuit.gates), sum(gate.op != 'XOR' for gate in circuit.gates),
+            sum(optimizer.ciphertexts(gate.op) for gate in circuit.gates), load_time))
+    config.USE_CIRCUIT_OPTIMIZER = False
+    config.USE_AND_MINIMIZATION = False
+
+    original = circuits['original']
+    for _ in range(args.checks):
+        input_values = [rng.randrange(2) for _ in original.input_wires]
+        for w, v in original.constants.items():
+            input_values[original.input_wires.index(w)] = v
+        outputs = original.run(input_values)
+        if any(circuit.run(input_values) != outputs for circuit in circuits.values()):
+            raise ValueError("The optimized circuit computes a different result")
+
+
+'''
+Save the garbled circuit to a file (see gcfile.py), and compare evaluating it from the memory-mapped file with
+evaluating it in memory. The outputs are decoded with the decoding information stored in the file, when there is any.
+'''
+
+
+def garbled_file(args):
+    gates, outputs = random_circuit(args.gates, args.inputs, args.shape)
+    circuit = Circuit()
+    circuit.build(outputs, gates)
+    rng = random.Random(1)
+    input_values = [rng.randrange(2) for _ in circuit.input_wires]
+    expected = circuit.run(input_values)
+
+    with tracing.at_level(tracing.OFF), tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'circuit.gc')
+        alice = Alice()
+        bob = Bob()
+        alice.circuit = circuit
+        alice.garble_gates()
+        alice.permute_entries()
+        start = time.perf_counter()
+        alice.save_garbled(path)
+        write_time = time.perf_counter() - start
+        size = os.path.getsize(path)
+
+        bob.receive_circuit(circuit)
+        for w, v in zip(circuit.input_wires, input_values):
+            bob.known_labels[w] = alice.input_labels(w)[v]
+        start = time.perf_counter()
+        output_labels = bob.evaluate()
+        memory_time = time.perf_counter() - start
+        start = time.perf_counter()
+        file_labels, values = bob.evaluate_file(path)
+        file_time = time.perf_counter() - start
+
+    if values is None:
+        values = [alice.decode_output(w, l) for w, l in zip(circuit.output_wires, file_labels)]
+    if file_labels != output_labels or values != expected:
+        raise ValueError("The garbled circuit file computed the wrong result")
+    n = len(circuit.gates)
+    print("{} circuit with {} gates: {} bytes ({:.1f} bytes/gate)".format(args.shape, n, size, size / n))
+    print("  write:              {:10.3f} s  {:8.2f} us/gate".format(write_time, 1e6 * write_time / n))
+    print("  evaluate in memory: {:10.3f} s  {:8.2f} us/gate".format(memory_time, 1e6 * memory_time / n))
+    print("  evaluate from file: {:10.3f} s  {:8.2f} us/gate".format(file_time, 1e6 * file_time / n))
+
+
+'''
+Run a session of the two-party runtime, with Alice in this process and Bob in a child process, connected by a Unix
+socket: serve_alice and serve_bob are those of network.py, or asyncio coroutines such as those of overlap.py. Returns
+Alice's outputs, timings and traffic, and the time from the start of the session until Alice is done.
+'''
+
+
+def _session(circuit, input_values, bob_wires, serve_alice, serve_bob):
+    half = len(circuit.input_wires) - len(bob_wires)
+
+    def alice_inputs(run):
+        alice = Alice()
+        alice.input_wires = {circuit.wires[w]: v for w, v in zip(circuit.input_wires[:half], input_values)}
+        return alice
+
+    def bob_process(sock):
+        with tracing.at_level(tracing.OFF):
+            _run(serve_bob(sock, Bob, lambda runs, count: [input_values[half:]], lambda *_: None))
+
+    session = dict()
+    alice_socket, bob_socket = socket.socketpair()
+    bob = multiprocessing.get_context('fork').Process(target=bob_process, args=(bob_socket,))
+    bob.start()
+    bob_socket.close()
+    with tracing.at_level(tracing.OFF):
+        start = time.perf_counter()
+        _run(serve_alice(alice_socket, circuit, bob_wires, [len(circuit.output_wires)], 1, alice_inputs,
+                         lambda run, *outcome: session.update(outcome=outcome)))
+        elapsed = time.perf_counter() - start
+    bob.join()
+    return session['outcome'] + (elapsed,)
+
+
+def _run(session):
+    if asyncio.iscoroutine(session):
+        asyncio.run(session)
+
+
+'''
+Run the two parties in separate processes, connected by a Unix socket (see network.py): Bob supplies the second half of
+the inputs. Report the time, the bytes sent each way and the round trips of each phase of the protocol, as Alice sees
+them, and then the time of the whole run when the garbled tables are sent after garbling, streamed, or streamed while
+the OTs run and Bob evaluates (see overlap.py), and when they are sent or streamed through shared memory (see ring.py).
+'''
+
+
+def two_party(args):
+    gates, outputs = random_circuit(args.gates, args.inputs, args.shape)
+    circuit = Circuit()
+    circuit.build(outputs, gates)
+    rng = random.Random(1)
+    input_values = [rng.randrange(2) for _ in circuit.input_wires]
+    bob_wires = circuit.input_wires[len(circuit.input_wires) // 2:]
+    expected = circuit.run(input_values)
+    # streaming and overlapping both require single-pass garbling
+    config.USE_SINGLE_PASS_PERMUTE = True
+
+    elapsed = dict()
+    for mode, streaming, shared, serve_alice, serve_bob in (
+            ('sequential', False, False, network.serve_alice, network.serve_bob),
+            ('streamed', True, False, network.serve_alice, network.serve_bob),
+            ('overlapped', False, False, overlap.serve_alice, overlap.serve_bob),
+            ('shared', False, True, network.serve_alice, network.serve_bob),
+            ('shared, streamed', True, True, network.serve_alice, network.serve_bob)):
+        config.USE_STREAMING = streaming
+        config.USE_SHARED_MEMORY = shared
+        result, timings, traffic, elapsed[mode] = _session(circuit, input_values, bob_wires, serve_alice, serve_bob)
+        if result != expected:
+            raise ValueError("The garbled circuit computed the wrong result")
+        if mode == 'sequential':
+            print("{} circuit with {} gates, over a Unix socket".format(args.shape, len(circuit.gates)))
+            print("  {:10} {:>10} {:>14} {:>14} {:>12}".format("phase", "time (s)", "bytes sent", "bytes received",
+                                                               "round trips"))
+            for phase, phase_time in timings.items():
+                counts = traffic.get(phase, {'bytes_sent': 0, 'bytes_received': 0, 'round_trips': 0})
+                print("  {:10} {:>10.3f} {:>14} {:>14} {:>12}".format(phase, phase_time, counts['bytes_sent'],
+                                                                      counts['bytes_received'],
+                                                                      counts['round_trips']))
+    config.USE_STREAMING = False
+    config.USE_SHARED_MEMORY = False
+
+    print("  end to end:")
+    for mode, mode_time in elapsed.items():
+        print("    {:16} {:10.3f} s  {:6.2f}x".format(mode, mode_time, elapsed['sequential'] / mode_time))
+
+
+'''
+Transfer random pairs of labels by OT, once with one simplest_OT per transfer, once with a single batch of OT 
+extension, and once with random OTs precomputed offline, and report the throughput of each. For precomputed OTs, only 
+the online phase is timed.
+'''
+
+
+def ot_extension(args):
+    rng = random.Random(0)
+    messages = [(Label(rng.getrandbits(128)), Label(rng.getrandbits(128))) for _ in range(args.transfers)]
+    choices = [rng.randrange(2) for _ in range(args.transfers)]
+    print("{} oblivious transfers of 128-bit labels".format(args.transfers))
+    with tracing.at_level(tracing.OFF):
+        start = time.perf_counter()
+        chosen = [ot.simplest_OT(m0, m1, c) for (m0, m1), c in zip(messages, choices)]
+        base_time = time.perf_counter() - start
+        start = time.perf_counter()
+        extended = ot.extended_OT(messages, choices)
+        extension_time = time.perf_counter() - start
+        sender_pool, receiver_pool = ot.random_OTs(args.transfers)
+        start = time.perf_counter()
+        precomputed = ot.precomputed_OT(sender_pool, receiver_pool, messages, choices)
+        online_time = time.perf_counter() - start
+    if not chosen == extended == precomputed == [pair[c] for pair, c in zip(messages, choices)]:
+        raise ValueError("Bob received the wrong labels")
+    print("  one OT per transfer: {:10.3f} s  {:10.0f} transfers/s".format(base_time, args.transfers / base_time))
+    print("  OT extension:        {:10.3f} s  {:10.0f} transfers/s".format(extension_time,
+                                                                             args.transfers / extension_time))
+    print("  precomputed OTs:     {:10.3f} s  {:10.0f} transfers/s  {:8.2f} us/transfer online".format(
+        online_time, args.transfers / online_time, 1e6 * online_time / args.transfers))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--point-permute", help="enable the point-and-permute optimization", action='store_true')
+    parser.add_argument("--free-xor", help="enable the free-XOR optimization", action='store_true')
+    parser.add_argument("--grr3", help="enable the GRR3 optimization", action='store_true')
+    parser.add_argument("--half-and", help="enable the half-gates optimization for AND and OR gates",
+                        action='store_true')
+    parser.add_argument("--flexor", help="enable the FleXOR optimization for XOR gates", action='store_true')
+    parser.add_argument("--grr2", help="enable the GRR2 optimization for AND and OR gates (XOR gates use GRR3)",
+                        action='store_true')
+    parser.add_argument("--fixed-key-aes", help="garble with fixed-key AES instead of SHA-256 derived keys",
+                        action='store_true')
+    parser.add_argument("--batch", help="garble and evaluate one layer at a time with bulk AES calls",
+                        action='store_true')
+    parser.add_argument("--single-pass", help="place garbled rows in their final slot as they are garbled, instead "
+                                              "of permuting tables in a second pass", action='store_true')
+    parser.add_argument("--parallel", help="garble the gates of each layer with a pool of processes (requires "
+                                           "--single-pass)", action='store_true')
+    parser.add_argument("--parallel-evaluation", help="evaluate the gates of each layer with a pool of processes",
+                        action='store_true')
+    parser.add_argument("--processes", help="number of processes for parallel garbling and evaluation (default: one "
+                                            "per core)", type=int, metavar='N')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    engine_parser = subparsers.add_parser('engine', help="per-gate cost of the garbling and evaluation engines")
+    engine_parser.set_defaults(run=engine)
+
+    half_and_parser = subparsers.add_parser('half-and', help="half-gates compared to GRR3, both with free-XOR")
+    half_and_parser.set_defaults(run=half_and)
+
+    flexor_parser = subparsers.add_parser('flexor', help="FleXOR compared to GRR3 with and without free-XOR")
+    flexor_parser.set_defaults(run=flexor)
+
+    grr2_parser = subparsers.add_parser('grr2', help="GRR2 compared to GRR3, without free-XOR")
+    grr2_parser.set_defaults(run=grr2)
+
+    parallel_parser = subparsers.add_parser('parallel', help="speedup of parallel garbling and evaluation with the "
+                                                             "number of processes")
+    parallel_parser.add_argument("--max-processes", help="largest number of processes to try (default: one per core)",
+                                 type=int, default=os.cpu_count())
+    parallel_parser.set_defaults(run=parallel_engines)
+
+    memory_parser = subparsers.add_parser('memory', help="peak memory with streaming and wire liveness, compared to "
+                                                         "garbling the whole circuit first")
+    memory_parser.set_defaults(run=memory)
+
+    load_parser = subparsers.add_parser('load', help="load, garble and evaluate a Bristol circuit")
+    load_parser.add_argument("file", help="the Bristol (or Bristol Fashion) circuit file")
+    load_parser.set_defaults(run=load)
+
+    optimize_parser = subparsers.add_parser('optimize', help="gates and ciphertexts saved by the circuit optimizer and "
+                                                             "AND minimization on a Bristol circuit")
+    optimize_parser.add_argument("file", help="the Bristol (or Bristol Fashion) circuit file")
+    optimize_parser.add_argument("--checks", help="number of random inputs on which to compare the circuits",
+                                 type=int, default=100)
+    optimize_parser.set_defaults(run=optimize)
+
+    file_parser = subparsers.add_parser('file', help="evaluating a garbled circuit from a memory-mapped file, "
+                                                     "compared to evaluating it in memory")
+    file_parser.set_defaults(run=garbled_file)
+
+    network_parser = subparsers.add_parser('network', help="traffic and round trips of each phase, with Alice and Bob "
+                                                           "in separate processes, and the time of a run with and "
+                                                           "without overlapping its phases")
+    network_parser.set_defaults(run=two_party)
+
+    ot_parser = subparsers.add_parser('ot', help="OT extension and precomputed OTs compared to one base OT "
+                                                    "per transfer")
+    ot_parser.add_argument("--transfers", help="number of oblivious transfers", type=int, default=10000)
+    ot_parser.set_defaults(run=ot_extension)
+
+    for subparser in (engine_parser, half_and_parser, flexor_parser, grr2_parser, parallel_parser, memory_parser,
+                      file_parser, network_parser):
+        subparser.add_argument("--gates", help="number of gates in the circuit", type=int, default=10000)
+        subparser.add_argument("--inputs", help="number of input wires", type=int, default=16)
+        subparser.add_argument("--shape", help="shape of the random circuit", choices=['wide', 'chain'],
+                               default='chain')
+    # a chain has a single gate per layer, which leaves nothing to garble in parallel
+    parallel_parser.set_defaults(gates=100000, shape='wide')
+
+    args = parser.parse_args()
+    if args.grr3 and not args.point_permute:
+        parser.error("The GRR3 optimization requires the point-and-permute optimization to be enabled")
+    if args.half_and and not (args.free_xor and args.point_permute):
+        parser.error("The half-gates optimization requires the free-XOR and point-and-permute optimizations")
+    if args.half_and and args.grr3:
+        parser.error("The half-gates optimization cannot be combined with GRR3")
+    if args.flexor and not args.point_permute:
+        parser.error("The FleXOR optimization requires the point-and-permute optimization to be enabled")
+    if args.flexor and (args.free_xor or args.half_and):
+        parser.error("The FleXOR optimization cannot be combined with free-XOR or half-gates")
+    if args.grr2 and not args.point_permute:
+        parser.error("The GRR2 optimization requires the point-and-permute optimization to be enabled")
+    if args.grr2 and (args.free_xor or args.half_and):
+        parser.error("The GRR2 optimization cannot be combined with free-XOR or half-gates")
+    if args.batch and not args.fixed_key_aes:
+        parser.error("Batched garbling requires fixed-key AES to be enabled")
+    if args.parallel and not args.single_pass:
+        parser.error("Parallel garbling requires single-pass garbling to be enabled")
+    config.USE_POINT_PERMUTE = args.point_permute
+    config.USE_FREE_XOR = args.free_xor
+    config.USE_GRR3 = args.grr3 or args.grr2
+    config.USE_GRR2 = args.grr2
+    config.USE_HALF_AND = args.half_and
+    config.USE_FLEXOR = args.flexor
+    config.USE_FIXED_KEY_AES = args.fixed_key_aes
+    config.USE_BATCHED_GARBLING = args.batch
+    config.USE_SINGLE_PASS_PERMUTE = args.single_pass
+    config.USE_PARALLEL_GARBLING = args.parallel
+    config.USE_PARALLEL_EVALUATION = args.parallel_evaluation
+    config.PARALLEL_PROCESSES = args.processes
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
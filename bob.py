@@ -1,71 +1,294 @@
-import config, ot, treelib, crypto_utils, label
+import config, ot, circuit, crypto_utils, flexor, gcfile, gf128, label, parallel, tracing
 
 
 class Bob:
 
     def __init__(self):
         # the garbled circuit that Bob will evaluate
-        self.circuit = treelib.Tree()
+        self.circuit = circuit.Circuit()
 
         # the wires which Bob will supply input to, mapped to their boolean values.
         # Values of this dictionary are secret!
         self.input_wires = dict()
 
-        # a mapping of wire identifiers to wire labels, which Bob will progressively fill out during evaluation
-        # wire identifier -> wire label
-        self.known_labels = dict()
+        # the evaluation method for each kind of gate, and the offset class of each wire under FleXOR, set when
+        # evaluation begins
+        self._evaluators = dict()
+        self._offsets = None
+
+        # the wire labels known to Bob, indexed by wire id, which Bob will progressively fill out during evaluation
+        self.known_labels = []
+
+        # Bob's half of the precomputed random OTs, if his input labels are transferred with them
+        self.ot_pool = None
+
+        # the largest number of wires whose labels Bob held at once while evaluating, with wire liveness
+        self.peak_live_wires = None
+
+    '''
+    Receive the garbled circuit from Alice, and make room for the labels of each of its wires. With wire liveness, 
+    the label of a wire is dropped as soon as no gate left to evaluate needs it (see Circuit.dead_wires), so there is 
+    only room for the labels of live wires.
+    '''
+
+    def receive_circuit(self, garbled_circuit):
+        self.circuit = garbled_circuit
+        if config.USE_WIRE_LIVENESS:
+            # labels come and go as wires come alive and die, so they are kept by wire id
+            self.known_labels = dict()
+            self.peak_live_wires = 0
+        else:
+            self.known_labels = [None] * len(garbled_circuit.wires)
 
     '''
     Simulate a series of oblivious transfers in which Bob requests labels
-    corresponding to his input from Alice
+    corresponding to his input from Alice. With OT extension, all of the labels are transferred in a single batch. 
+    If Alice and Bob have precomputed random OTs in an offline phase, the labels are transferred by using them up, 
+    which only takes a few XORs per label.
     '''
 
     def request_labels(self, alice):
+        if self.ot_pool is not None:
+            wires = [self.circuit.wire_ids[wire] for wire in self.input_wires]
+            labels = ot.precomputed_OT(alice.ot_pool, self.ot_pool, [alice.input_labels(w) for w in wires],
+                                       list(self.input_wires.values()))
+            for w, label in zip(wires, labels):
+                self.known_labels[w] = label
+            return
+
+        if config.USE_OT_EXTENSION:
+            wires = [self.circuit.wire_ids[wire] for wire in self.input_wires]
+            # again, in a real application Bob wouldn't be able to access Alice's labels like this
+            labels = ot.extended_OT([alice.input_labels(w) for w in wires], list(self.input_wires.values()))
+            for w, label in zip(wires, labels):
+                self.known_labels[w] = label
+            return
+
         for wire in self.input_wires:
             # in a real application, Bob wouldn't be able to access Alice's wires like this...
             # this is just a simulation.
-            label = ot.simplest_OT(alice.wire_labels[wire][0], alice.wire_labels[wire][1], self.input_wires[wire])
-            self.known_labels[wire] = label
+            w = self.circuit.wire_ids[wire]
+            labels = alice.input_labels(w)
+            label = ot.simplest_OT(labels[0], labels[1], self.input_wires[wire])
+            self.known_labels[w] = label
+
+    '''
+    Evaluate the garbled circuit, gate by gate in topological order, so that the labels of a gate's input wires are 
+    always known by the time Bob reaches the gate. The gates of a dependency layer may also be evaluated by several 
+    processes at once (see parallel.py). Returns the labels of the circuit's output wires.
+    '''
 
     def evaluate(self):
-        return self._evaluate(self.circuit.tree.root)
-
-    '''
-    Helper function for recursive evaluation of a garbled circuit.
-    Evaluates the label of the specfied wire.
-    If the wire corresponds to the output of a gate,
-    it evaluates that gate based on the (recursively evaluated)
-    values of the gate's two input wires.
-    Otherwise, the wire is an input wire, and it returns that wire's label.
-    '''
-
-    def _evaluate(self, wire):
-        gate_node = self.circuit.tree.get_node(wire)
-
-        # in the tree, gates are identified by the identifiers of their output wires.
-        # if the gate corresponding to this wire exists, evaluate it recursively, 
-        # otherwise the wire must be an input wire
-        if gate_node:
-            gate = gate_node.data
-            l1 = self._evaluate(gate.in1)
-            l2 = self._evaluate(gate.in2)
-            out_label = None
-            print("BOB: Evaluating gate {} with input wire labels {} = {}, {} = {}".format(str(gate), gate.in1, l1,
-                                                                                           gate.in2, l2))
+        known_labels = self.known_labels
+        self._start_evaluation(self.circuit.offsets)
+        if config.USE_PARALLEL_EVALUATION:
+            parallel.evaluate(self)
+        elif config.USE_BATCHED_GARBLING:
+            layers = self.circuit.layers()
+            dead = self.circuit.dead_wires(layers) if config.USE_WIRE_LIVENESS else None
+            for i, layer in enumerate(layers):
+                self._evaluate_layer(layer)
+                if dead is not None:
+                    # once evaluated, the tables of the layer are of no more use
+                    for gate in layer:
+                        gate.table = None
+                    self._drop_labels(dead[i])
+        elif config.USE_WIRE_LIVENESS:
+            dead = self.circuit.dead_wires()
+            for i, gate in enumerate(self.circuit.gates):
+                known_labels[gate.out_id] = self._evaluate(gate)
+                gate.table = None
+                self._drop_labels(dead[i])
+        else:
+            for gate in self.circuit.gates:
+                known_labels[gate.out_id] = self._evaluate(gate)
+        self._report_liveness()
+        return [known_labels[w] for w in self.circuit.output_wires]
+
+    '''
+    Choose the evaluation method for each kind of gate once, instead of re-checking the configuration for every gate, 
+    and note the offset classes of the wires, which FleXOR gates need.
+    '''
+
+    def _start_evaluation(self, offsets):
+        self._evaluators = {op: self._gate_evaluator(op) for op in ('AND', 'OR', 'XOR')}
+        self._offsets = offsets
+
+    '''
+    Evaluate a garbled circuit saved by Alice (see gcfile.py) in place, from a memory-mapped file, one gate at a time 
+    in topological order. The labels of the input wires must already be known. Returns the labels of the circuit's 
+    output wires, and the values they encode if the file has decoding information (None otherwise).
+    '''
+
+    def evaluate_file(self, path):
+        known_labels = self.known_labels
+        with gcfile.GarbledFile(path) as garbled:
+            if isinstance(known_labels, list) and len(known_labels) != garbled.num_wires:
+                raise ValueError("{} has {} wires, but the circuit has {}".format(path, garbled.num_wires,
+                                                                               len(known_labels)))
+            self._start_evaluation(garbled.offsets)
+            try:
+                for gate in garbled.gates():
+                    known_labels[gate.out_id] = self._evaluate(gate)
+            finally:
+                self._offsets = None
+            output_labels = [known_labels[w] for w in garbled.output_wires]
+            values = garbled.decode(output_labels) if garbled.decoding is not None else None
+        return output_labels, values
+
+    '''
+    Drop the labels of the given dead wires, keeping track of the largest number of wires whose labels were ever held 
+    at once.
+    '''
+
+    def _drop_labels(self, wires):
+        if len(self.known_labels) > self.peak_live_wires:
+            self.peak_live_wires = len(self.known_labels)
+        for w in wires:
+            del self.known_labels[w]
+
+    '''
+    Report how many wires had live labels at once, with wire liveness.
+    '''
+
+    def _report_liveness(self):
+        if config.USE_WIRE_LIVENESS:
+            tracing.log(tracing.SUMMARY, "BOB: At most {} of the circuit's {} wires had live labels at once",
+                        self.peak_live_wires, len(self.circuit.wires))
+
+    '''
+    Evaluate the garbled circuit as its garbled tables arrive from Alice (see Alice.garble_stream), given as an 
+    iterable of (gate id, garbled table) pairs: each gate is evaluated as soon as its table arrives, or each layer as 
+    soon as all of its tables have arrived with batched garbling, and its table is dropped right after. Only the 
+    structure of the circuit must have been received beforehand. Returns the labels of the circuit's output wires.
+    '''
+
+    def evaluate_stream(self, tables):
+        known_labels = self.known_labels
+        gates = self.circuit.gates
+        self._start_evaluation(self.circuit.offsets)
+        tables = iter(tables)
+        if config.USE_BATCHED_GARBLING:
+            layers = self.circuit.layers()
+            dead = self.circuit.dead_wires(layers) if config.USE_WIRE_LIVENESS else None
+            for i, layer in enumerate(layers):
+                for _ in layer:
+                    gate_id, table = next(tables)
+                    gates[gate_id].table = table
+                self._evaluate_layer(layer)
+                for gate in layer:
+                    gate.table = None
+                if dead is not None:
+                    self._drop_labels(dead[i])
+        else:
+            dead = self.circuit.dead_wires() if config.USE_WIRE_LIVENESS else None
+            for i, (gate_id, table) in enumerate(tables):
+                gate = gates[gate_id]
+                gate.table = table
+                known_labels[gate.out_id] = self._evaluate(gate)
+                gate.table = None
+                if dead is not None:
+                    self._drop_labels(dead[i])
+        self._report_liveness()
+        return [known_labels[w] for w in self.circuit.output_wires]
+
+    '''
+    Evaluate a single garbled gate, given that the labels of its two input wires are known. 
+    Returns the label of the gate's output wire.
+    '''
+
+    def _evaluate(self, gate):
+        l1 = self.known_labels[gate.in1_id]
+        l2 = self.known_labels[gate.in2_id]
+        if config.TRACE_LEVEL < tracing.GATE:
+            return self._evaluators[gate.op](gate, l1, l2)
+        tracing.log(tracing.GATE, "BOB: Evaluating gate {} with input wire labels {} = {}, {} = {}", gate, gate.in1, l1,
+                    gate.in2, l2)
+        out_label = self._evaluators[gate.op](gate, l1, l2)
+        tracing.log(tracing.GATE, "BOB: Successfully decrypted label {} for wire {}", out_label, gate.out)
+        return out_label
+
+    '''
+    Evaluate an entire dependency layer of the circuit at once; the mirror image of Alice.garble_layer. 
+    Whatever the optimization, Bob only needs a single pad H(A, B, T) per gate, since all the entries he might try 
+    are encrypted under the same two input labels. The pads for every gate of the layer are computed with a single 
+    bulk AES call.
+    '''
+
+    def _evaluate_layer(self, layer):
+        evaluated_gates = []
+        keys = []
+        for gate in layer:
+            l1 = self.known_labels[gate.in1_id]
+            l2 = self.known_labels[gate.in2_id]
             if config.USE_FREE_XOR and gate.op == "XOR":
-                out_label = self._evaluate_gate_free_XOR(gate, l1, l2)
+                self.known_labels[gate.out_id] = self._evaluate_gate_free_XOR(gate, l1, l2)
+            elif config.USE_FLEXOR and gate.op == "XOR":
+                self.known_labels[gate.out_id] = self._evaluate_gate_flexor_XOR(gate, l1, l2)
+            elif config.USE_HALF_AND and gate.op in ('AND', 'OR'):
+                # half-gates need two hashes, H(A, j) and H(B, j')
+                evaluated_gates.append(gate)
+                keys.append((l1, 0, 2 * gate.id))
+                keys.append((l2, 0, 2 * gate.id + 1))
             else:
-                if config.USE_GRR3:
-                    out_label = self._evaluate_gate_grr3(gate, l1, l2)
-                elif config.USE_POINT_PERMUTE:
-                    out_label = self._evaluate_gate_pp(gate, l1, l2)
-                else:
-                    out_label = self._evaluate_gate_standard(gate, l1, l2)
-            print("BOB: Successfully decrypted label {} for wire {}".format(out_label, wire))
-            self.known_labels[wire] = out_label
-            return out_label
-        else:  # this
-            return self.known_labels[wire]
+                evaluated_gates.append(gate)
+                keys.append((l1, l2, gate.id))
+
+        tracing.log(tracing.GATE, "BOB: Evaluating {} gates of a layer with a single AES call", len(evaluated_gates))
+        pads = crypto_utils.fixed_key_hash_batch(keys)
+        i = 0
+        for gate in evaluated_gates:
+            l1 = self.known_labels[gate.in1_id]
+            l2 = self.known_labels[gate.in2_id]
+            if config.USE_HALF_AND and gate.op in ('AND', 'OR'):
+                self.known_labels[gate.out_id] = self._evaluate_gate_half_and(gate, l1, l2, pads[i:i + 2])
+                i += 2
+            elif config.USE_GRR2 and gate.op in ('AND', 'OR'):
+                self.known_labels[gate.out_id] = self._evaluate_gate_grr2(gate, l1, l2, pads[i])
+                i += 1
+            else:
+                self.known_labels[gate.out_id] = self._decrypt_entry(gate, l1, l2, pads[i])
+                i += 1
+
+    '''
+    Recover the output label of a gate from its garbled table, given the pad of the input labels l1, l2.
+    '''
+
+    def _decrypt_entry(self, gate, l1, l2, pad):
+        if config.USE_POINT_PERMUTE:
+            label_index = l1.pp_bit * 2 + l2.pp_bit
+            if config.USE_GRR3:
+                if label_index == 0:
+                    # the implicit entry of GRR3: the label is the encryption of 0^N, i.e. the pad itself
+                    return label.Label(pad)
+                label_index = label_index - 1
+            return label.Label(gate.table[label_index] ^ pad)
+
+        for entry in gate.table:
+            candidate = entry ^ pad
+            if candidate >> (128 - config.CLASSIC_SECURITY_PARAMETER * 8) == 0:
+                return label.Label(candidate)
+        raise ValueError("Bob was unable to decrypt any of the encrypted entries of gate {}".format(gate))
+
+    '''
+    Returns the method used to evaluate gates with the given operation, according to the enabled optimizations.
+    '''
+
+    def _gate_evaluator(self, op):
+        if config.USE_FREE_XOR and op == "XOR":
+            return self._evaluate_gate_free_XOR
+        elif config.USE_FLEXOR and op == "XOR":
+            return self._evaluate_gate_flexor_XOR
+        elif config.USE_HALF_AND and op in ('AND', 'OR'):
+            return self._evaluate_gate_half_and
+        elif config.USE_GRR2 and op in ('AND', 'OR'):
+            return self._evaluate_gate_grr2
+        elif config.USE_GRR3:
+            return self._evaluate_gate_grr3
+        elif config.USE_POINT_PERMUTE:
+            return self._evaluate_gate_pp
+        else:
+            return self._evaluate_gate_standard
 
     '''
     Evaluate a gate classically, without P&P/GRR3/FREE-XOR/ETC
@@ -76,17 +299,17 @@ class Bob:
         out_label = None
         for entry in gate.table:
             try:
-                candidate = crypto_utils.decrypt(l2, crypto_utils.decrypt(l1, entry))
+                candidate = crypto_utils.ungarble(l1, l2, gate.id, entry)
                 # with the AES implementation we are using, it seems that the padding check functions as a way to
                 # verify correct decryption, since if a message isn't padded right that probably means we don't have
                 # the right keys. But it's still good practice to verify the label is correct anyway.
-                if candidate[0:config.CLASSIC_SECURITY_PARAMETER * 8].int == 0:
-                    out_label = label.from_bitstring(candidate)
+                if candidate >> (128 - config.CLASSIC_SECURITY_PARAMETER * 8) == 0:
+                    out_label = label.Label(candidate)
                     break
                 else:
                     raise ValueError()
             except ValueError:
-                print("BOB: Failed to decrypt {}! Trying next entry...".format(entry.hex))
+                tracing.log(tracing.ROW, "BOB: Failed to decrypt {:032x}! Trying next entry...", entry)
         if out_label is None:
             print(
                 "ERROR: Bob was unable to decrypt all four encrypted entries of gate {}. This should never happen. "
@@ -100,9 +323,9 @@ class Bob:
 
     def _evaluate_gate_grr3(self, gate, l1, l2):
         if l1.pp_bit == l2.pp_bit == 0:
-            result = label.from_bitstring(crypto_utils.decrypt(l2, crypto_utils.decrypt(l1, bytes(16))))
-            print("BOB: The select bits of both labels for this gate are zero. Decrypting 0^N, instead of accessing "
-                  "the garbled table")
+            result = label.Label(crypto_utils.ungarble(l1, l2, gate.id, 0))
+            tracing.log(tracing.ROW, "BOB: The select bits of both labels for this gate are zero. Decrypting 0^N, "
+                                     "instead of accessing the garbled table")
             return result
         else:
             return self._evaluate_gate_pp(gate, l1, l2)
@@ -114,17 +337,79 @@ class Bob:
         # since there are only three entries, we have to shift the index accordingly
         if config.USE_GRR3:
             label_index = label_index - 1
-        print(
-            "BOB: Using point-and-permute. {}{} corresponds to entry {}; decrypting entry {} with ciphertext {}".format(
-                int(l1.pp_bit), int(l2.pp_bit),
-                label_index, label_index, gate.table[label_index]))
-        return label.from_bitstring(crypto_utils.decrypt(l2, crypto_utils.decrypt(l1, gate.table[label_index])))
+        tracing.log(tracing.ROW, "BOB: Using point-and-permute. {}{} corresponds to entry {}; decrypting entry {} with "
+                                 "ciphertext 0x{:032x}", l1.pp_bit, l2.pp_bit, label_index, label_index,
+                    gate.table[label_index])
+        return label.Label(crypto_utils.ungarble(l1, l2, gate.id, gate.table[label_index]))
+
+    '''
+    Evaluate a gate garbled with half-gates, from the two ciphertexts T_G and T_E of its table. Bob computes the 
+    generator half H(A, j) XOR s_a T_G and the evaluator half H(B, j') XOR s_b (T_E XOR A), where s_a, s_b are the 
+    select bits of his labels, and XORs them together. This works the same for AND and OR gates. 
+    The hashes H(A, j), H(B, j') may be supplied if they have already been computed in bulk.
+    '''
+
+    def _evaluate_gate_half_and(self, gate, l1, l2, hashes=None):
+        if hashes is None:
+            hashes = (crypto_utils.hash_label(l1, 2 * gate.id), crypto_utils.hash_label(l2, 2 * gate.id + 1))
+        t_g, t_e = gate.table
+        w_g = hashes[0] ^ (t_g if l1.pp_bit else 0)
+        w_e = hashes[1] ^ (t_e ^ l1.value if l2.pp_bit else 0)
+        tracing.log(tracing.ROW, "BOB: Using half-gates. Select bits {}{}; combining the generator and evaluator halves",
+                    l1.pp_bit, l2.pp_bit)
+        return label.Label(w_g ^ w_e)
+
+    '''
+    Evaluate a gate garbled with GRR2, from the two field elements P(5), P(6) and the four masked select bits of its 
+    table. Bob's row is x = 1 + 2 * s_a + s_b; he interpolates the polynomial through his point (x, K), (5, P(5)) and 
+    (6, P(6)), and evaluates it at 0 to get his output label, whose select bit he unmasks with the last bit of K.
+    The pad K may be supplied if it has already been computed in bulk.
+    '''
+
+    def _evaluate_gate_grr2(self, gate, l1, l2, pad=None):
+        if pad is None:
+            pad = crypto_utils.ungarble(l1, l2, gate.id, 0)
+        p5, p6, masked_pp_bits = gate.table
+        x = 1 + 2 * l1.pp_bit + l2.pp_bit
+        value = gf128.interpolate([(x, pad & ~1), (5, p5), (6, p6)], 0)
+        pp_bit = (masked_pp_bits >> (x - 1) & 1) ^ (pad & 1)
+        tracing.log(tracing.ROW, "BOB: Using GRR2. Select bits {}{}; interpolating row {} with P(5) and P(6)", l1.pp_bit,
+                    l2.pp_bit, x)
+        return label.Label((value & ~1) | pp_bit)
+
+    '''
+    Evaluate a XOR gate garbled with FleXOR: translate the input labels whose offset class differs from the output's, 
+    using the translation ciphertexts in the gate's table (in order), then XOR the two labels.
+    '''
+
+    def _evaluate_gate_flexor_XOR(self, gate, l1, l2):
+        translate1, translate2 = flexor.translations(gate, self._offsets)
+        entries = iter(gate.table)
+        if translate1:
+            l1 = self._translate(l1, 2 * gate.id, next(entries))
+        if translate2:
+            l2 = self._translate(l2, 2 * gate.id + 1, next(entries))
+        out_label = l1 ^ l2
+        tracing.log(tracing.ROW, "BOB: Using FleXOR; translated {} input(s), computing {} XOR {} = {}",
+                    translate1 + translate2, l1, l2, out_label)
+        return out_label
+
+    '''
+    Translate a label into another offset class, given the translation ciphertext Alice produced for it. 
+    If the label's select bit is 0, the translated label is H(label, tweak); otherwise, it is encrypted in the entry.
+    '''
+
+    def _translate(self, l, tweak, entry):
+        if l.pp_bit == 0:
+            return label.Label(crypto_utils.hash_label(l, tweak))
+        return label.Label(crypto_utils.hash_label(l, tweak) ^ entry)
 
     '''
     Evaluate a gate using the free-XOR optimization.
     '''
 
     def _evaluate_gate_free_XOR(self, gate, l1, l2):
-        out_label = label.from_bitstring(l1.to_bitstring() ^ l2.to_bitstring())
-        print("BOB: Using Free-XOR; computing {} XOR {} = {}".format(l1, l2, out_label))
+        out_label = l1 ^ l2
+        if config.TRACE_LEVEL >= tracing.ROW:
+            tracing.log(tracing.ROW, "BOB: Using Free-XOR; computing {} XOR {} = {}", l1, l2, out_label)
         return out_label  # it's that easy!
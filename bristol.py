@@ -0,0 +1,162 @@
+import gc
+
+import config
+import optimizer
+from circuit import Circuit
+from gate import Gate
+
+'''
+Loads circuits in the Bristol format (https://homes.esat.kuleuven.be/~nsmart/MPC/old-circuits.html), and in the newer
+Bristol Fashion (https://homes.esat.kuleuven.be/~nsmart/MPC/), in which the standard benchmark circuits (AES-128,
+SHA-256, adders, comparators...) are distributed.
+
+Both formats start with a header, followed by a blank line and one gate per line:
+
+    <number of gates> <number of wires>
+    <number of input values> <bits of value 1> <bits of value 2> ...     (Bristol Fashion)
+    <number of output values> <bits of output 1> ...
+or
+    <number of gates> <number of wires>
+    <bits of input 1> <bits of input 2> <bits of output>                 (Bristol)
+
+    2 1 <input wire> <input wire> <output wire> XOR
+    1 1 <input wire> <output wire> INV
+
+Wires are numbered from 0; the input values occupy the first wires, and the outputs the last wires. Wire numbers are
+used as wire identifiers in our circuit.
+
+Our circuits only have binary AND, OR and XOR gates, so the other gates are translated:
+ - EQW (a wire copy) is not a gate at all: its output wire is simply another name for its input wire,
+ - INV is a XOR with a constant 1 wire,
+ - EQ (which assigns a constant 0 or 1 to a wire) makes its output wire another name for a constant wire,
+ - MAND (a batch of m AND gates) is split into its m AND gates.
+Constant wires are input wires whose values are supplied by Alice; they are recorded in circuit.constants. With the
+circuit optimizer enabled, the gates go through optimizer.optimize before the circuit is built, and then through
+optimizer.minimize_ands with AND minimization.
+
+Lines are read as bytes and split into byte tokens, which int() accepts as they are, so no line is ever decoded into an
+intermediate string.
+'''
+
+# the identifiers of the constant wires, which can't clash with the integer wire numbers of the file
+ZERO = 'zero'
+ONE = 'one'
+
+BINARY_OPS = {b'AND': 'AND', b'XOR': 'XOR', b'OR': 'OR'}
+
+'''
+Split the given wires into consecutive groups of the given sizes.
+'''
+
+
+def _groups(wires, sizes):
+    groups = []
+    for size in sizes:
+        groups.append(wires[:size])
+        wires = wires[size:]
+    return groups
+
+
+'''
+Load the circuit from the Bristol or Bristol Fashion file at the given path.
+
+Returns the circuit, the groups of input wires (one group per input value: in Bristol, the first group is usually the
+garbler's input, and the second the evaluator's), and the groups of output wires, as lists of integer wire ids.
+'''
+
+
+def load(path):
+    # Loading allocates a few objects per gate and frees almost none, which would trigger many pointless garbage
+    # collections; so we pause the garbage collector until the circuit is built.
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _load(path)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _load(path):
+    with open(path, 'rb') as f:
+        lines = iter(f)
+        num_gates, num_wires = map(int, next(lines).split())
+        header = next(lines).split()
+        second = next(lines).split()
+        if not second:
+            # Bristol: the first input, the second input, and the output
+            input_sizes = [int(header[0]), int(header[1])]
+            output_sizes = [int(header[2])]
+        else:
+            # Bristol Fashion: the sizes of the inputs, then the sizes of the outputs, each preceded by their number
+            input_sizes = [int(n) for n in header[1:1 + int(header[0])]]
+            output_sizes = [int(n) for n in second[1:1 + int(second[0])]]
+
+        gates = dict()
+        aliases = dict()  # wires that are just another name for another wire (because of EQW and EQ)
+        constants = set()  # the constant wires that are used
+        for line in lines:
+            tokens = line.split()
+            if not tokens:
+                continue
+            op = tokens[-1]
+            if op in BINARY_OPS:
+                gate = Gate()
+                gate.op = BINARY_OPS[op]
+                gate.in1 = int(tokens[2])
+                gate.in2 = int(tokens[3])
+                gate.out = int(tokens[4])
+            elif op == b'INV':
+                gate = Gate()
+                gate.op = 'XOR'
+                gate.in1 = int(tokens[2])
+                gate.in2 = ONE
+                gate.out = int(tokens[3])
+                constants.add(ONE)
+            elif op == b'EQW':
+                w = int(tokens[2])
+                aliases[int(tokens[3])] = aliases.get(w, w)
+                continue
+            elif op == b'EQ':
+                aliases[int(tokens[3])] = ONE if int(tokens[2]) else ZERO
+                constants.add(aliases[int(tokens[3])])
+                continue
+            elif op == b'MAND':
+                m = int(tokens[1])
+                for k in range(m):
+                    gate = Gate()
+                    gate.op = 'AND'
+                    gate.in1 = int(tokens[2 + k])
+                    gate.in2 = int(tokens[2 + m + k])
+                    gate.out = int(tokens[2 + 2 * m + k])
+                    if aliases:
+                        gate.in1 = aliases.get(gate.in1, gate.in1)
+                        gate.in2 = aliases.get(gate.in2, gate.in2)
+                    gates[gate.out] = gate
+                continue
+            else:
+                raise ValueError("Unsupported gate {} in Bristol circuit {}".format(line.strip(), path))
+            # most circuits have no EQW or EQ gates at all, so only look up aliases if there are any
+            if aliases:
+                gate.in1 = aliases.get(gate.in1, gate.in1)
+                gate.in2 = aliases.get(gate.in2, gate.in2)
+            gates[gate.out] = gate
+
+    num_inputs = sum(input_sizes)
+    num_outputs = sum(output_sizes)
+    input_wires = list(range(num_inputs))
+    constants = [c for c in (ZERO, ONE) if c in constants]
+    output_names = list(range(num_wires - num_outputs, num_wires))
+    output_wires = [aliases.get(w, w) for w in output_names]
+    if config.USE_CIRCUIT_OPTIMIZER:
+        gates, output_wires, _ = optimizer.optimize(gates, output_wires, {c: int(c == ONE) for c in constants})
+    if config.USE_AND_MINIMIZATION:
+        gates, output_wires, _ = optimizer.minimize_ands(gates, output_wires, {c: int(c == ONE) for c in constants})
+
+    circuit = Circuit()
+    circuit.build(output_wires, gates, input_wires + constants, output_names)
+    for c in constants:
+        circuit.constants[circuit.wire_ids[c]] = int(c == ONE)
+    input_groups = _groups(circuit.input_wires[:num_inputs], input_sizes)
+    output_groups = _groups(circuit.output_wires, output_sizes)
+    return circuit, input_groups, output_groups
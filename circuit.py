@@ -1,40 +1,178 @@
-import treelib
-import queue
-import gc
-
-
 class Circuit:
 
     def __init__(self):
-        self.tree = treelib.Tree()
-        self.wires = set()  # set of all wires; this is for convenience
-
-    '''Transforms a table of output wires -> gate objects into a binary tree representing the circuit, whose nodes 
-    are gates In our tree, the root will be the LAST gate in the circuit (whose output wire is the final output) 
-    treelib wants each node to have a name, identifier, and data object. We will use a description of the gate (c <- 
-    a OP b) as the name, and the gate's output wire identifier as a 
-
-    In each iteration of the while loop, we process an existing gate node by creating nodes for the (up to) two gates 
-    whose outputs are the gate's input. '''
-
-    def build(self, output_wire, gates):
-        q = queue.Queue()
-        q.put(output_wire)
-        last_gate = gates[output_wire]
-        self.tree.create_node(str(last_gate), output_wire, data=last_gate)
-        while not q.empty():
-            out = q.get()
-            self.wires.add(out)
-            parent_gate = gates[out]  # the gate whose output wire is on top of the queue
-            self.wires.add(parent_gate.in1)
-            self.wires.add(parent_gate.in2)
-
-            if parent_gate.in1 in gates:
-                in1_gate = gates[parent_gate.in1]
-                self.tree.create_node(str(in1_gate), in1_gate.out, data=in1_gate, parent=parent_gate.out)
-                q.put(in1_gate.out)
-
-            if parent_gate.in2 in gates:
-                in2_gate = gates[parent_gate.in2]
-                self.tree.create_node(str(in2_gate), in2_gate.out, data=in2_gate, parent=parent_gate.out)
-                q.put(in2_gate.out)
+        self.wires = []  # wire identifiers, indexed by integer wire id
+        self.wire_ids = dict()  # wire identifier -> integer wire id
+        self.gates = []  # gates, in topological order
+        self.input_wires = []  # integer ids of the wires that are not driven by any gate
+        self.output_wires = []  # integer ids of the circuit's output wires
+        # the identifier the circuit was given with for each output wire, which once the circuit is optimized may be
+        # that of a wire removed in favor of the wire that now carries its value (see optimizer.py)
+        self.output_names = []
+        self.offsets = None  # the public offset class of each wire under FleXOR (see flexor.assign_offsets)
+        self.constants = dict()  # integer ids of input wires that carry a constant, which Alice supplies -> value
+
+    '''Transforms a table of output wires -> gate objects into a directed acyclic graph representing the circuit.
+
+    The circuit is stored compactly: every wire is assigned an integer id, and gates are kept in a flat list in
+    topological order, so that a gate always appears after the gates driving its input wires. Input wires receive the
+    ids 0..n-1, and the output wire of the k-th gate receives the id n + k. Since wires are plain integers, the
+    parties can keep their labels in flat lists indexed by wire id, and garbling/evaluation is a single linear pass
+    over self.gates. A wire may feed any number of gates (fan-out), and the circuit may have any number of outputs.
+
+    Gates are often specified in topological order already (Bristol files always are, for instance), in which case we 
+    keep that order. Otherwise, we order the gates using Kahn's algorithm (see topological_order). 
+    
+    Input wires are numbered in the order in which gates use them, unless their order is given with input_wires. 
+    The identifiers the output wires had before the circuit was optimized can be given with output_names, so that 
+    results are reported under them. '''
+
+    def build(self, output_wires, gates, input_wires=(), output_names=None):
+        wire_ids = self.wire_ids
+        wires = self.wires
+        for w in input_wires:
+            wire_ids[w] = len(wires)
+            wires.append(w)
+            self.input_wires.append(wire_ids[w])
+
+        # number the input wires, and check whether every gate comes after the gates driving its inputs
+        in_order = True
+        placed = set()
+        for out, gate in gates.items():
+            for w in (gate.in1, gate.in2):
+                if w in gates:
+                    if w not in placed:
+                        in_order = False
+                elif w not in wire_ids:
+                    wire_ids[w] = len(wires)
+                    wires.append(w)
+                    self.input_wires.append(wire_ids[w])
+            placed.add(out)
+
+        for gate in (gates.values() if in_order else self.topological_order(gates)):
+            gate.id = len(self.gates)
+            gate.in1_id = wire_ids[gate.in1]
+            gate.in2_id = wire_ids[gate.in2]
+            gate.out_id = len(wires)
+            wire_ids[gate.out] = gate.out_id
+            wires.append(gate.out)
+            self.gates.append(gate)
+
+        if len(self.gates) != len(gates):
+            raise ValueError("The circuit contains a cycle; gates must form a directed acyclic graph")
+
+        for w in output_wires:
+            if w not in self.wire_ids:
+                raise ValueError("Output wire {} is not part of the circuit".format(w))
+            self.output_wires.append(self.wire_ids[w])
+        self.output_names = list(output_wires if output_names is None else output_names)
+
+    '''
+    Sort the gates topologically with Kahn's algorithm: a gate is ready once the gates driving both of its inputs have 
+    been placed. This is iterative, so arbitrarily deep circuits don't run into Python's recursion limit. If the gates 
+    contain a cycle, the gates on the cycle are left out.
+    '''
+
+    @staticmethod
+    def topological_order(gates):
+        # count, for every gate, how many of its inputs are driven by other gates, and record who consumes each wire
+        pending = dict()
+        consumers = dict()
+        for out, gate in gates.items():
+            pending[out] = 0
+            for w in (gate.in1, gate.in2):
+                if w in gates:
+                    pending[out] += 1
+                    consumers.setdefault(w, []).append(out)
+
+        order = []
+        ready = [out for out in gates if pending[out] == 0]
+        ready.reverse()  # pop from the end, but keep the order in which gates were specified where possible
+        while ready:
+            out = ready.pop()
+            order.append(gates[out])
+            for consumer in reversed(consumers.get(out, [])):
+                pending[consumer] -= 1
+                if pending[consumer] == 0:
+                    ready.append(consumer)
+        return order
+
+    '''
+    Group the gates into dependency layers: a gate's layer is one more than the highest layer of the gates driving its 
+    inputs, and gates driven only by input wires form layer 0. Gates in the same layer never depend on one another, 
+    so all of them can be garbled (or evaluated) at once. Returns a list of layers, each a list of gates.
+    '''
+
+    def layers(self):
+        depth = [-1] * len(self.wires)  # input wires sit below layer 0
+        layers = []
+        for gate in self.gates:
+            d = max(depth[gate.in1_id], depth[gate.in2_id]) + 1
+            depth[gate.out_id] = d
+            if d == len(layers):
+                layers.append([])
+            layers[d].append(gate)
+        return layers
+
+    '''
+    Wire liveness: find, for each step of a pass over the circuit, the wires whose labels are no longer needed once the 
+    step is done, because no later step uses them. The steps are the gates in topological order, or the given layers 
+    (see layers) if the pass works one layer at a time. The output wires are never dead, since their labels are needed 
+    once the pass is over; wires that no step uses at all (unused inputs, or gates whose output goes nowhere) are dead 
+    after the first step, or after the step that produces them.
+
+    Returns a list with one entry per step: the ids of the wires that die at that step (an empty tuple if none do). 
+    A party that drops the labels of these wires after each step holds no more labels than the circuit is wide.
+    '''
+
+    def dead_wires(self, layers=None):
+        if layers is None:
+            steps = enumerate(self.gates)
+            count = len(self.gates)
+        else:
+            steps = ((i, gate) for i, layer in enumerate(layers) for gate in layer)
+            count = len(layers)
+        if count == 0:
+            return []
+
+        # the last step that uses each wire: since steps come in topological order, a gate's consumers are always
+        # visited after it, and overwrite the step at which it was produced
+        last_use = [0] * len(self.wires)
+        for i, gate in steps:
+            last_use[gate.in1_id] = i
+            last_use[gate.in2_id] = i
+            last_use[gate.out_id] = i
+        for w in self.output_wires:
+            last_use[w] = None
+
+        dead = [()] * count
+        for w, i in enumerate(last_use):
+            if i is not None:
+                if dead[i]:
+                    dead[i].append(w)
+                else:
+                    dead[i] = [w]
+        return dead
+
+    '''
+    Evaluate the circuit in the clear, given a list of boolean values for its input wires (in the order of 
+    self.input_wires). Returns the values of the output wires. This is handy to check the result of the protocol.
+    '''
+
+    def run(self, input_values):
+        values = [None] * len(self.wires)
+        for w, v in zip(self.input_wires, input_values):
+            values[w] = v
+        for gate in self.gates:
+            values[gate.out_id] = int(gate.run(values[gate.in1_id], values[gate.in2_id]))
+        return [values[w] for w in self.output_wires]
+
+    '''
+    Print the circuit, one gate per line, in the order in which the gates will be garbled and evaluated.
+    '''
+
+    def show(self):
+        for gate in self.gates:
+            print("{:>6}: {}".format(gate.id, gate))
+        print("Outputs: " + ", ".join(str(name) if name == self.wires[w] else "{} (= {})".format(name, self.wires[w])
+                                      for w, name in zip(self.output_wires, self.output_names)))
@@ -5,11 +5,90 @@ LABEL_BYTES_TO_PRINT = 2
 # when point&permute is NOT enabled
 CLASSIC_SECURITY_PARAMETER = 2
 
+# How much of the protocol to print: 0 (nothing), 1 (a summary), 2 (every gate) or 3 (every row of every garbled table,
+# like the written tutorial). See tracing.py.
+TRACE_LEVEL = 3
+
 USE_POINT_PERMUTE = False
 USE_FREE_XOR = False
 USE_GRR3 = False
 
-USE_FLEXOR = False  # NYI - perhaps eventually?
-USE_HALF_AND = False  # NYI - perhaps eventually?
+# Garble with the fixed-key AES function H(A, B, T) = AES_K(2A ^ 4B ^ T) ^ 2A ^ 4B ^ T, instead of encrypting each entry
+# twice with AES keys derived from SHA-256
+USE_FIXED_KEY_AES = False
+
+# Garble (and evaluate) the circuit one dependency layer at a time, encrypting all the rows of a layer with a single
+# bulk AES call. Requires fixed-key AES.
+USE_BATCHED_GARBLING = False
+
+# Garble AND (and OR) gates with half-gates: two ciphertexts per gate. Requires free-XOR and point-and-permute.
+USE_HALF_AND = False
+
+# Garble XOR gates with FleXOR: wires are assigned offset classes, and XOR gates cost 0 or 1 ciphertexts depending on
+# the classes of their wires. Requires point-and-permute, and cannot be combined with free-XOR or half-gates.
+USE_FLEXOR = False
+
+# Garble AND and OR gates with GRR2: two ciphertexts per gate (plus four bits), obtained by polynomial interpolation.
+# Requires point-and-permute, and cannot be combined with free-XOR or half-gates. XOR gates are garbled with GRR3 (or
+# FleXOR, if it is enabled).
+USE_GRR2 = False
+
+# Optimize the circuit before it is garbled: fold gates with constant (or identical) inputs, merge gates that compute the
+# same thing, and remove gates that no output depends on (see optimizer.py)
+USE_CIRCUIT_OPTIMIZER = False
+
+# Rewrite the circuit with as few AND and OR gates as possible, since they are the only gates that cost anything with
+# free-XOR: ORs become XORs and ANDs, and majorities (the carries of adders and comparators) a single AND (see
+# optimizer.minimize_ands). Requires free-XOR.
+USE_AND_MINIMIZATION = False
+
+# Place each row of a garbled table directly into its final slot as it is garbled (the slot given by its select bits
+# with point-and-permute, or a random slot otherwise), instead of permuting the tables in a second pass over the circuit
+USE_SINGLE_PASS_PERMUTE = False
+
+# Garble the gates of each dependency layer with a pool of worker processes, which exchange labels and tables through
+# shared memory. Requires single-pass garbling.
+USE_PARALLEL_GARBLING = False
+
+# Evaluate the gates of each dependency layer with a pool of worker processes, which exchange labels through shared
+# memory
+USE_PARALLEL_EVALUATION = False
+
+# Stream the garbled tables from Alice to Bob as they are garbled, and have Bob evaluate each gate as soon as its table
+# arrives, instead of garbling the whole circuit before handing it over. Requires single-pass garbling, and cannot be
+# combined with parallel garbling or evaluation.
+USE_STREAMING = False
+
+# Drop the labels of each wire as soon as the last gate that uses it has been garbled (or evaluated), and the garbled
+# tables of gates once they have been evaluated, so that memory grows with the width of the circuit rather than its
+# size. Cannot be combined with parallel garbling or evaluation.
+USE_WIRE_LIVENESS = False
+
+# How many worker processes garble (or evaluate) the circuit in parallel; None means one per core
+PARALLEL_PROCESSES = None
+
+# Transfer Bob's input labels with IKNP OT extension: a fixed number of base OTs, and a single batch of symmetric-key
+# operations for all of his inputs, instead of one public-key OT per input wire
+USE_OT_EXTENSION = False
+
+# In the two-party runtime, overlap the OTs of Bob's input labels, the transfer of the garbled tables and their evaluation,
+# with an asyncio driver (see overlap.py), instead of running the phases of the protocol one after the other. Requires
+# single-pass garbling, and cannot be combined with wire liveness, or parallel garbling or evaluation.
+USE_OVERLAP = False
+
+# In the two-party runtime, hand the garbled tables over to Bob through a ring buffer in shared memory (see ring.py),
+# rather than through the socket, when both parties run on the same host. Cannot be combined with overlapping.
+USE_SHARED_MEMORY = False
+
+# The capacity of that ring buffer, in bytes
+SHARED_MEMORY_BYTES = 16 << 20
+
+# How many random OTs to precompute at once in the offline phase, when Bob's input labels are transferred with a pool of
+# precomputed random OTs
+OT_POOL_SIZE = 1024
+
+# The file to which Alice saves the garbled circuit, and from which Bob evaluates it in place (see gcfile.py); None to
+# hand the garbled circuit over in memory
+GARBLED_FILE = None
 
 R = None
@@ -6,23 +6,27 @@ from Crypto.Cipher import AES
 from Crypto.Hash import SHA256
 from Crypto.Util import Padding
 
-import bitstring
+import config
 import label
 
-'''Encrypt a label/bitstring using AES in ECB mode. We employ SHA-256 to expand the key to 256 bits. Padding is not 
-used since all labels are now fixed at 128 bits long, and we only encrypt labels. ECB is not secure for long 
-multi-block messages, but we are only encrypting labels in our GC implementation, which are exactly one block in size.
+# The fixed, public key used by the fixed-key AES garbling function. The key need not be secret; what matters is that it
+# is fixed, so that its key schedule is expanded exactly once rather than once per encryption.
+FIXED_KEY = bytes.fromhex('000102030405060708090a0b0c0d0e0f')
+_fixed_key_cipher = AES.new(FIXED_KEY, AES.MODE_ECB)
 
-Returns a bitstring. 
+MASK_128 = (1 << 128) - 1
+
+'''Encrypt a label (or any 128-bit integer) using AES in ECB mode. We employ SHA-256 to derive the AES key from the key 
+material, which may be a label, an integer or a byte string. Padding is not used since all labels are now fixed at 
+128 bits long, and we only encrypt labels. ECB is not secure for long multi-block messages, but we are only 
+encrypting labels in our GC implementation, which are exactly one block in size.
+
+Returns the ciphertext as a 128-bit integer. 
 '''
 
 
 def encrypt(k, m):
-    if type(m) == label.Label:
-        m = m.to_bitstring()
-    if type(k) == label.Label:
-        k = k.to_bitstring()
-    sha256 = SHA256.new(k.bytes)  # since our labels may not be 128/256/512 bits, we hash them to derive an AES key
+    sha256 = SHA256.new(to_bytes(k))  # since our keys may not be 128/256/512 bits, we hash them to derive an AES key
     k_hash = sha256.digest()[0:16]
 
     # prepend zeroes to m; this is a very simple way to verify successful decryption of a message
@@ -34,8 +38,8 @@ def encrypt(k, m):
     # padded_m = Padding.pad(m.bytes, 16, style='pkcs7')
     encryptor = AES.new(k_hash,
                         AES.MODE_ECB)  # again, for simplicity, use ECB - labels are generally smaller than blocks
-    c = encryptor.encrypt(m.bytes)
-    return bitstring.Bits(bytes=c)
+    c = encryptor.encrypt(to_bytes(m))
+    return int.from_bytes(c, 'big')
 
 
 '''
@@ -44,21 +48,126 @@ Corresponding decryption function for encrypt(k, m)
 
 
 def decrypt(k, c):
-    if type(k) == label.Label:
-        k = k.to_bitstring().bytes
-    if type(k) == bitstring.Bits or type(k) == bitstring.BitArray:
-        k = k.bytes
-    if type(c) == bitstring.Bits or type(c) == bitstring.BitArray:
-        c = c.bytes
-    sha256 = SHA256.new(k)  # since our labels may not be 128/256/512 bits, we hash them to derive an AES key
+    sha256 = SHA256.new(to_bytes(k))  # since our keys may not be 128/256/512 bits, we hash them to derive an AES key
     k_hash = sha256.digest()[0:16]
 
     decryptor = AES.new(k_hash, AES.MODE_ECB)
-    m = decryptor.decrypt(c)
+    m = decryptor.decrypt(to_bytes(c))
     # m_bytes = Padding.unpad(padded_m, 16, style='pkcs7')
-    m = bitstring.BitArray(bytes=m)
-    return m
+    return int.from_bytes(m, 'big')
     # if m[0:16] == '0x0000':
     #     return m[16:]
     # else:
     #     raise ValueError("Failed to decrypt message " + str(c) + " with key " + str(k))
+
+
+'''
+Interpret a label, integer or byte string as a 128-bit integer.
+'''
+
+
+def to_int(x):
+    if type(x) == label.Label:
+        return x.value
+    if type(x) == int:
+        return x
+    return int.from_bytes(x, 'big')
+
+
+'''
+Encode a label, integer or byte string as 16 bytes.
+'''
+
+
+def to_bytes(x):
+    if type(x) == label.Label:
+        return x.to_bytes()
+    if type(x) == int:
+        return x.to_bytes(16, 'big')
+    return bytes(x)
+
+
+'''
+Multiply a 128-bit value by 2 (i.e. by x) in the field GF(2^128), with the same reduction polynomial as GCM/XTS.
+'''
+
+
+def double(x):
+    if x >> 127:
+        return ((x << 1) & MASK_128) ^ 0x87
+    return x << 1
+
+
+'''
+The fixed-key AES garbling function H(A, B, T) = pi(K) XOR K, where K = 2A XOR 4B XOR T and pi is AES under the fixed 
+public key (see "Efficient Garbling from a Fixed-Key Blockcipher", Bellare et al., the scheme behind JustGarble). 
+The tweak T is the identifier of the gate being garbled, so that identical label pairs in different gates don't 
+produce identical pads. Doubling the labels keeps H(A, B, T) distinct from H(B, A, T). 
+
+Returns the 128-bit pad as an integer. Costs a single block-cipher call, with no hashing and no key schedule.
+'''
+
+
+def fixed_key_hash(k1, k2, tweak):
+    k = double(to_int(k1)) ^ double(double(to_int(k2))) ^ tweak
+    return int.from_bytes(_fixed_key_cipher.encrypt(k.to_bytes(16, 'big')), 'big') ^ k
+
+
+'''
+Compute the fixed-key AES garbling function for many (k1, k2, tweak) triples at once. All the blocks 2A XOR 4B XOR T 
+are packed into one contiguous buffer and encrypted with a single ECB call on the fixed key, so the per-block cost is 
+dominated by AES itself rather than by Python-level call overhead. The final XOR with K is also done over the whole 
+buffer at once.
+
+Returns the 128-bit pads as a list of integers, in the same order as the given triples.
+'''
+
+
+def fixed_key_hash_batch(keys):
+    if not keys:
+        return []
+    blocks = b''.join([(double(to_int(k1)) ^ double(double(to_int(k2))) ^ tweak).to_bytes(16, 'big')
+                       for k1, k2, tweak in keys])
+    pads = (int.from_bytes(_fixed_key_cipher.encrypt(blocks), 'big') ^ int.from_bytes(blocks, 'big')).to_bytes(
+        len(blocks), 'big')
+    return [int.from_bytes(pads[i:i + 16], 'big') for i in range(0, len(pads), 16)]
+
+
+'''
+Hash a single label k with a tweak, as needed by half-gates: H(k, tweak). With fixed-key AES this is the same 
+function as above with the second label set to zero, i.e. pi(2k XOR T) XOR 2k XOR T; otherwise we hash with SHA-256.
+
+Returns a 128-bit integer.
+'''
+
+
+def hash_label(k, tweak):
+    if config.USE_FIXED_KEY_AES:
+        return fixed_key_hash(k, 0, tweak)
+    return int.from_bytes(SHA256.new(to_bytes(k) + to_bytes(tweak)).digest()[0:16], 'big')
+
+
+'''
+Garble a single entry of a gate's truth table: encrypt m under the two input labels k1 and k2 of the gate identified by 
+tweak. If fixed-key AES is enabled, the entry is m XOR H(k1, k2, tweak); otherwise m is encrypted twice, first under 
+k2 and then under k1, as in the written tutorial.
+
+Returns the entry as a 128-bit integer. 
+'''
+
+
+def garble(k1, k2, tweak, m):
+    if config.USE_FIXED_KEY_AES:
+        return to_int(m) ^ fixed_key_hash(k1, k2, tweak)
+    return encrypt(k1, encrypt(k2, m))
+
+
+'''
+Corresponding decryption function for garble(k1, k2, tweak, m)
+'''
+
+
+def ungarble(k1, k2, tweak, c):
+    if config.USE_FIXED_KEY_AES:
+        return to_int(c) ^ fixed_key_hash(k1, k2, tweak)
+    return decrypt(k2, decrypt(k1, c))
@@ -0,0 +1,90 @@
+import config
+
+'''
+FleXOR (Kolesnikov, Mohassel and Rosulek, "FleXOR: Flexible garbling for XOR gates that beats free-XOR").
+
+Free-XOR makes every wire's two labels differ by the same global offset R. This makes XOR gates free, but it relies on
+a strong (circular) security assumption about the hash function, since Alice ends up encrypting values related to R
+under keys that are themselves related to R. It also rules out row reductions such as GRR2 that fix both output labels
+of a gate.
+
+FleXOR gives every wire an offset class instead: the two labels of wire w differ by the offset Delta_c of its class c.
+An XOR gate whose inputs and output are in the same class is still free. If an input is in a different class, Alice
+first "translates" it into the output's class with a tiny unary garbled gate, which costs a single ciphertext thanks to
+point-and-permute and row reduction. Non-XOR gates are garbled as usual, with output labels in their own class.
+
+The classes are public, and are computed from the circuit by assign_offsets, which both parties run.
+'''
+
+'''
+Assign an offset class to every wire of the circuit, such that garbling is "safe": the output wire of every non-XOR
+gate is in a different class from both of its input wires, so no gate ever encrypts a label under keys that share its
+offset, and no circular security assumption is required.
+
+We follow the level-based heuristic of the FleXOR paper. Input wires are in class 0. A non-XOR gate's output is one
+class above the highest class among its inputs. An XOR gate's output takes the highest class among its inputs, so an
+XOR gate is free if both inputs are in the same class and needs one translation (one ciphertext) otherwise.
+
+With GRR2, the two output labels of a non-XOR gate are fixed by its garbling, so their offset can't be shared with any
+other gate: every non-XOR gate's output gets a class of its own (numbered in topological order, so that the highest
+class is still the most recent one).
+
+Returns a list mapping each wire id to its class.
+'''
+
+
+def assign_offsets(circuit):
+    offsets = [0] * len(circuit.wires)
+    classes = 1
+    for gate in circuit.gates:
+        highest = max(offsets[gate.in1_id], offsets[gate.in2_id])
+        if gate.op == 'XOR':
+            offsets[gate.out_id] = highest
+        elif config.USE_GRR2:
+            offsets[gate.out_id] = classes
+            classes += 1
+        else:
+            offsets[gate.out_id] = highest + 1
+    return offsets
+
+
+'''
+Returns, for an XOR gate, whether each of its two inputs must be translated into the class of its output.
+'''
+
+
+def translations(gate, offsets):
+    return offsets[gate.in1_id] != offsets[gate.out_id], offsets[gate.in2_id] != offsets[gate.out_id]
+
+
+'''
+Count the ciphertexts needed to garble the circuit with FleXOR, given its offset classes, and compare with garbling
+every XOR gate like any other gate (which is what we would have to do without free-XOR or FleXOR).
+
+Returns a dictionary with the number of classes, of free XOR gates, of translation ciphertexts, and the total number of
+ciphertexts with and without FleXOR.
+'''
+
+
+def ciphertext_counts(circuit, offsets):
+    rows_per_gate = 3 if config.USE_GRR3 else 4
+    non_xor_rows_per_gate = 2 if config.USE_GRR2 else rows_per_gate
+    non_xor_rows = 0
+    free_xor_gates = 0
+    translation_rows = 0
+    xor_gates = 0
+    for gate in circuit.gates:
+        if gate.op == 'XOR':
+            xor_gates += 1
+            cost = sum(translations(gate, offsets))
+            translation_rows += cost
+            free_xor_gates += cost == 0
+        else:
+            non_xor_rows += non_xor_rows_per_gate
+    return {
+        'classes': max(offsets) + 1 if offsets else 0,
+        'free_xor_gates': free_xor_gates,
+        'translation_ciphertexts': translation_rows,
+        'flexor_ciphertexts': non_xor_rows + translation_rows,
+        'conventional_ciphertexts': non_xor_rows + rows_per_gate * xor_gates,
+    }
@@ -1,4 +1,8 @@
 class Gate:
+    # large circuits (such as those loaded from Bristol files) have hundreds of thousands of gates, so gates hold their
+    # attributes in slots rather than in a per-gate dictionary
+    __slots__ = ('op', 'in1', 'in2', 'out', 'table', 'id', 'in1_id', 'in2_id', 'out_id')
+
     def __init__(self):
         self.op = ''
         self.in1 = ''
@@ -6,6 +10,12 @@ class Gate:
         self.out = ''
         self.table = []
 
+        # assigned by Circuit.build: the gate's position in topological order, and the integer ids of its wires
+        self.id = None
+        self.in1_id = None
+        self.in2_id = None
+        self.out_id = None
+
     '''
     Compute the output of this gate against two bits of input. 
     '''
@@ -0,0 +1,207 @@
+import mmap
+import struct
+import sys
+from array import array
+
+import config
+from gate import Gate
+
+'''
+A compact binary file format for garbled circuits, so that a garbled circuit can be saved, shipped, and evaluated
+later. Alice writes the file one section at a time, with a single write per section; Bob maps the file into memory and
+evaluates it in place, through memoryview slices of the mapping, without building a Gate object or a table per gate.
+
+The file is laid out as follows, with every integer in little-endian byte order:
+
+    header        MAGIC, the format version, the optimization flags, and the number of wires, input wires, gates,
+                  output wires and rows (see HEADER)
+    in1           the id of the first input wire of each gate                    uint32 x gates
+    in2           the id of the second input wire of each gate                   uint32 x gates
+    first rows    the index of the first row of each gate's table, followed by   uint32 x (gates + 1)
+                  the total number of rows, so that gate k's rows are
+                  first[k], ..., first[k + 1] - 1
+    outputs       the ids of the output wires                                    uint32 x outputs
+    offsets       the offset class of each wire (FleXOR only)                    uint32 x wires
+    ops           the operation of each gate (see OPS)                           uint8 x gates
+    decoding      the select bit of the 0 label of each output wire, with        uint8 x outputs
+                  which Bob can decode his output labels (point-and-permute only)
+    padding       up to the next multiple of 16 bytes
+    rows          the rows of every garbled table, in gate order                 16 bytes x rows, big-endian
+
+Wires are numbered as in Circuit: the input wires are 0..n-1, and the output wire of gate k is n + k, so it need not be
+stored. The file records which optimizations the circuit was garbled with, since Bob must evaluate it with the same.
+'''
+
+MAGIC = b'GCDEMO\x00\x00'
+VERSION = 1
+# magic, version, flags, wires, input wires, gates, output wires, rows
+HEADER = struct.Struct('<8sHHIIIII')
+ROW_BYTES = 16
+
+OPS = ['AND', 'OR', 'XOR']
+OP_CODES = {op: code for code, op in enumerate(OPS)}
+
+# the optimizations that change the garbled tables, in the order of their bits in the header's flags
+FLAGS = ['USE_POINT_PERMUTE', 'USE_FREE_XOR', 'USE_GRR3', 'USE_HALF_AND', 'USE_FLEXOR', 'USE_GRR2', 'USE_FIXED_KEY_AES']
+
+
+'''
+Returns the optimizations currently enabled in config, as the bits of FLAGS.
+'''
+
+
+def enabled_flags():
+    return sum(1 << i for i, flag in enumerate(FLAGS) if getattr(config, flag))
+
+
+def _uint32(values):
+    values = array('I', values)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+'''
+Write the circuit Alice has garbled to the file at the given path. With point-and-permute, the decoding information
+(the select bit of the 0 label of each output wire) is taken from Alice's labels.
+'''
+
+
+def write(path, alice):
+    circuit = alice.circuit
+    gates = circuit.gates
+    first_rows = [0]
+    for gate in gates:
+        first_rows.append(first_rows[-1] + len(gate.table))
+
+    header = HEADER.pack(MAGIC, VERSION, enabled_flags(), len(circuit.wires), len(circuit.input_wires), len(gates),
+                         len(circuit.output_wires), first_rows[-1])
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(_uint32(gate.in1_id for gate in gates))
+        f.write(_uint32(gate.in2_id for gate in gates))
+        f.write(_uint32(first_rows))
+        f.write(_uint32(circuit.output_wires))
+        if config.USE_FLEXOR:
+            f.write(_uint32(circuit.offsets))
+        f.write(bytes(OP_CODES[gate.op] for gate in gates))
+        if config.USE_POINT_PERMUTE:
+            f.write(bytes(alice.wire_labels[w][0].pp_bit for w in circuit.output_wires))
+        f.write(bytes(-f.tell() % ROW_BYTES))
+        f.write(b''.join(entry.to_bytes(ROW_BYTES, 'big') for gate in gates for entry in gate.table))
+
+
+'''
+The rows of one gate's garbled table, read from the memory-mapped file: a sequence of 128-bit integers, like the table
+of a Gate, which is all Bob's evaluation methods need.
+'''
+
+
+class _Rows:
+    __slots__ = ('rows', 'first', 'count')
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.first = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError("row {} out of range".format(i))
+        position = ROW_BYTES * (self.first + i)
+        return int.from_bytes(self.rows[position:position + ROW_BYTES], 'big')
+
+
+'''
+A garbled circuit file, mapped into memory. Use it as a context manager, so that the mapping is closed once Bob is
+done with it.
+'''
+
+
+class GarbledFile:
+
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise ValueError("Garbled circuit files can only be mapped on little-endian platforms")
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = []
+        view = self._view(memoryview(self._mmap))
+
+        magic, version, flags, self.num_wires, self.num_inputs, self.num_gates, self.num_outputs, num_rows = \
+            HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("{} is not a garbled circuit file (version {})".format(path, VERSION))
+        if flags != enabled_flags():
+            self.close()
+            enabled = [flag for i, flag in enumerate(FLAGS) if flags >> i & 1]
+            raise ValueError("{} was garbled with different optimizations ({}) than are currently enabled".format(
+                path, ", ".join(enabled) or "none"))
+
+        position = HEADER.size
+
+        def section(count, fmt='I'):
+            nonlocal position
+            size = count * struct.calcsize(fmt)
+            data = self._view(view[position:position + size].cast(fmt))
+            position += size
+            return data
+
+        self.in1 = section(self.num_gates)
+        self.in2 = section(self.num_gates)
+        self.first_rows = section(self.num_gates + 1)
+        self.output_wires = section(self.num_outputs)
+        self.offsets = section(self.num_wires) if config.USE_FLEXOR else None
+        self.ops = section(self.num_gates, 'B')
+        self.decoding = section(self.num_outputs, 'B') if config.USE_POINT_PERMUTE else None
+        position += -position % ROW_BYTES
+        self.rows = self._view(view[position:position + ROW_BYTES * num_rows])
+
+    def _view(self, view):
+        self._views.append(view)
+        return view
+
+    '''
+    Iterate over the gates of the circuit, in topological order. To avoid allocating anything per gate, the same Gate
+    object is returned every time, updated to describe the current gate, with a table that reads its rows straight
+    from the file: it is only valid until the next gate.
+    '''
+
+    def gates(self):
+        gate = Gate()
+        gate.table = _Rows(self.rows)
+        for k in range(self.num_gates):
+            gate.id = k
+            gate.op = OPS[self.ops[k]]
+            gate.in1 = gate.in1_id = self.in1[k]
+            gate.in2 = gate.in2_id = self.in2[k]
+            gate.out = gate.out_id = self.num_inputs + k
+            gate.table.first = self.first_rows[k]
+            gate.table.count = self.first_rows[k + 1] - self.first_rows[k]
+            yield gate
+
+    '''
+    Decode the labels of the output wires into the values they encode, from the decoding information. Requires
+    point-and-permute.
+    '''
+
+    def decode(self, output_labels):
+        if self.decoding is None:
+            raise ValueError("Decoding information is only available with point-and-permute")
+        return [l.pp_bit ^ d for l, d in zip(output_labels, self.decoding)]
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
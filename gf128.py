@@ -0,0 +1,128 @@
+import functools
+
+'''
+Arithmetic in the finite field GF(2^128), as needed for polynomial interpolation in GRR2. Field elements are 128-bit
+integers whose bits are the coefficients of a polynomial over GF(2); addition is XOR, and multiplication is carry-less
+multiplication modulo x^128 + x^7 + x^2 + x + 1 (the same field as in GCM).
+
+Interpolation in GRR2 only ever evaluates polynomials at a handful of fixed points, so all Lagrange coefficients are
+constants. We precompute, for each constant, a table of its products with every byte value at every byte position;
+multiplying by a constant then takes 16 table lookups instead of 128 shift-and-add steps.
+'''
+
+MASK_128 = (1 << 128) - 1
+REDUCTION = 0x87  # x^7 + x^2 + x + 1
+
+'''
+Multiply two field elements, the slow and simple way.
+'''
+
+
+def mul(a, b):
+    result = 0
+    while b:
+        if b & 1:
+            result ^= a
+        b >>= 1
+        a = _times_x(a)
+    return result
+
+
+'''
+Invert a nonzero field element, as a^(2^128 - 2). This takes a few hundred multiplications, but we only ever invert the
+handful of small elements that appear in the denominators of Lagrange coefficients, so the results are cached.
+'''
+
+
+@functools.lru_cache(maxsize=None)
+def inverse(a):
+    result = 1
+    exponent = (1 << 128) - 2
+    while exponent:
+        if exponent & 1:
+            result = mul(result, a)
+        a = mul(a, a)
+        exponent >>= 1
+    return result
+
+
+'''
+Multiply a field element by x, i.e. shift it left by one bit and reduce.
+'''
+
+
+def _times_x(a):
+    a <<= 1
+    if a >> 128:
+        a = (a & MASK_128) ^ REDUCTION
+    return a
+
+
+'''
+Returns the table for multiplying by the constant c: entry 256 * k + v is c * (v << 8k). Since multiplication is linear,
+each entry is the XOR of an entry we already have and a single multiple c * x^i.
+'''
+
+
+@functools.lru_cache(maxsize=None)
+def _mul_table(c):
+    table = []
+    power = c  # c * x^i, for the bit i we are at
+    for k in range(16):
+        row = [0] * 256
+        for i in range(8):
+            bit = 1 << i
+            for v in range(bit):
+                row[bit | v] = row[v] ^ power
+            power = _times_x(power)
+        table.extend(row)
+    return table
+
+
+'''
+Multiply a field element by a constant, using the constant's precomputed table.
+'''
+
+
+def mul_const(a, c):
+    table = _mul_table(c)
+    result = 0
+    k = 0
+    while a:
+        result ^= table[k + (a & 0xff)]
+        a >>= 8
+        k += 256
+    return result
+
+
+'''
+Returns the Lagrange coefficients for evaluating, at the point t, the unique polynomial of degree len(xs) - 1 through
+the points (xs[i], y_i): the polynomial's value at t is the sum (XOR) of y_i * coefficient_i.
+'''
+
+
+@functools.lru_cache(maxsize=None)
+def lagrange(xs, t):
+    coefficients = []
+    for i, x_i in enumerate(xs):
+        numerator = 1
+        denominator = 1
+        for j, x_j in enumerate(xs):
+            if i != j:
+                numerator = mul(numerator, t ^ x_j)
+                denominator = mul(denominator, x_i ^ x_j)
+        coefficients.append(mul(numerator, inverse(denominator)))
+    return tuple(coefficients)
+
+
+'''
+Evaluate, at the point t, the polynomial through the given points (a list of (x, y) pairs).
+'''
+
+
+def interpolate(points, t):
+    coefficients = lagrange(tuple(x for x, y in points), t)
+    result = 0
+    for (x, y), coefficient in zip(points, coefficients):
+        result ^= mul_const(y, coefficient)
+    return result
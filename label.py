@@ -1,105 +1,168 @@
-import bitstring
+from Crypto.Cipher import AES
+
 import config
 import os
 
 '''
-Generate a pair of labels for a wire.
-It's important to use this function for generation,
-since select bits for a wire's two labels must be different
-for point-and-permute to work properly.
-
-Since labels often come in pairs, it's generally best to use this method whenever possible.
+Generates wire labels from a pseudorandom generator: AES in counter mode, keyed with a random 16-byte seed. 
+
+Label generation used to call os.urandom two or three times per wire. Instead, the labels of wire w are derived from 
+the two keystream blocks at counters 2w and 2w + 1, i.e. from the encryptions of 2w and 2w + 1 under the seed. 
+This has two nice consequences:
+ - the labels of many consecutive wires can be generated in bulk, with a single CTR-mode AES call, and
+ - the labels of any wire whose labels are freshly generated (such as an input wire) can be recomputed at any time from 
+   (seed, wire id).
+Alice still keeps the labels of every wire in her table while garbling, since that is where each gate reads the labels 
+of its inputs from; regenerating only saves her from holding on to the labels of input wires once no gate needs them 
+anymore (see Alice.input_labels). Labels that a gate derives from the labels of its inputs, such as those of XOR gates 
+under free-XOR or FleXOR, of half-gates, or of row-reduced gates, depend on more than (seed, wire id), and cannot be 
+regenerated this way.
+Like R, the seed is Alice's secret!
 '''
 
 
-def generate_pair():
-    if config.USE_POINT_PERMUTE:
-        l1 = Label(bitstring.BitArray(os.urandom(16)), os.urandom(1)[0] & 1)
-        l2 = Label(bitstring.BitArray(os.urandom(16)), not l1.pp_bit)
-    else:
-        l1 = Label(bitstring.BitArray(8 * config.CLASSIC_SECURITY_PARAMETER) + bitstring.BitArray(os.urandom(14)), 0)
-        l2 = Label(bitstring.BitArray(8 * config.CLASSIC_SECURITY_PARAMETER) + bitstring.BitArray(os.urandom(14)), 0)
+class LabelGenerator:
 
-    # If Free-XOR is enabled, Alice generates the '1' label for a wire as the '0' label XORed with her secret R
-    # Intuitively, this is secure: Bob only ever uncovers one of two possible labels for every wire. Bob cannot learn
-    # about the other label without knowing R, and Bob cannot learn about R without knowing the other label, and
-    # fortunately for Alice, Bob knows neither.
-    # Note that if Bob is able to determine both labels for a wire, the protocol fails and everything blows up,
-    # since with both labels Bob can uncover R.
-    # This is one of the justifications for OT (instead of Alice just giving Bob both labels)
-    if config.USE_FREE_XOR:
-        l2.bits = l1.bits ^ config.R
-        l2.bits[len(l2.bits) - 1] = not l1.bits[len(l1.bits) - 1]
+    def __init__(self, seed=None):
+        self.seed = seed if seed is not None else os.urandom(16)
+        # ECB encryption of the counter block 2w is exactly the CTR keystream at counter 2w, so a single-block ECB
+        # cipher is all we need for random access to the labels of one wire
+        self._cipher = AES.new(self.seed, AES.MODE_ECB)
 
-    return l1, l2
+    '''
+    Generate (or regenerate) the pair of labels for wire w. If an offset delta is given (such as the free-XOR offset R),
+    the '1' label is the '0' label XORed with delta; otherwise both labels are independent.
+    '''
+
+    def pair(self, w, delta=None):
+        keystream = self._cipher.encrypt((2 * w).to_bytes(16, 'big') + (2 * w + 1).to_bytes(16, 'big'))
+        return self._pair_from(keystream, 0, delta)
+
+    '''
+    Generate the pairs of labels for the count consecutive wires first, first + 1, ..., with a single AES call.
+    '''
+
+    def pairs(self, first, count, delta=None):
+        if count == 0:
+            return []
+        cipher = AES.new(self.seed, AES.MODE_CTR, nonce=b'', initial_value=2 * first)
+        keystream = cipher.encrypt(bytes(32 * count))
+        return [self._pair_from(keystream, 32 * i, delta) for i in range(count)]
+
+    '''
+    Generate a label for wire w with the given point-and-permute bit, from the first keystream block of w.
+    '''
+
+    def label(self, w, pp_bit):
+        return self._label_from(self._cipher.encrypt((2 * w).to_bytes(16, 'big')), 0, pp_bit)
+
+    '''
+    Turn the 16 keystream bytes at the given position into a label with the given point-and-permute bit. If 
+    point-and-permute is not enabled, the first CLASSIC_SECURITY_PARAMETER bytes of the label are zero instead, so 
+    that successful decryption can be checked.
+    '''
+
+    @staticmethod
+    def _label_from(keystream, position, pp_bit):
+        if config.USE_POINT_PERMUTE:
+            return Label((int.from_bytes(keystream[position:position + 16], 'big') & ~1) | pp_bit)
+        else:
+            return Label(int.from_bytes(keystream[position + config.CLASSIC_SECURITY_PARAMETER:position + 16], 'big'))
+
+    '''
+    Derive a pair of labels for a wire from 32 bytes of keystream.
+    It's important to use this function for generation,
+    since select bits for a wire's two labels must be different
+    for point-and-permute to work properly.
+    '''
+
+    def _pair_from(self, keystream, position, delta):
+        l1 = self._label_from(keystream, position, keystream[position + 15] & 1)
+
+        # If Free-XOR is enabled, Alice generates the '1' label for a wire as the '0' label XORed with her secret R
+        # Intuitively, this is secure: Bob only ever uncovers one of two possible labels for every wire. Bob cannot
+        # learn about the other label without knowing R, and Bob cannot learn about R without knowing the other label,
+        # and fortunately for Alice, Bob knows neither.
+        # Note that if Bob is able to determine both labels for a wire, the protocol fails and everything blows up,
+        # since with both labels Bob can uncover R.
+        # This is one of the justifications for OT (instead of Alice just giving Bob both labels)
+        # The last bit of R (and of any other offset, e.g. under FleXOR) is always 1, so the two labels automatically
+        # get different point-and-permute bits.
+        if delta is not None:
+            l2 = l1 ^ delta
+        else:
+            l2 = self._label_from(keystream, position + 16, l1.pp_bit ^ 1)
+
+        return l1, l2
 
 
 '''
-Decode a label's bitstring into a Label object. 
+Decode a label from its 16-byte encoding.
 '''
 
 
-def from_bitstring(bits):
-    return Label(bits, bits[len(bits) - 1])
-    #
-    # if config.USE_POINT_PERMUTE:
-    #     return Label(bits[0:config.LABEL_SIZE * 8], bitstring.Bits(bool=bits[config.LABEL_SIZE * 8]))
-    # else:
-    #     return Label(bits, 0)  # don't care about the select bit, it can be whatever
+def from_bytes(b):
+    return Label(int.from_bytes(b, 'big'))
 
 
 '''
-Represents a Label for a certain wire. Since a label can have various metadata encoded within (such as select bits 
-for point-and-permute), this class abstracts away some of that complexity. 
+Represents a Label for a certain wire. Since a label can have various metadata encoded within (such as select bits
+for point-and-permute), this class abstracts away some of that complexity.
 
-A label does not know which wire it corresponds to, or the semantic value it encodes. We let the two parties handle 
-that in their own ways, as they would in a real world implementation. This adds some complexity, but it does nicely 
+A label does not know which wire it corresponds to, or the semantic value it encodes. We let the two parties handle
+that in their own ways, as they would in a real world implementation. This adds some complexity, but it does nicely
 model who would know what information in a real-world scenario.
 
-A label is represented as a 128-bit bitstring, whose last bit is the point-and-permute bit, resulting in a key space 
-of 127 bits (2^127). If point-and-permute is not enabled, then the first 16 bits (by default) of a label are zero, 
-which is used as a security parameter to verify proper decryption. In this case, the key space is 112 bits (2^112). 
+A label is represented as a 128-bit integer, whose last (least significant) bit is the point-and-permute bit, resulting
+in a key space of 127 bits (2^127). If point-and-permute is not enabled, then the first 16 bits (by default) of a label
+are zero, which is used as a security parameter to verify proper decryption. In this case, the key space is 112 bits
+(2^112).
 
+Labels are immutable and hold nothing but their integer value, so that circuits with millions of wires don't need
+millions of heavyweight objects, and XORing or comparing two labels is a single integer operation.
 '''
 
 
 class Label:
+    __slots__ = ('value',)
 
-    def __init__(self, bits, pp_bit):
-        self.bits = bits
-        self.pp_bit = pp_bit
-        self.bits[len(self.bits) - 1] = pp_bit
+    def __init__(self, value):
+        self.value = value
+
+    @property
+    def pp_bit(self):
+        return self.value & 1
 
     def __str__(self):
+        hex_string = '{:032x}'.format(self.value)
         if config.LABEL_BYTES_TO_PRINT > 0:
-            label_string = "{}...".format(self.bits[0:config.LABEL_BYTES_TO_PRINT * 8].hex)
+            label_string = "{}...".format(hex_string[0:config.LABEL_BYTES_TO_PRINT * 2])
         else:
-            label_string = str(self.bits.hex)
+            label_string = hex_string
 
         if config.USE_POINT_PERMUTE:
-            return "({}, pp_bit = {})".format(label_string, int(self.pp_bit))
+            return "({}, pp_bit = {})".format(label_string, self.pp_bit)
         else:
-            return str(self.bits.hex)
+            return hex_string
+
+    '''
+    Encode this label, including its point-and-permute bit, as 16 bytes.
+    '''
+
+    def to_bytes(self):
+        return self.value.to_bytes(16, 'big')
 
     '''
-    Encode this label, and any associated metadata like select bits, as a single bitstring. 
-    In our implementation, we encode the point-and-permute bit as the last bit of the bitstring
-    Therefore, the true length of a label is one less than the given security parameter
+    XOR this label with another label, or with a raw 128-bit integer such as the free-XOR offset R.
     '''
 
-    def to_bitstring(self):
-        # update the bitstring value, in case the pp_bit has been messed with
-        self.bits[len(self.bits) - 1] = self.pp_bit
-        return self.bits
-        # if config.USE_POINT_PERMUTE:
-        #     # We want the bitstring to be a multiple of 8 bits long, so we can easily convert it into
-        #     # bytes for encryption. We therefore append seven extra bits to the end of the bitstring form.
-        #     return self.bits + self.pp_bit + bitstring.Bits(bin='0000000')
-        # else:
-        #     return self.bits
+    def __xor__(self, other):
+        if type(other) == Label:
+            return Label(self.value ^ other.value)
+        return Label(self.value ^ other)
 
     def __eq__(self, other):
-        if config.USE_POINT_PERMUTE:
-            return self.bits == other.bits and self.pp_bit == other.pp_bit
-        else:
-            return self.bits == other.bits
+        return type(other) == Label and self.value == other.value
+
+    def __hash__(self):
+        return hash(self.value)
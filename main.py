@@ -1,5 +1,16 @@
 import config
 import argparse
+import asyncio
+import bristol
+import json
+import network
+import os
+import optimizer
+import ot
+import overlap
+import sys
+import time
+import tracing
 
 from gate import Gate
 from circuit import Circuit
@@ -7,36 +18,43 @@ from alice import Alice
 from bob import Bob
 
 # We're going to map the output wire identifier of each gate to the gate itself
-# This makes our tree construction much more efficient!
+# This makes our circuit construction much more efficient!
 gates = dict()
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--point-permute", help="enable the point-and-permute optimization", action='store_true')
-    parser.add_argument("--free-xor", help="enable the free-XOR optimization", action='store_true')
-    parser.add_argument("--grr3", help="enable the GRR3 optimization", action='store_true')
-    args = parser.parse_args()
+'''
+The offline phase of the protocol: load the pool of precomputed random OTs from path.alice and path.bob, or precompute 
+(and save) a new one if there is no pool yet, or if it has fewer than the given number of random OTs left. 
+'''
 
-    if args.grr3 and not args.point_permute:
-        print("The GRR3 optimization requires the point-and-permute optimization to be enabled")
-        exit(0)
 
-    if args.free_xor:
-        config.USE_FREE_XOR = True
-        print("Optimization enabled: free-XOR")
+def prepare_ot_pools(alice, bob, path, needed):
+    if os.path.exists(path + '.alice') and os.path.exists(path + '.bob'):
+        alice.ot_pool = ot.SenderPool.load(path + '.alice')
+        bob.ot_pool = ot.ReceiverPool.load(path + '.bob')
+        tracing.log(tracing.SUMMARY, "Loaded {} precomputed random OTs from {}.alice and {}.bob", len(bob.ot_pool), path,
+                    path)
+    if bob.ot_pool is None or len(bob.ot_pool) < needed:
+        alice.ot_pool, bob.ot_pool = ot.random_OTs(max(needed, config.OT_POOL_SIZE))
+        save_ot_pools(alice, bob, path)
 
-    if args.point_permute:
-        config.USE_POINT_PERMUTE = True
-        print("Optimization enabled: point-and-permute")
 
-    if args.grr3:
-        config.USE_GRR3 = True
-        print("Optimization enabled: GRR3")
+'''
+Save what is left of the pool of precomputed random OTs, so that used random OTs are never used again.
+'''
 
-    alice = Alice()
-    bob = Bob()
 
+def save_ot_pools(alice, bob, path):
+    alice.ot_pool.save(path + '.alice')
+    bob.ot_pool.save(path + '.bob')
+
+
+'''
+Let the user define a circuit gate by gate, and the inputs of Alice and Bob. Returns the circuit.
+'''
+
+
+def define_circuit(alice, bob):
     # In this implementation we store wires as strings, whose values are those supplied by the user. 
     # These strings uniquely identify the corresponding wire. Not to be confused with labels, for which there are 
     # two for every unique wire!
@@ -138,49 +156,623 @@ def main():
     print()
     print("Successfully generated the following circuit: ")
     circuit = Circuit()
-    # at the moment, we only support one output wire; hence output_wires[0]
-    # but the infrastructure is in place to change this, if we so desire
-    # to do this, we would likely have to represent the circuit as a digraph instead of a tree
-    # and reimplement our construction and evaluation algorithms accordingly 
-    circuit.build(output_wires[0], gates)
-    circuit.tree.show()
+    if config.USE_CIRCUIT_OPTIMIZER or config.USE_AND_MINIMIZATION:
+        # the input wires are given, since the optimizer may leave some of them unused
+        # the outputs are reported under the identifiers typed in, whichever wires end up carrying their values
+        optimized, optimized_outputs = gates, output_wires
+        if config.USE_CIRCUIT_OPTIMIZER:
+            optimized, optimized_outputs, _ = optimizer.optimize(optimized, optimized_outputs)
+        if config.USE_AND_MINIMIZATION:
+            optimized, optimized_outputs, _ = optimizer.minimize_ands(optimized, optimized_outputs)
+        circuit.build(optimized_outputs, optimized, input_wires, output_wires)
+    else:
+        circuit.build(output_wires, gates)
+    circuit.show()
+    return circuit
+
+
+'''
+Load a circuit from a Bristol (or Bristol Fashion) file, and let the user enter the inputs of Alice and Bob. Alice 
+supplies the first input value of the circuit, and Bob all the others; Alice also supplies the circuit's constants.
+Returns the circuit.
+'''
+
+
+def load_bristol_circuit(path, alice, bob):
+    circuit, input_groups, output_groups = bristol.load(path)
+    print("Loaded a circuit with {} gates, {} input wires and {} output wires from {}".format(
+        len(circuit.gates), len(circuit.input_wires), len(circuit.output_wires), path))
+
+    alice_wires = input_groups[0] if input_groups else []
+    bob_wires = [w for group in input_groups[1:] for w in group]
+    print("Alice supplies {} input bits (wires {}); please enter them as a sequence of 0s and 1s.".format(
+        len(alice_wires), describe_wires(circuit, alice_wires)))
+    alice_values = read_bits(len(alice_wires))
+    print("Bob supplies {} input bits (wires {}); please enter them as a sequence of 0s and 1s.".format(
+        len(bob_wires), describe_wires(circuit, bob_wires)))
+    bob_values = read_bits(len(bob_wires))
+
+    alice.input_wires = {circuit.wires[w]: v for w, v in zip(alice_wires, alice_values)}
+    for w, v in circuit.constants.items():
+        alice.input_wires[circuit.wires[w]] = v
+    bob.input_wires = {circuit.wires[w]: v for w, v in zip(bob_wires, bob_values)}
+    return circuit
+
+
+def describe_wires(circuit, wires):
+    if not wires:
+        return "none"
+    return "{}..{}".format(circuit.wires[wires[0]], circuit.wires[wires[-1]])
+
+
+'''
+Read the given number of bits from the user, as a sequence of 0s and 1s, optionally separated by commas.
+'''
+
+
+def read_bits(count):
+    if count == 0:
+        return []
+    bits = [int(c) for c in input() if c in '01']
+    if len(bits) != count:
+        raise ValueError("Expected {} bits, but got {}".format(count, len(bits)))
+    return bits
+
+
+'''
+Enable the optimizations selected on the command line.
+'''
+
+
+def configure(args):
+    if args.free_xor:
+        config.USE_FREE_XOR = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: free-XOR")
+
+    if args.point_permute:
+        config.USE_POINT_PERMUTE = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: point-and-permute")
+
+    if args.grr3:
+        config.USE_GRR3 = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: GRR3")
+
+    if args.half_and:
+        config.USE_HALF_AND = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: half-gates")
+
+    if args.flexor:
+        config.USE_FLEXOR = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: FleXOR")
+
+    if args.grr2:
+        # GRR2 only applies to AND and OR gates; XOR gates fall back to GRR3
+        config.USE_GRR2 = True
+        config.USE_GRR3 = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: GRR2 (with GRR3 for XOR gates)")
+
+    if args.fixed_key_aes:
+        config.USE_FIXED_KEY_AES = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: fixed-key AES")
+
+    if args.batch:
+        config.USE_BATCHED_GARBLING = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: batched garbling")
+
+    if args.single_pass:
+        config.USE_SINGLE_PASS_PERMUTE = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: single-pass garbling and permutation")
+
+    if args.parallel:
+        config.USE_PARALLEL_GARBLING = True
+        config.PARALLEL_PROCESSES = args.processes
+        tracing.log(tracing.SUMMARY, "Optimization enabled: parallel garbling")
+
+    if args.parallel_evaluation:
+        config.USE_PARALLEL_EVALUATION = True
+        config.PARALLEL_PROCESSES = args.processes
+        tracing.log(tracing.SUMMARY, "Optimization enabled: parallel evaluation")
+
+    if args.stream:
+        config.USE_STREAMING = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: streaming garbled tables to Bob")
+
+    if args.liveness:
+        config.USE_WIRE_LIVENESS = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: wire liveness")
+
+    if args.garbled_file:
+        config.GARBLED_FILE = args.garbled_file
+
+    if args.optimize:
+        config.USE_CIRCUIT_OPTIMIZER = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: constant propagation, structural hashing and dead-gate "
+                                     "elimination on the circuit")
+
+    if args.minimize_and:
+        config.USE_AND_MINIMIZATION = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: rewriting the circuit with fewer AND and OR gates")
+
+    if args.ot_extension:
+        config.USE_OT_EXTENSION = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: OT extension")
+
+    if args.overlap:
+        config.USE_OVERLAP = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: overlapping OTs, table transfer and evaluation")
+
+    if args.shared_memory:
+        config.USE_SHARED_MEMORY = True
+        tracing.log(tracing.SUMMARY, "Optimization enabled: garbled tables handed over in shared memory")
+
+
+'''
+Run the protocol on the given circuit, once Alice and Bob know their inputs: Alice garbles the circuit and sends it to 
+Bob along with the labels of her inputs, Bob obtains the labels of his inputs by OT and evaluates the circuit, and Alice 
+reveals the result. Returns the values of the output wires, and the time spent in each phase of the protocol.
+'''
+
+
+def run_protocol(circuit, alice, bob):
+    if config.USE_STREAMING:
+        return run_streaming_protocol(circuit, alice, bob)
+    timings = dict()
 
     # Give the circuit to Alice to garble
     alice.circuit = circuit
 
     # Instruct Alice to generate labels and garble garble gates using the generated labels
-    print()
-    print("Alice generates labels for the circuit, and garbles gates accordingly:")
+    tracing.log(tracing.SUMMARY, "\nAlice generates labels for the circuit, and garbles gates accordingly:")
+    start = time.perf_counter()
     alice.garble_gates()
+    timings['garble'] = time.perf_counter() - start
 
     # Instruct Alice to permute the garbled tables
-    print()
-    print("Alice permutes the entries in each garbled gate's garbled truth table:")
+    tracing.log(tracing.SUMMARY, "\nAlice permutes the entries in each garbled gate's garbled truth table:")
+    start = time.perf_counter()
     alice.permute_entries()
+    timings['permute'] = time.perf_counter() - start
 
     # Transfer the circuit to Bob
-    print()
-    print("Alice transfers the circuit to Bob.")
-    bob.circuit = alice.circuit
+    start = time.perf_counter()
+    if config.GARBLED_FILE:
+        tracing.log(tracing.SUMMARY, "\nAlice saves the garbled circuit to {}, and transfers the file to Bob.",
+                    config.GARBLED_FILE)
+        alice.save_garbled(config.GARBLED_FILE)
+    else:
+        tracing.log(tracing.SUMMARY, "\nAlice transfers the circuit to Bob.")
+    bob.receive_circuit(alice.circuit)
 
     for wire in alice.input_wires:
         # Transfer the labels corresponding to Alice's input to Bob
-        bob.known_labels[wire] = alice.wire_labels[wire][alice.input_wires[wire]]
+        w = circuit.wire_ids[wire]
+        bob.known_labels[w] = alice.input_labels(w)[alice.input_wires[wire]]
 
     # Simulate OT between Alice and Bob so that Bob can acquire labels corresponding to his input
-    print()
-    print("Bob uses OT to request from Alice labels corresponding to his input bits:")
+    tracing.log(tracing.SUMMARY, "\nBob uses OT to request from Alice labels corresponding to his input bits:")
     bob.request_labels(alice)
+    timings['transfer'] = time.perf_counter() - start
 
     # Instruct Bob to evaluate the circuit
-    print()
-    print("Bob proceeds to evaluate the circuit:")
-    result = bob.evaluate()
-
-    print()
-    print("Alice reveals the value of the label that Bob computed as the circuit's output:")
+    tracing.log(tracing.SUMMARY, "\nBob proceeds to evaluate the circuit:")
+    start = time.perf_counter()
+    if config.GARBLED_FILE:
+        result, _ = bob.evaluate_file(config.GARBLED_FILE)
+    else:
+        result = bob.evaluate()
+    timings['evaluate'] = time.perf_counter() - start
+
+    tracing.log(tracing.SUMMARY, "\nAlice reveals the values of the labels that Bob computed as the circuit's outputs:")
     # Instruct Alice to reveal the result of Bob's computation
-    alice.reveal_result(result)
+    start = time.perf_counter()
+    outputs = alice.reveal_result(result)
+    timings['decode'] = time.perf_counter() - start
+    return outputs, timings
+
+
+'''
+Run the protocol with the garbled tables streamed from Alice to Bob: Bob receives the structure of the circuit and the 
+labels of the inputs up front, and then evaluates each gate as soon as Alice has garbled it, so that the garbled tables 
+are never all in memory at once. Garbling and evaluation are interleaved, so they are timed together, as the 'stream' 
+phase.
+'''
+
+
+def run_streaming_protocol(circuit, alice, bob):
+    timings = dict()
+    alice.circuit = circuit
+
+    tracing.log(tracing.SUMMARY, "\nAlice generates labels for the input wires of the circuit:")
+    start = time.perf_counter()
+    alice.prepare_labels()
+    timings['garble'] = time.perf_counter() - start
+
+    tracing.log(tracing.SUMMARY, "\nAlice transfers the structure of the circuit, without any garbled table, to Bob.")
+    start = time.perf_counter()
+    bob.receive_circuit(alice.circuit)
+    for wire in alice.input_wires:
+        w = circuit.wire_ids[wire]
+        bob.known_labels[w] = alice.input_labels(w)[alice.input_wires[wire]]
+
+    tracing.log(tracing.SUMMARY, "\nBob uses OT to request from Alice labels corresponding to his input bits:")
+    bob.request_labels(alice)
+    timings['transfer'] = time.perf_counter() - start
+
+    tracing.log(tracing.SUMMARY, "\nAlice garbles the gates one by one, streaming each garbled table to Bob, who "
+                                 "evaluates the gate as soon as its table arrives:")
+    start = time.perf_counter()
+    result = bob.evaluate_stream(alice.garble_stream())
+    timings['stream'] = time.perf_counter() - start
+
+    tracing.log(tracing.SUMMARY, "\nAlice reveals the values of the labels that Bob computed as the circuit's outputs:")
+    start = time.perf_counter()
+    outputs = alice.reveal_result(result)
+    timings['decode'] = time.perf_counter() - start
+    return outputs, timings
+
+
+'''
+Read input vectors from a file, one per line, each a sequence of 0s and 1s (optionally separated by commas or spaces).
+Blank lines are ignored.
+'''
+
+
+def read_input_vectors(path, count):
+    vectors = []
+    with open(path) as f:
+        for line in f:
+            bits = [int(c) for c in line if c in '01']
+            if not bits and count > 0:
+                continue
+            if len(bits) != count:
+                raise ValueError("Expected input vectors of {} bits in {}, but got {}".format(count, path, len(bits)))
+            vectors.append(bits)
+    return vectors
+
+
+'''
+Split the values of the output wires into the circuit's output values, of the given sizes, each as a string of bits.
+'''
+
+
+def split_outputs(outputs, sizes):
+    output_bits = ''.join(map(str, outputs))
+    output_values = []
+    for size in sizes:
+        output_values.append(output_bits[:size])
+        output_bits = output_bits[size:]
+    return output_values
+
+
+'''
+Headless mode: run the protocol once for each pair of input vectors, on the circuit loaded (once) from the Bristol file, 
+without any user interaction. The i-th run uses the i-th line of the Alice and Bob input files; a file with a single 
+line supplies the same input to every run. Fresh labels (and a fresh R) are generated for every run, since a garbled 
+circuit must never be evaluated twice.
+
+Writes one JSON object per run, on its own line, to the results stream: the inputs, the outputs, and the time spent in 
+each phase of the protocol (in seconds), as well as the largest number of live wires each party held with wire liveness.
+'''
+
+
+def run_headless(args, results):
+    start = time.perf_counter()
+    circuit, input_groups, output_groups = bristol.load(args.bristol)
+    load_time = time.perf_counter() - start
+
+    alice_wires = input_groups[0] if input_groups else []
+    bob_wires = [w for group in input_groups[1:] for w in group]
+    alice_vectors = read_input_vectors(args.alice_inputs, len(alice_wires)) if args.alice_inputs else [[]]
+    bob_vectors = read_input_vectors(args.bob_inputs, len(bob_wires)) if args.bob_inputs else [[]]
+    runs = max(len(alice_vectors), len(bob_vectors))
+    if len(alice_vectors) == 1:
+        alice_vectors = alice_vectors * runs
+    if len(bob_vectors) == 1:
+        bob_vectors = bob_vectors * runs
+    if len(alice_vectors) != len(bob_vectors):
+        raise ValueError("Alice has {} input vectors, but Bob has {}".format(len(alice_vectors), len(bob_vectors)))
+
+    pools = None
+    for run, (alice_values, bob_values) in enumerate(zip(alice_vectors, bob_vectors)):
+        alice = Alice()
+        bob = Bob()
+        alice.input_wires = {circuit.wires[w]: v for w, v in zip(alice_wires, alice_values)}
+        for w, v in circuit.constants.items():
+            alice.input_wires[circuit.wires[w]] = v
+        bob.input_wires = {circuit.wires[w]: v for w, v in zip(bob_wires, bob_values)}
+        if args.ot_pool:
+            if pools is None:
+                prepare_ot_pools(alice, bob, args.ot_pool, runs * len(bob_wires))
+                pools = (alice.ot_pool, bob.ot_pool)
+            alice.ot_pool, bob.ot_pool = pools
+
+        outputs, timings = run_protocol(circuit, alice, bob)
+        timings['load'] = load_time
+        result = {
+            'run': run,
+            'circuit': args.bristol,
+            'alice_input': ''.join(map(str, alice_values)),
+            'bob_input': ''.join(map(str, bob_values)),
+            'outputs': split_outputs(outputs, [len(group) for group in output_groups]),
+            'timings': timings,
+        }
+        if config.USE_WIRE_LIVENESS:
+            result['peak_live_wires'] = {'alice': alice.peak_live_wires, 'bob': bob.peak_live_wires}
+        results.write(json.dumps(result) + '\n')
+
+    if args.ot_pool and pools is not None:
+        save_ot_pools(alice, bob, args.ot_pool)
+
+
+'''
+Run as Alice, in her own process: load the circuit, wait for Bob to connect at the address given with --listen, and run 
+the protocol with him over the connection (see network.py), once per input vector of hers. Her inputs are read from 
+the file given with --alice-inputs, in which case one JSON object is written per run, as in headless mode, along with 
+the traffic of each phase; otherwise, she enters them when prompted, for a single run.
+'''
+
+
+def run_alice_remote(args, results):
+    start = time.perf_counter()
+    circuit, input_groups, output_groups = bristol.load(args.bristol)
+    load_time = time.perf_counter() - start
+    alice_wires = input_groups[0] if input_groups else []
+    bob_wires = [w for group in input_groups[1:] for w in group]
+    output_sizes = [len(group) for group in output_groups]
+
+    if args.alice_inputs:
+        vectors = read_input_vectors(args.alice_inputs, len(alice_wires))
+    else:
+        print("Alice supplies {} input bits (wires {}); please enter them as a sequence of 0s and 1s.".format(
+            len(alice_wires), describe_wires(circuit, alice_wires)))
+        vectors = [read_bits(len(alice_wires))]
+
+    def new_alice(run):
+        alice = Alice()
+        alice.input_wires = {circuit.wires[w]: v for w, v in zip(alice_wires, vectors[run])}
+        for w, v in circuit.constants.items():
+            alice.input_wires[circuit.wires[w]] = v
+        return alice
+
+    def done(run, outputs, timings, traffic):
+        timings['load'] = load_time
+        if args.alice_inputs:
+            results.write(json.dumps({
+                'run': run,
+                'party': 'alice',
+                'circuit': args.bristol,
+                'alice_input': ''.join(map(str, vectors[run])),
+                'outputs': split_outputs(outputs, output_sizes),
+                'timings': timings,
+                'traffic': traffic,
+            }) + '\n')
+
+    tracing.log(tracing.SUMMARY, "ALICE: Waiting for Bob to connect to {}", args.listen)
+    sock = network.accept(args.listen)
+    if config.USE_OVERLAP:
+        asyncio.run(overlap.serve_alice(sock, circuit, bob_wires, output_sizes, len(vectors), new_alice, done))
+    else:
+        network.serve_alice(sock, circuit, bob_wires, output_sizes, len(vectors), new_alice, done)
+
+
+'''
+Run as Bob, in his own process: connect to Alice at the address given with --connect, receive the circuit from her, and 
+evaluate it with the optimizations she garbled it with. His inputs are read from the file given with --bob-inputs (one 
+vector per run, or a single vector for every run), in which case one JSON object is written per run; otherwise, he 
+enters them when prompted.
+'''
+
+
+def run_bob_remote(args, results):
+    def inputs(runs, bob_inputs):
+        if not args.bob_inputs:
+            for _ in range(runs):
+                print("Bob supplies {} input bits; please enter them as a sequence of 0s and 1s.".format(bob_inputs))
+                yield read_bits(bob_inputs)
+            return
+        vectors = read_input_vectors(args.bob_inputs, bob_inputs)
+        if len(vectors) == 1:
+            vectors = vectors * runs
+        if len(vectors) != runs:
+            raise ValueError("Alice runs the protocol {} times, but Bob has {} input vectors".format(runs,
+                                                                                                 len(vectors)))
+        yield from vectors
+
+    def done(run, values, output_sizes, outputs, timings, traffic):
+        if args.bob_inputs:
+            results.write(json.dumps({
+                'run': run,
+                'party': 'bob',
+                'bob_input': ''.join(map(str, values)),
+                'outputs': split_outputs(outputs, output_sizes),
+                'timings': timings,
+                'traffic': traffic,
+            }) + '\n')
+
+    sock = network.dial(args.connect)
+    if config.USE_OVERLAP:
+        asyncio.run(overlap.serve_bob(sock, Bob, inputs, done))
+    else:
+        network.serve_bob(sock, Bob, inputs, done)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--point-permute", help="enable the point-and-permute optimization", action='store_true')
+    parser.add_argument("--free-xor", help="enable the free-XOR optimization", action='store_true')
+    parser.add_argument("--grr3", help="enable the GRR3 optimization", action='store_true')
+    parser.add_argument("--half-and", help="enable the half-gates optimization for AND and OR gates",
+                        action='store_true')
+    parser.add_argument("--flexor", help="enable the FleXOR optimization for XOR gates", action='store_true')
+    parser.add_argument("--grr2", help="enable the GRR2 optimization for AND and OR gates (XOR gates use GRR3)",
+                        action='store_true')
+    parser.add_argument("--fixed-key-aes", help="garble with fixed-key AES instead of SHA-256 derived keys",
+                        action='store_true')
+    parser.add_argument("--batch", help="garble and evaluate one layer at a time with bulk AES calls",
+                        action='store_true')
+    parser.add_argument("--single-pass", help="place garbled rows in their final slot as they are garbled, instead "
+                                              "of permuting tables in a second pass", action='store_true')
+    parser.add_argument("--parallel", help="garble the gates of each layer with a pool of processes (requires "
+                                           "--single-pass)", action='store_true')
+    parser.add_argument("--parallel-evaluation", help="evaluate the gates of each layer with a pool of processes",
+                        action='store_true')
+    parser.add_argument("--stream", help="stream garbled tables to Bob as they are garbled, so that they are never all "
+                                         "in memory (requires --single-pass)", action='store_true')
+    parser.add_argument("--liveness", help="drop the labels of each wire as soon as its last consumer is processed",
+                        action='store_true')
+    parser.add_argument("--optimize", help="fold constants, merge duplicate gates and remove dead gates before "
+                                           "garbling the circuit", action='store_true')
+    parser.add_argument("--minimize-and", help="rewrite the circuit with as few AND and OR gates as possible, since "
+                                               "XOR gates are free (requires --free-xor)", action='store_true')
+    parser.add_argument("--processes", help="number of processes for parallel garbling and evaluation (default: one "
+                                            "per core)", type=int, metavar='N')
+    parser.add_argument("--ot-extension", help="transfer Bob's input labels with IKNP OT extension",
+                        action='store_true')
+    parser.add_argument("--garbled-file", help="save the garbled circuit to FILE, and have Bob evaluate it from there",
+                        metavar='FILE')
+    parser.add_argument("--listen", help="run as Alice only, and wait for Bob to connect at ADDRESS (HOST:PORT, or the "
+                                         "path of a Unix socket)", metavar='ADDRESS')
+    parser.add_argument("--connect", help="run as Bob only, connecting to Alice at ADDRESS; Bob evaluates with the "
+                                          "optimizations Alice garbles with", metavar='ADDRESS')
+    parser.add_argument("--overlap", help="with --listen or --connect, overlap the OTs, the transfer of the garbled "
+                                          "tables and their evaluation (Alice requires --single-pass)",
+                        action='store_true')
+    parser.add_argument("--shared-memory", help="with --listen, hand the garbled tables over to Bob through shared "
+                                                "memory, when he runs on the same host", action='store_true')
+    parser.add_argument("--bristol", help="load the circuit from a Bristol (or Bristol Fashion) file",
+                        metavar='FILE')
+    parser.add_argument("--ot-pool", help="transfer Bob's input labels with random OTs precomputed offline, stored in "
+                                          "OT_POOL.alice and OT_POOL.bob", metavar='OT_POOL')
+    parser.add_argument("--alice-inputs", help="run headless, with Alice's input vectors read from FILE (one per line)",
+                        metavar='FILE')
+    parser.add_argument("--bob-inputs", help="run headless, with Bob's input vectors read from FILE (one per line)",
+                        metavar='FILE')
+    parser.add_argument("--trace", help="how much of the protocol to print: nothing, a summary, every gate, or every "
+                                        "row of every garbled table (the default, except in headless mode)",
+                        choices=list(tracing.LEVELS))
+    parser.add_argument("--output", help="in headless mode, write the JSON results to FILE instead of the standard "
+                                         "output", metavar='FILE')
+    args = parser.parse_args()
+
+    if args.grr3 and not args.point_permute:
+        parser.error("The GRR3 optimization requires the point-and-permute optimization to be enabled")
+
+    if args.half_and and not (args.free_xor and args.point_permute):
+        parser.error("The half-gates optimization requires the free-XOR and point-and-permute optimizations to be "
+                     "enabled")
+
+    if args.half_and and args.grr3:
+        parser.error("The half-gates optimization cannot be combined with GRR3")
+
+    if args.flexor and not args.point_permute:
+        parser.error("The FleXOR optimization requires the point-and-permute optimization to be enabled")
+
+    if args.flexor and (args.free_xor or args.half_and):
+        parser.error("The FleXOR optimization cannot be combined with free-XOR or half-gates")
+
+    if args.grr2 and not args.point_permute:
+        parser.error("The GRR2 optimization requires the point-and-permute optimization to be enabled")
+
+    if args.grr2 and (args.free_xor or args.half_and):
+        parser.error("The GRR2 optimization cannot be combined with free-XOR or half-gates")
+
+    if args.minimize_and and not args.free_xor:
+        parser.error("AND minimization requires the free-XOR optimization to be enabled")
+
+    if args.batch and not args.fixed_key_aes:
+        parser.error("Batched garbling requires fixed-key AES to be enabled")
+
+    if args.parallel and not args.single_pass:
+        parser.error("Parallel garbling requires single-pass garbling to be enabled")
+
+    if args.stream and not args.single_pass:
+        parser.error("Streaming requires single-pass garbling to be enabled")
+
+    if args.stream and (args.parallel or args.parallel_evaluation):
+        parser.error("Streaming cannot be combined with parallel garbling or evaluation")
+
+    if args.garbled_file and (args.stream or args.parallel_evaluation):
+        parser.error("A garbled circuit file cannot be combined with streaming or parallel evaluation")
+
+    if args.liveness and (args.parallel or args.parallel_evaluation):
+        parser.error("Wire liveness cannot be combined with parallel garbling or evaluation")
+
+    if args.listen and args.connect:
+        parser.error("A process runs either as Alice (--listen) or as Bob (--connect), not both")
+
+    if args.listen and not args.bristol:
+        parser.error("Running as Alice requires a circuit file, given with --bristol")
+
+    if args.connect and args.bristol:
+        parser.error("Bob receives the circuit from Alice, so no circuit file can be given with --connect")
+
+    if (args.listen or args.connect) and (args.ot_pool or args.garbled_file):
+        parser.error("Precomputed OTs and garbled circuit files cannot be combined with --listen or --connect")
+
+    if args.overlap and not (args.listen or args.connect):
+        parser.error("Overlapping the phases of the protocol requires running Alice and Bob separately, with "
+                     "--listen or --connect")
+
+    if args.overlap and args.listen and not args.single_pass:
+        parser.error("Overlapping the phases of the protocol requires single-pass garbling to be enabled")
+
+    if args.overlap and (args.liveness or args.parallel or args.parallel_evaluation):
+        parser.error("Overlapping the phases of the protocol cannot be combined with wire liveness, or parallel "
+                     "garbling or evaluation")
+
+    if args.shared_memory and not args.listen:
+        parser.error("Alice chooses whether the garbled tables go through shared memory, so --shared-memory requires "
+                     "--listen")
+
+    if args.shared_memory and args.overlap:
+        parser.error("Shared memory cannot be combined with overlapping the phases of the protocol")
+
+    if (args.alice_inputs or args.bob_inputs) and not (args.bristol or args.connect):
+        parser.error("Headless mode requires a circuit file, given with --bristol")
+
+    if args.listen or args.connect:
+        # with an input file, the party's only output is the JSON results, unless tracing is explicitly requested
+        headless = args.alice_inputs if args.listen else args.bob_inputs
+        config.TRACE_LEVEL = tracing.LEVELS[args.trace or ('off' if headless else 'row')]
+        results = open(args.output, 'w') if args.output else sys.stdout
+        configure(args)
+        if args.listen:
+            run_alice_remote(args, results)
+        else:
+            run_bob_remote(args, results)
+        if args.output:
+            results.close()
+        return
+
+    if args.alice_inputs or args.bob_inputs:
+        # in headless mode, the only output is the JSON results, unless tracing is explicitly requested
+        config.TRACE_LEVEL = tracing.LEVELS[args.trace or 'off']
+        results = open(args.output, 'w') if args.output else sys.stdout
+        configure(args)
+        run_headless(args, results)
+        if args.output:
+            results.close()
+        return
+
+    config.TRACE_LEVEL = tracing.LEVELS[args.trace or 'row']
+    configure(args)
+
+    alice = Alice()
+    bob = Bob()
+
+    if args.bristol:
+        circuit = load_bristol_circuit(args.bristol, alice, bob)
+    else:
+        circuit = define_circuit(alice, bob)
+
+    if args.ot_pool:
+        # Alice and Bob precompute random OTs before they need them; this doesn't depend on their inputs
+        tracing.log(tracing.SUMMARY, "\nOffline phase: Alice and Bob prepare precomputed random OTs for Bob's inputs:")
+        prepare_ot_pools(alice, bob, args.ot_pool, len(bob.input_wires))
+
+    run_protocol(circuit, alice, bob)
+    if args.ot_pool:
+        save_ot_pools(alice, bob, args.ot_pool)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,785 @@
+import os
+import socket
+import stat
+import struct
+import time
+
+import config
+import gcfile
+import label
+import ot
+import ring
+import tracing
+from circuit import Circuit
+from gate import Gate
+
+'''
+A two-party runtime, in which Alice and Bob are separate processes, possibly on separate hosts, which only talk to each
+other through a socket: a TCP connection, or a Unix socket between processes on the same host. Unlike in main.py, Bob
+never gets to look at Alice's objects: everything he learns, he learns from the messages below.
+
+Every message is a frame: a 5-byte header holding the kind of message and the length of its payload (see FRAME),
+followed by the payload. Integers are little-endian; labels and ciphertexts are 16 bytes, big-endian, as in gcfile.py.
+Writes go through a large buffer, which is only flushed once a party is about to wait for the other (or is done), so
+that a stream of messages in one direction costs a few large sends rather than one per message; garbled tables are
+sent in batches of TABLE_BATCH gates per message.
+
+For every run of the protocol:
+    Alice -> Bob    HELLO           (once per connection) the optimizations Alice garbles with, which Bob adopts, the
+                                    number of runs, the number of Bob's input bits, and the sizes of the output values
+    Alice -> Bob    RING            (once per connection, with shared memory) the name and capacity of the ring through
+                                    which the garbled tables are handed over (see ring.py)
+    Alice -> Bob    CIRCUIT         the structure of the circuit, and which input wires are Bob's
+    Alice -> Bob    TABLES ...      the garbled tables, unless they are streamed
+    Alice -> Bob    INPUT_LABELS    the labels of Alice's inputs
+    Alice <-> Bob   OT_* ...        the OTs of the labels of Bob's inputs (with OT extension, Bob is the sender of the
+                                    base OTs)
+    Alice -> Bob    TABLES ...      the garbled tables, as Alice garbles them, with streaming
+                                    (with shared memory, RING_TABLES messages instead, each with the position of a
+                                    batch of tables in the ring)
+    Bob -> Alice    OUTPUT_LABELS   the labels Bob computed for the circuit's output wires
+    Alice -> Bob    RESULT          the values they encode
+
+Both parties count the bytes they send and receive, and the round trips, in each phase of the protocol (see
+Channel.traffic).
+'''
+
+KINDS = ['HELLO', 'CIRCUIT', 'TABLES', 'INPUT_LABELS', 'OT_OPEN', 'OT_ANSWER', 'OT_ENCRYPTED', 'OT_COLUMNS',
+         'OT_PAIRS', 'OUTPUT_LABELS', 'RESULT', 'RING', 'RING_TABLES']
+(HELLO, CIRCUIT, TABLES, INPUT_LABELS, OT_OPEN, OT_ANSWER, OT_ENCRYPTED, OT_COLUMNS, OT_PAIRS, OUTPUT_LABELS,
+ RESULT, RING, RING_TABLES) = range(len(KINDS))
+
+# kind, payload length
+FRAME = struct.Struct('<BI')
+# optimization flags (see gcfile.FLAGS), protocol flags (below), runs, Bob's input bits, number of output values
+HELLO_HEADER = struct.Struct('<HBIII')
+STREAMING, BATCHED, OT_EXTENSION, OVERLAPPED, SHARED_MEMORY = 1, 2, 4, 8, 16
+# wires, input wires, gates, output wires, Bob's input wires
+CIRCUIT_HEADER = struct.Struct('<IIIII')
+# the capacity of the ring, followed by its name
+RING_HEADER = struct.Struct('<Q')
+# the position and length of a batch of tables in the ring
+RING_TABLES_HEADER = struct.Struct('<QI')
+
+BLOCK_BYTES = 16
+BUFFER_BYTES = 1 << 20
+TABLE_BATCH = 4096
+# how long Bob keeps trying to connect, in seconds, in case Alice is not listening yet
+CONNECT_TIMEOUT = 30
+
+
+'''
+The bytes sent and received, and the flights of messages, in each phase of the protocol. Consecutive messages in the 
+same direction form a flight; a round trip is a flight in each direction, and a flight in a single direction counts 
+as one.
+'''
+
+
+class Traffic:
+
+    def __init__(self):
+        self.phases = dict()
+        self._sending = dict()  # the direction of the last message of each phase
+
+    def sent(self, phase, size):
+        self._count(phase, True)['bytes_sent'] += size
+
+    def received(self, phase, size):
+        self._count(phase, False)['bytes_received'] += size
+
+    def _count(self, phase, sending):
+        counts = self.phases.setdefault(phase, {'bytes_sent': 0, 'bytes_received': 0, 'flights': 0})
+        if self._sending.get(phase) is not sending:
+            counts['flights'] += 1
+            self._sending[phase] = sending
+        return counts
+
+    '''
+    Returns the bytes sent and received, and the round trips, of each phase.
+    '''
+
+    def report(self):
+        return {phase: {'bytes_sent': counts['bytes_sent'], 'bytes_received': counts['bytes_received'],
+                        'round_trips': (counts['flights'] + 1) // 2}
+                for phase, counts in self.phases.items()}
+
+
+'''
+A connection to the other party, over which framed messages are sent and received, and whose traffic is counted 
+towards the current phase of the protocol.
+'''
+
+
+class Channel:
+
+    def __init__(self, sock):
+        self.socket = sock
+        self._reader = sock.makefile('rb', buffering=BUFFER_BYTES)
+        self._writer = sock.makefile('wb', buffering=BUFFER_BYTES)
+        self._traffic = Traffic()
+        self._phase = 'setup'
+        self.ring = None  # the ring through which the garbled tables go, with shared memory
+
+    '''
+    Count the messages that follow towards the given phase of the protocol.
+    '''
+
+    def start_phase(self, name):
+        self._phase = name
+
+    '''
+    Send a message of the given kind. It is only buffered: it goes out once the buffer is full, or once the channel
+    is flushed.
+    '''
+
+    def send(self, kind, payload=b''):
+        self._writer.write(FRAME.pack(kind, len(payload)))
+        self._writer.write(payload)
+        self._traffic.sent(self._phase, FRAME.size + len(payload))
+
+    def flush(self):
+        self._writer.flush()
+
+    '''
+    Wait for the next message, which must be of the given kind, and return its payload. Whatever was sent until then
+    is flushed first, since the other party may well be waiting for it before it answers.
+    '''
+
+    def receive(self, kind):
+        self._writer.flush()
+        received, length = FRAME.unpack(self._read(FRAME.size))
+        if received != kind:
+            raise ConnectionError("Expected a {} message, but received a {} message".format(
+                KINDS[kind], KINDS[received] if received < len(KINDS) else received))
+        payload = self._read(length)
+        self._traffic.received(self._phase, FRAME.size + length)
+        return payload
+
+    def _read(self, size):
+        data = self._reader.read(size)
+        if len(data) != size:
+            raise ConnectionError("The other party closed the connection")
+        return data
+
+    '''
+    Returns the bytes sent and received, and the round trips, in each phase since the last call (see Traffic), and 
+    starts counting afresh.
+    '''
+
+    def traffic(self):
+        traffic = self._traffic.report()
+        self._traffic = Traffic()
+        self._phase = 'setup'
+        return traffic
+
+    def close(self):
+        try:
+            self._writer.close()
+        finally:
+            self._reader.close()
+            self.socket.close()
+            if self.ring is not None:
+                self.ring.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+'''
+Parse an address: HOST:PORT for TCP (HOST may be left out, for localhost), or the path of a Unix socket.
+'''
+
+
+def _address(address):
+    host, colon, port = address.rpartition(':')
+    if colon and port.isdigit():
+        return socket.AF_INET, (host or 'localhost', int(port))
+    return socket.AF_UNIX, address
+
+
+def _connected(sock, family):
+    if family == socket.AF_INET:
+        # messages are batched by the channel itself
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+'''
+Wait for the other party to connect at the given address, and return the connected socket.
+'''
+
+
+def accept(address):
+    family, address = _address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as server:
+        if family == socket.AF_UNIX:
+            if os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode):
+                os.unlink(address)  # left behind by an earlier run
+        else:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(address)
+        server.listen(1)
+        sock, _ = server.accept()
+    if family == socket.AF_UNIX:
+        os.unlink(address)
+    return _connected(sock, family)
+
+
+'''
+Connect to the other party at the given address, and return the connected socket. Keeps trying for a while, in case 
+the other party has not started listening yet.
+'''
+
+
+def dial(address, timeout=CONNECT_TIMEOUT):
+    family, address = _address(address)
+    deadline = time.monotonic() + timeout
+    while True:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.connect(address)
+        except (ConnectionRefusedError, FileNotFoundError):
+            sock.close()
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+        else:
+            return _connected(sock, family)
+
+
+def listen(address):
+    return Channel(accept(address))
+
+
+def connect(address):
+    return Channel(dial(address))
+
+
+def _pack(fmt, values):
+    return struct.pack('<{}{}'.format(len(values), fmt), *values)
+
+
+def _unpack(fmt, payload, offset, count):
+    return struct.unpack_from('<{}{}'.format(count, fmt), payload, offset)
+
+
+def _pack_blocks(values):
+    return b''.join(value.to_bytes(BLOCK_BYTES, 'big') for value in values)
+
+
+def _unpack_blocks(payload, offset=0, count=None):
+    view = memoryview(payload)
+    if count is None:
+        count = (len(payload) - offset) // BLOCK_BYTES
+    return [int.from_bytes(view[offset + BLOCK_BYTES * i:offset + BLOCK_BYTES * (i + 1)], 'big')
+            for i in range(count)]
+
+
+def _pairs(values):
+    return list(zip(values[0::2], values[1::2]))
+
+
+'''
+The payload of the HELLO message: with which optimizations Alice garbles, and how the protocol will go. The given 
+protocol flags are added to those of the current configuration.
+'''
+
+
+def encode_hello(runs, bob_inputs, output_sizes, protocol=0):
+    protocol |= ((STREAMING if config.USE_STREAMING else 0) | (BATCHED if config.USE_BATCHED_GARBLING else 0) |
+                 (OT_EXTENSION if config.USE_OT_EXTENSION else 0) | (SHARED_MEMORY if config.USE_SHARED_MEMORY else 0))
+    return (HELLO_HEADER.pack(gcfile.enabled_flags(), protocol, runs, bob_inputs, len(output_sizes)) +
+            _pack('I', output_sizes))
+
+
+'''
+Bob adopts the optimizations of a HELLO message, since he must evaluate with the same ones Alice garbles with. Returns 
+the protocol flags, the number of runs, the number of Bob's input bits, and the sizes of the output values.
+'''
+
+
+def decode_hello(payload):
+    flags, protocol, runs, bob_inputs, outputs = HELLO_HEADER.unpack_from(payload)
+    for i, flag in enumerate(gcfile.FLAGS):
+        setattr(config, flag, bool(flags >> i & 1))
+    config.USE_STREAMING = bool(protocol & STREAMING)
+    config.USE_BATCHED_GARBLING = bool(protocol & BATCHED)
+    config.USE_OT_EXTENSION = bool(protocol & OT_EXTENSION)
+    config.USE_SHARED_MEMORY = bool(protocol & SHARED_MEMORY)
+    enabled = [flag for i, flag in enumerate(gcfile.FLAGS) if flags >> i & 1]
+    enabled += [name for bit, name in ((STREAMING, 'USE_STREAMING'), (BATCHED, 'USE_BATCHED_GARBLING'),
+                                       (OT_EXTENSION, 'USE_OT_EXTENSION'), (SHARED_MEMORY, 'USE_SHARED_MEMORY'))
+                if protocol & bit]
+    tracing.log(tracing.SUMMARY, "BOB: Alice garbles with {}", ", ".join(enabled) or "no optimizations")
+    return protocol, runs, bob_inputs, list(_unpack('I', payload, HELLO_HEADER.size, outputs))
+
+
+'''
+Alice: open the connection by telling Bob with which optimizations she garbles, how many times the protocol will run, 
+how many input bits Bob supplies, and the sizes of the output values.
+'''
+
+
+def send_hello(channel, runs, bob_inputs, output_sizes):
+    channel.send(HELLO, encode_hello(runs, bob_inputs, output_sizes))
+
+
+'''
+Bob: receive Alice's HELLO, and adopt her optimizations. Returns the number of runs, the number of Bob's input bits, 
+and the sizes of the output values.
+'''
+
+
+def receive_hello(channel):
+    protocol, runs, bob_inputs, output_sizes = decode_hello(channel.receive(HELLO))
+    return runs, bob_inputs, output_sizes
+
+
+'''
+The payload of the CIRCUIT message: the structure of the circuit (without its garbled tables), along with the ids of 
+Bob's input wires.
+'''
+
+
+def encode_circuit(circuit, bob_wires):
+    gates = circuit.gates
+    return b''.join([
+        CIRCUIT_HEADER.pack(len(circuit.wires), len(circuit.input_wires), len(gates), len(circuit.output_wires),
+                            len(bob_wires)),
+        _pack('I', [gate.in1_id for gate in gates]),
+        _pack('I', [gate.in2_id for gate in gates]),
+        _pack('I', circuit.output_wires),
+        _pack('I', bob_wires),
+        _pack('I', circuit.offsets) if config.USE_FLEXOR else b'',
+        bytes(gcfile.OP_CODES[gate.op] for gate in gates),
+    ])
+
+
+'''
+Rebuild the circuit Alice sent, from the payload of a CIRCUIT message. Bob only knows the wires by their ids, which 
+also serve as their identifiers. Returns the circuit, and the ids of Bob's input wires.
+'''
+
+
+def decode_circuit(payload):
+    num_wires, num_inputs, num_gates, num_outputs, num_bob_wires = CIRCUIT_HEADER.unpack_from(payload)
+    position = CIRCUIT_HEADER.size
+
+    def section(count, fmt='I'):
+        nonlocal position
+        values = _unpack(fmt, payload, position, count)
+        position += count * struct.calcsize(fmt)
+        return values
+
+    in1 = section(num_gates)
+    in2 = section(num_gates)
+    outputs = section(num_outputs)
+    bob_wires = section(num_bob_wires)
+    offsets = section(num_wires) if config.USE_FLEXOR else None
+    ops = section(num_gates, 'B')
+
+    circuit = Circuit()
+    circuit.wires = list(range(num_wires))
+    circuit.wire_ids = {w: w for w in circuit.wires}
+    circuit.input_wires = list(range(num_inputs))
+    for k in range(num_gates):
+        gate = Gate()
+        gate.id = k
+        gate.op = gcfile.OPS[ops[k]]
+        gate.in1 = gate.in1_id = in1[k]
+        gate.in2 = gate.in2_id = in2[k]
+        gate.out = gate.out_id = num_inputs + k
+        circuit.gates.append(gate)
+    circuit.output_wires = list(outputs)
+    circuit.output_names = list(outputs)
+    circuit.offsets = list(offsets) if offsets is not None else None
+    return circuit, list(bob_wires)
+
+
+'''
+Yields the payloads of the TABLES messages for the given garbled tables, given as an iterable of (gate id, garbled 
+table) pairs, batch gates per message. Each message holds the number of gates, their ids, the number of rows of each, 
+and then all of their rows.
+'''
+
+
+def encode_tables(tables, batch=TABLE_BATCH):
+    ids = []
+    rows = bytearray()
+    entries = []
+    for gate_id, table in tables:
+        ids.append(gate_id)
+        rows.append(len(table))
+        entries.extend(table)
+        if len(ids) == batch:
+            yield struct.pack('<I', len(ids)) + _pack('I', ids) + rows + _pack_blocks(entries)
+            ids, rows, entries = [], bytearray(), []
+    if ids:
+        yield struct.pack('<I', len(ids)) + _pack('I', ids) + rows + _pack_blocks(entries)
+
+
+'''
+Yields the (gate id, garbled table) pairs of the payload of a TABLES message.
+'''
+
+
+def decode_tables(payload):
+    n, = struct.unpack_from('<I', payload)
+    ids = _unpack('I', payload, 4, n)
+    rows = payload[4 + 4 * n:4 + 5 * n]
+    position = 4 + 5 * n
+    for gate_id, r in zip(ids, rows):
+        yield gate_id, _unpack_blocks(payload, position, r)
+        position += BLOCK_BYTES * r
+
+
+'''
+Alice: send garbled tables to Bob, given as an iterable of (gate id, garbled table) pairs. With shared memory, each 
+batch goes into the ring, and only its position goes over the socket; if the ring is full, the channel is flushed, so 
+that Bob learns about (and releases) the batches already in it.
+'''
+
+
+def send_tables(channel, tables):
+    for payload in encode_tables(tables):
+        if channel.ring is None:
+            channel.send(TABLES, payload)
+        else:
+            position = channel.ring.write(payload, channel.flush)
+            channel.send(RING_TABLES, RING_TABLES_HEADER.pack(position, len(payload)))
+
+
+'''
+Bob: receive the garbled tables of the given number of gates from Alice. Yields (gate id, garbled table) pairs as they
+arrive, like Alice.garble_stream, so that Bob can evaluate them as they come.
+'''
+
+
+def receive_tables(channel, count):
+    received = 0
+    while received < count:
+        if channel.ring is None:
+            for gate_id, table in decode_tables(channel.receive(TABLES)):
+                yield gate_id, table
+                received += 1
+            continue
+        # decode the batch in place, and only then let Alice reuse its space
+        position, length = RING_TABLES_HEADER.unpack(channel.receive(RING_TABLES))
+        view = channel.ring.read(position, length)
+        for gate_id, table in decode_tables(view):
+            yield gate_id, table
+            received += 1
+        view.release()
+        channel.ring.release(position, length)
+
+
+'''
+The payload of the INPUT_LABELS message: Alice's input wires, and the labels of her inputs.
+'''
+
+
+def encode_labels(wires, labels):
+    return struct.pack('<I', len(wires)) + _pack('I', wires) + _pack_blocks([l.value for l in labels])
+
+
+'''
+Returns the (wire id, label) pairs of the payload of an INPUT_LABELS message.
+'''
+
+
+def decode_labels(payload):
+    n, = struct.unpack_from('<I', payload)
+    return [(w, label.Label(value)) for w, value in zip(_unpack('I', payload, 4, n),
+                                                          _unpack_blocks(payload, 4 + 4 * n, n))]
+
+
+def encode_output_labels(labels):
+    return _pack_blocks([l.value for l in labels])
+
+
+def decode_output_labels(payload):
+    return [label.Label(value) for value in _unpack_blocks(payload)]
+
+
+'''
+Alice's side of the OTs of the labels of Bob's input wires, given their pairs of labels in the order of Bob's input 
+wires. It does no I/O itself, so that any driver can run it (see run_ot): start returns the messages to send first, 
+and as long as expecting is not None, the next message of that kind must be handed to handle, which returns the 
+messages to send in answer.
+
+With OT extension, Alice is the receiver of the base OTs, with the bits of her secret s as her choices.
+'''
+
+
+class OTSender:
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.expecting = None
+
+    def start(self):
+        if not self.messages:
+            return []
+        if config.USE_OT_EXTENSION:
+            self.extension = ot.ExtensionSender()
+            self.base = ot.BaseReceiver([self.extension.base_choice(i) for i in range(ot.KAPPA)])
+            self.expecting = OT_OPEN
+            return []
+        self.base = ot.BaseSender(len(self.messages))
+        self.expecting = OT_ANSWER
+        return [(OT_OPEN, _pack('H', [x for opening in self.base.open() for x in opening]))]
+
+    def handle(self, payload):
+        kind, self.expecting = self.expecting, None
+        if kind == OT_OPEN:
+            self.expecting = OT_ENCRYPTED
+            openings = _pairs(_unpack('H', payload, 0, 2 * ot.KAPPA))
+            return [(OT_ANSWER, _pack('H', self.base.respond(openings)))]
+        if kind == OT_ENCRYPTED:
+            self.expecting = OT_COLUMNS
+            seeds = self.base.decrypt(_pairs(_unpack_blocks(payload)))
+            self.extension.seeds = [seed.to_bytes() for seed in seeds]
+            return []
+        if kind == OT_COLUMNS:
+            column_bytes = (len(self.messages) + 7) // 8
+            u = [int.from_bytes(payload[column_bytes * i:column_bytes * (i + 1)], 'big') for i in range(ot.KAPPA)]
+            encrypted = self.extension.encrypt(u, self.messages)
+            tracing.log(tracing.SUMMARY, "ALICE: Sending {} pairs of labels by OT extension", len(encrypted))
+        else:
+            answers = _unpack('H', payload, 0, len(self.messages))
+            encrypted = self.base.encrypt(answers, self.messages)
+            tracing.log(tracing.SUMMARY, "ALICE: Sending {} pairs of labels by OT", len(encrypted))
+        return [(OT_PAIRS, _pack_blocks([c for pair in encrypted for c in pair]))]
+
+
+'''
+Bob's side of the OTs of the labels of his input wires, given his input bits in the order of his input wires; the 
+labels he receives end up in labels once expecting is None. With OT extension, Bob is the sender of the base OTs, 
+whose messages are his pairs of seeds.
+'''
+
+
+class OTReceiver:
+
+    def __init__(self, choices):
+        self.choices = choices
+        self.expecting = None
+        self.labels = []
+
+    def start(self):
+        if not self.choices:
+            return []
+        self.expecting = OT_PAIRS
+        if config.USE_OT_EXTENSION:
+            self.extension = ot.ExtensionReceiver(self.choices)
+            self.base = ot.BaseSender(ot.KAPPA)
+            self.expecting = OT_ANSWER
+            return [(OT_OPEN, _pack('H', [x for opening in self.base.open() for x in opening]))]
+        self.base = ot.BaseReceiver(self.choices)
+        self.expecting = OT_OPEN
+        return []
+
+    def handle(self, payload):
+        kind, self.expecting = self.expecting, None
+        if kind == OT_ANSWER:
+            self.expecting = OT_PAIRS
+            answers = _unpack('H', payload, 0, ot.KAPPA)
+            encrypted = self.base.encrypt(answers, self.extension.seeds)
+            column_bytes = (len(self.choices) + 7) // 8
+            return [(OT_ENCRYPTED, _pack_blocks([c for pair in encrypted for c in pair])),
+                    (OT_COLUMNS, b''.join(u.to_bytes(column_bytes, 'big') for u in self.extension.columns()))]
+        if kind == OT_OPEN:
+            self.expecting = OT_PAIRS
+            openings = _pairs(_unpack('H', payload, 0, 2 * len(self.choices)))
+            return [(OT_ANSWER, _pack('H', self.base.respond(openings)))]
+        encrypted = _pairs(_unpack_blocks(payload))
+        self.labels = (self.extension if config.USE_OT_EXTENSION else self.base).decrypt(encrypted)
+        return []
+
+
+'''
+Run either side of the OTs over the channel, until it is done.
+'''
+
+
+def run_ot(channel, party):
+    for kind, payload in party.start():
+        channel.send(kind, payload)
+    while party.expecting is not None:
+        for kind, payload in party.handle(channel.receive(party.expecting)):
+            channel.send(kind, payload)
+
+
+'''
+Log the traffic of each phase of a run, as returned by Channel.traffic.
+'''
+
+
+def report(party, traffic):
+    for phase, counts in traffic.items():
+        tracing.log(tracing.SUMMARY, "{}: {:8} {:>12} bytes sent {:>12} bytes received {:>4} round trips", party,
+                    phase, counts['bytes_sent'], counts['bytes_received'], counts['round_trips'])
+
+
+'''
+Alice's side of one run of the protocol, on the given circuit, once she knows her inputs. Bob's input wires are given
+by their ids. Returns the values of the output wires, the time spent in each phase, and the traffic of each phase.
+'''
+
+
+def run_alice(channel, circuit, alice, bob_wires):
+    timings = dict()
+    alice.circuit = circuit
+
+    start = time.perf_counter()
+    if config.USE_STREAMING:
+        tracing.log(tracing.SUMMARY, "\nAlice generates labels for the input wires of the circuit:")
+        alice.prepare_labels()
+    else:
+        tracing.log(tracing.SUMMARY, "\nAlice generates labels for the circuit, and garbles gates accordingly:")
+        alice.garble_gates()
+        alice.permute_entries()
+    timings['garble'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    channel.start_phase('transfer')
+    tracing.log(tracing.SUMMARY, "\nAlice sends the structure of the circuit to Bob.")
+    channel.send(CIRCUIT, encode_circuit(circuit, bob_wires))
+    if not config.USE_STREAMING:
+        tracing.log(tracing.SUMMARY, "\nAlice sends the garbled tables to Bob, {} gates per message.", TABLE_BATCH)
+        send_tables(channel, ((gate.id, gate.table) for gate in circuit.gates))
+    timings['transfer'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    channel.start_phase('inputs')
+    tracing.log(tracing.SUMMARY, "\nAlice sends the labels of her inputs to Bob, and the labels of his inputs by OT:")
+    wires = [circuit.wire_ids[wire] for wire in alice.input_wires]
+    labels = [alice.input_labels(w)[v] for w, v in zip(wires, alice.input_wires.values())]
+    channel.send(INPUT_LABELS, encode_labels(wires, labels))
+    run_ot(channel, OTSender([alice.input_labels(w) for w in bob_wires]))
+    timings['inputs'] = time.perf_counter() - start
+
+    if config.USE_STREAMING:
+        start = time.perf_counter()
+        channel.start_phase('stream')
+        tracing.log(tracing.SUMMARY, "\nAlice garbles the gates one by one, streaming the garbled tables to Bob:")
+        send_tables(channel, alice.garble_stream())
+        channel.flush()
+        timings['stream'] = time.perf_counter() - start
+
+    # this includes waiting for Bob to evaluate the circuit
+    start = time.perf_counter()
+    channel.start_phase('outputs')
+    output_labels = decode_output_labels(channel.receive(OUTPUT_LABELS))
+    tracing.log(tracing.SUMMARY, "\nAlice reveals the values of the labels that Bob computed as the circuit's outputs:")
+    outputs = alice.reveal_result(output_labels)
+    channel.send(RESULT, bytes(outputs))
+    channel.flush()
+    timings['outputs'] = time.perf_counter() - start
+
+    traffic = channel.traffic()
+    report("ALICE", traffic)
+    return outputs, timings, traffic
+
+
+'''
+Bob's side of one run of the protocol, given his input bits. Returns the values of the output wires, the time spent
+in each phase, and the traffic of each phase.
+'''
+
+
+def run_bob(channel, bob, values):
+    timings = dict()
+
+    start = time.perf_counter()
+    channel.start_phase('transfer')
+    circuit, bob_wires = decode_circuit(channel.receive(CIRCUIT))
+    if len(values) != len(bob_wires):
+        raise ValueError("Bob has {} input bits, but the circuit has {} input wires for him".format(len(values),
+                                                                                                  len(bob_wires)))
+    bob.receive_circuit(circuit)
+    bob.input_wires = dict(zip(bob_wires, values))
+    tracing.log(tracing.SUMMARY, "\nBob receives a circuit with {} gates from Alice.", len(circuit.gates))
+    if not config.USE_STREAMING:
+        gates = circuit.gates
+        for gate_id, table in receive_tables(channel, len(gates)):
+            gates[gate_id].table = table
+    timings['transfer'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    channel.start_phase('inputs')
+    tracing.log(tracing.SUMMARY, "\nBob receives the labels of Alice's inputs, and the labels of his inputs by OT:")
+    for w, l in decode_labels(channel.receive(INPUT_LABELS)):
+        bob.known_labels[w] = l
+    receiver = OTReceiver(values)
+    run_ot(channel, receiver)
+    for w, l in zip(bob_wires, receiver.labels):
+        bob.known_labels[w] = l
+    timings['inputs'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if config.USE_STREAMING:
+        channel.start_phase('stream')
+        tracing.log(tracing.SUMMARY, "\nBob evaluates each gate as soon as its garbled table arrives:")
+        output_labels = bob.evaluate_stream(receive_tables(channel, len(circuit.gates)))
+        timings['stream'] = time.perf_counter() - start
+    else:
+        tracing.log(tracing.SUMMARY, "\nBob proceeds to evaluate the circuit:")
+        output_labels = bob.evaluate()
+        timings['evaluate'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    channel.start_phase('outputs')
+    channel.send(OUTPUT_LABELS, encode_output_labels(output_labels))
+    outputs = list(channel.receive(RESULT))
+    tracing.log(tracing.SUMMARY, "BOB: Alice reveals that the outputs of the circuit are {}", ''.join(map(str, outputs)))
+    timings['outputs'] = time.perf_counter() - start
+
+    traffic = channel.traffic()
+    report("BOB", traffic)
+    return outputs, timings, traffic
+
+
+'''
+Alice's side of a session with Bob, over the given connected socket: say hello, and run the protocol the given number 
+of times on the given circuit, with the Alice returned by new_alice(run) for each run. Bob's input wires are given by 
+their ids, and the output values by their sizes. After each run, done(run, outputs, timings, traffic) is called.
+'''
+
+
+def serve_alice(sock, circuit, bob_wires, output_sizes, runs, new_alice, done):
+    with Channel(sock) as channel:
+        send_hello(channel, runs, len(bob_wires), output_sizes)
+        if config.USE_SHARED_MEMORY:
+            channel.ring = ring.RingWriter(config.SHARED_MEMORY_BYTES)
+            channel.send(RING, RING_HEADER.pack(channel.ring.capacity) + channel.ring.name.encode())
+        for run in range(runs):
+            done(run, *run_alice(channel, circuit, new_alice(run), bob_wires))
+
+
+'''
+Bob's side of a session with Alice, over the given connected socket. Once Alice has said how many runs there will be, 
+inputs(runs, count) must return Bob's input vector, of count bits, for each run. Each run is evaluated by the Bob 
+returned by new_bob(), and followed by a call to done(run, values, output_sizes, outputs, timings, traffic).
+'''
+
+
+def serve_bob(sock, new_bob, inputs, done):
+    with Channel(sock) as channel:
+        protocol, runs, bob_inputs, output_sizes = decode_hello(channel.receive(HELLO))
+        if protocol & OVERLAPPED:
+            raise ValueError("Alice overlaps the phases of the protocol, so Bob must as well (with --overlap)")
+        if protocol & SHARED_MEMORY:
+            payload = channel.receive(RING)
+            capacity, = RING_HEADER.unpack_from(payload)
+            name = payload[RING_HEADER.size:].decode()
+            try:
+                channel.ring = ring.RingReader(name, capacity)
+            except FileNotFoundError:
+                raise ValueError("Alice hands the garbled tables over in shared memory, so Bob must run on the same "
+                                 "host") from None
+        for run, values in enumerate(inputs(runs, bob_inputs)):
+            done(run, values, output_sizes, *run_bob(channel, new_bob(), values))
@@ -0,0 +1,312 @@
+import config
+import tracing
+from circuit import Circuit
+from gate import Gate
+
+'''
+An optimization pass over the gates of a circuit, before it is built (see Circuit.build), so that Alice doesn't garble
+(and Bob doesn't evaluate) gates whose result is known in advance, or already computed by another gate, or never used:
+ - constant propagation: a gate whose inputs are constant computes a constant, and a gate with one constant input
+   either computes a constant (x AND 0, x OR 1) or just passes its other input on (x AND 1, x OR 0, x XOR 0); so does
+   a gate whose inputs are the same wire (x AND x, x OR x), while x XOR x is 0,
+ - structural hashing: a gate that computes the same operation on the same inputs (in either order) as an earlier
+   gate is merged into it,
+ - dead-gate elimination: gates from which no output wire can be reached are removed.
+A gate that is removed leaves its output wire as another name for the wire that carries its value, as EQW does in
+Bristol circuits (see bristol.py). A wire whose value is constant can only be replaced by a wire that already carries
+that constant: one of the circuit's constant wires, or the first gate found to compute it, which is kept; so x XOR 1
+is left as it is (it is free with free-XOR anyway), as is any constant that no constant wire carries.
+
+The pass preserves the value of every output wire for all inputs, and never adds wires or gates, so the input wires
+and their values are unchanged.
+
+With free-XOR, XOR gates cost nothing, so the cost of a circuit is its number of AND and OR gates. A second pass,
+minimize_ands, rewrites the circuit into one with as few of them as it can find (see _Rewriter):
+ - x OR y is x XOR y when x and y are never both 1, and x XOR y XOR (x AND y) otherwise, so that no OR is left,
+ - NOT x AND NOT y is NOT (x XOR y) when x and y are never both 1 (an OR written with De Morgan's law),
+ - (p AND q) XOR (c AND (p XOR q)), the majority of p, q and c (the carry of a full adder, or the borrow of a
+   comparator, when one input is negated), is ((p XOR c) AND (q XOR c)) XOR c, with a single AND.
+Unlike the first pass, it adds wires, for the gates it introduces.
+'''
+
+# commutative operations, with the results of (x op 0) and (x op 1): a bit, or 'x' for x itself (None for NOT x)
+IDENTITIES = {'AND': (0, 'x'), 'OR': ('x', 1), 'XOR': ('x', None)}
+# the largest number of wires that the XOR of a wire is tracked over (see _Rewriter.form); wires that are the XOR of
+# more are treated as independent wires, so that the XOR-heavy parts of large circuits don't take quadratic memory
+MAX_FORM = 16
+
+
+'''
+The number of ciphertexts in the garbled table of a gate of the given operation, with the optimizations currently
+enabled in config. XOR gates are counted as free under FleXOR, although some need one or two translations, depending on
+the offset classes of their wires.
+'''
+
+
+def ciphertexts(op):
+    if op == 'XOR' and (config.USE_FREE_XOR or config.USE_FLEXOR):
+        return 0
+    if op != 'XOR' and (config.USE_HALF_AND or config.USE_GRR2):
+        return 2
+    return 3 if config.USE_GRR3 else 4
+
+
+'''
+Optimize the given gates (a dict of output wire -> gate, as given to Circuit.build), with the given output wires, and
+the given constant wires (a dict of wire -> value, for input wires that carry a constant). Gates that are kept are
+updated in place, to read their inputs from the wires that carry their values.
+
+Returns the remaining gates (in topological order), the output wires (each replaced by the wire that carries its value),
+and a report of the gates and ciphertexts saved.
+'''
+
+
+def optimize(gates, output_wires, constants=None):
+    order = Circuit.topological_order(gates)
+    if len(order) != len(gates):
+        raise ValueError("The circuit contains a cycle; gates must form a directed acyclic graph")
+
+    aliases = dict()  # removed gates' output wires -> the wire that carries their value
+    values = dict(constants or ())  # wires whose value is constant -> that value
+    constant_wires = {v: w for w, v in values.items()}  # a wire that carries each constant, if any
+    computed = dict()  # (op, in1, in2) -> the wire of the gate that computes it
+    kept = []
+    folded = merged = 0
+
+    for gate in order:
+        a = aliases.get(gate.in1, gate.in1)
+        b = aliases.get(gate.in2, gate.in2)
+        gate.in1, gate.in2 = a, b
+        value, wire = _fold(gate.op, a, b, values)
+        if value is not None:
+            wire = constant_wires.get(value)
+            if wire is None:
+                # the first gate to compute this constant provides it to the others
+                constant_wires[value] = gate.out
+                values[gate.out] = value
+        if wire is not None:
+            aliases[gate.out] = wire
+            folded += 1
+            continue
+        wire = computed.get((gate.op, a, b), computed.get((gate.op, b, a)))
+        if wire is not None:
+            aliases[gate.out] = wire
+            merged += 1
+            continue
+        computed[(gate.op, a, b)] = gate.out
+        kept.append(gate)
+
+    output_wires = [aliases.get(w, w) for w in output_wires]
+    remaining = _live_gates(kept, output_wires)
+
+    before = [gate.op for gate in order]
+    after = [gate.op for gate in remaining]
+    report = {
+        'gates_before': len(before),
+        'gates_after': len(after),
+        'folded': folded,
+        'merged': merged,
+        'dead': len(kept) - len(remaining),
+        'ciphertexts_before': sum(map(ciphertexts, before)),
+        'ciphertexts_after': sum(map(ciphertexts, after)),
+    }
+    tracing.log(tracing.SUMMARY, "Optimizer: {} of {} gates removed ({} folded into constants or their inputs, {} "
+                                 "duplicates merged, {} dead), saving {} of {} ciphertexts",
+                report['gates_before'] - report['gates_after'], report['gates_before'], folded, merged, report['dead'],
+                report['ciphertexts_before'] - report['ciphertexts_after'], report['ciphertexts_before'])
+    return {gate.out: gate for gate in remaining}, output_wires, report
+
+
+'''
+The value of a gate with the given operation and input wires, if it can be told without knowing the inputs. Returns a 
+pair: the constant bit it computes (or None), and the input wire whose value it passes on (or None).
+'''
+
+
+def _fold(op, a, b, values):
+    va = values.get(a)
+    vb = values.get(b)
+    if va is not None and vb is not None:
+        return int(va & vb if op == 'AND' else va | vb if op == 'OR' else va ^ vb), None
+    if a == b:
+        return (0, None) if op == 'XOR' else (None, a)
+    if vb is None:
+        a, va, vb = b, vb, va
+    if vb is None:
+        return None, None
+    result = IDENTITIES[op][vb]
+    return (None, a) if result == 'x' else (result, None)
+
+
+'''
+The gates, among the given ones (in topological order), on which the given output wires depend, in the same order.
+'''
+
+
+def _live_gates(gates, output_wires):
+    live = set(output_wires)
+    remaining = []
+    for gate in reversed(gates):
+        if gate.out in live:
+            live.add(gate.in1)
+            live.add(gate.in2)
+            remaining.append(gate)
+    remaining.reverse()
+    return remaining
+
+
+'''
+Rewrite the given gates (a dict of output wire -> gate, as given to Circuit.build), with the given output wires and
+constant wires (as for optimize), into gates that compute the same outputs with fewer AND and OR gates, if possible;
+XOR gates are assumed to be free. The gates given are left as they are. The new wires are named ('and', k), which
+can't clash with the names of wires in typed-in or Bristol circuits.
+
+Returns the new gates (in topological order), the output wires (each replaced by the wire that carries its value), and
+a report of the AND and OR gates before and after. If the rewrite would have more of them, the circuit is returned as
+it was.
+'''
+
+
+def minimize_ands(gates, output_wires, constants=None):
+    order = Circuit.topological_order(gates)
+    if len(order) != len(gates):
+        raise ValueError("The circuit contains a cycle; gates must form a directed acyclic graph")
+    one = next((w for w, v in (constants or dict()).items() if v == 1), None)
+    rewriter = _Rewriter(order, output_wires, one)
+    for gate in order:
+        rewriter.rewrite(gate)
+    rewritten = _live_gates(list(rewriter.gates.values()), rewriter.outputs(output_wires))
+
+    before = sum(gate.op != 'XOR' for gate in order)
+    after = sum(gate.op != 'XOR' for gate in rewritten)
+    report = {
+        'and_before': before,
+        'and_after': min(before, after),
+        'exclusive_ors': rewriter.exclusive_ors,
+        'de_morgan': rewriter.de_morgan,
+        'majorities': rewriter.majorities,
+    }
+    tracing.log(tracing.SUMMARY, "AND minimization: {} AND/OR gates before, {} after ({} ORs of exclusive terms, {} "
+                                 "ORs written with De Morgan's law, {} majorities rewritten)", before,
+                report['and_after'], rewriter.exclusive_ors, rewriter.de_morgan, rewriter.majorities)
+    if after > before:
+        return gates, output_wires, report
+    return {gate.out: gate for gate in rewritten}, rewriter.outputs(output_wires), report
+
+
+'''
+Rewrites a circuit gate by gate, in topological order, into new gates (see minimize_ands).
+
+To recognize the patterns above however the XORs in them are written, every wire is described by its form: the set of
+wires whose XOR it is, where only the circuit's inputs and the outputs of AND gates count (the constant 1 wire being
+one of the inputs). Two wires with the same form always carry the same value, so an XOR gate whose form is that of an
+existing wire is not needed. Since an AND gate's output is 1 only if both of its inputs are, the outputs of AND(p, q)
+and AND(r, s) are never both 1 if r (or s) has the form of p XOR q, or the form of NOT p (or NOT q), and conversely.
+
+Rewriting a majority replaces two AND gates with one, which only pays if nothing else needs the first two: this is
+checked with the number of gates of the original circuit that use each wire, where a NOT gate's uses are those of its
+output.
+'''
+
+
+class _Rewriter:
+
+    def __init__(self, order, output_wires, one):
+        self.one = one
+        self.gates = dict()  # the new gates, output wire -> gate, in topological order
+        self.aliases = dict()  # wires of the original circuit -> the new wire that carries their value
+        self.forms = dict()  # wire -> its form, for the outputs of XOR gates
+        self.by_form = dict()  # form -> a wire that has it
+        self.ands = dict()  # the output wire of each new AND gate -> its input wires
+        self.fresh = 0
+        self.exclusive_ors = self.de_morgan = self.majorities = 0
+
+        self.uses = dict()
+        for w in output_wires:
+            self.uses[w] = self.uses.get(w, 0) + 1
+        for gate in reversed(order):
+            if self._is_not(gate):
+                uses = self.uses.get(gate.out, 0)
+            else:
+                uses = 1
+            for w in {gate.in1, gate.in2}:
+                self.uses[w] = self.uses.get(w, 0) + uses
+
+    def _is_not(self, gate):
+        return gate.op == 'XOR' and self.one is not None and self.one in (gate.in1, gate.in2)
+
+    def outputs(self, output_wires):
+        return [self.aliases.get(w, w) for w in output_wires]
+
+    def rewrite(self, gate):
+        a = self.aliases.get(gate.in1, gate.in1)
+        b = self.aliases.get(gate.in2, gate.in2)
+        wire = {'AND': self.and_gate, 'OR': self.or_gate, 'XOR': self.xor_gate}[gate.op](a, b, gate.out)
+        if wire != gate.out:
+            self.aliases[gate.out] = wire
+
+    def form(self, w):
+        return self.forms.get(w) or frozenset((w,))
+
+    def _emit(self, op, a, b, out=None):
+        if out is None:
+            out = ('and', self.fresh)
+            self.fresh += 1
+        gate = Gate()
+        gate.op = op
+        gate.in1 = a
+        gate.in2 = b
+        gate.out = out
+        self.gates[out] = gate
+        return out
+
+    def xor_gate(self, a, b, out=None):
+        for x, y in ((a, b), (b, a)):
+            if x in self.ands and y in self.ands and self._single_use(x) and self._single_use(y):
+                p, q = self.ands[x]
+                for t, c in (self.ands[y], self.ands[y][::-1]):
+                    if self.form(t) == self.form(p) ^ self.form(q):
+                        # (p AND q) XOR (c AND (p XOR q)) is the majority of p, q and c
+                        self.majorities += 1
+                        m = self.and_gate(self.xor_gate(p, c), self.xor_gate(q, c))
+                        return self.xor_gate(m, c, out)
+
+        form = self.form(a) ^ self.form(b)
+        if form in self.by_form:
+            return self.by_form[form]
+        out = self._emit('XOR', a, b, out)
+        if len(form) <= MAX_FORM:
+            self.forms[out] = form
+            self.by_form[form] = out
+        return out
+
+    def and_gate(self, a, b, out=None):
+        if self.one is not None:
+            # NOT x AND NOT y, with x and y never both 1, is NOT (x XOR y)
+            x = self.by_form.get(self.form(a) ^ {self.one})
+            y = self.by_form.get(self.form(b) ^ {self.one})
+            if x in self.ands and y in self.ands and self._exclusive(x, y):
+                self.de_morgan += 1
+                return self.xor_gate(self.xor_gate(x, y), self.one, out)
+
+        out = self._emit('AND', a, b, out)
+        self.ands[out] = (a, b)
+        self.by_form[frozenset((out,))] = out
+        return out
+
+    def or_gate(self, a, b, out=None):
+        if a in self.ands and b in self.ands and self._exclusive(a, b):
+            self.exclusive_ors += 1
+            return self.xor_gate(a, b, out)
+        return self.xor_gate(self.xor_gate(a, b), self.and_gate(a, b), out)
+
+    def _exclusive(self, x, y):
+        (p, q), (r, s) = self.ands[x], self.ands[y]
+        x_xor, y_xor = self.form(p) ^ self.form(q), self.form(r) ^ self.form(s)
+        if self.form(r) == x_xor or self.form(s) == x_xor or self.form(p) == y_xor or self.form(q) == y_xor:
+            return True
+        return self.one is not None and any(self.form(i) ^ self.form(j) == {self.one} for i in (p, q) for j in (r, s))
+
+    def _single_use(self, w):
+        # wires added by the rewrite have a single use
+        return self.uses.get(w, 1) == 1
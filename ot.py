@@ -1,6 +1,10 @@
-import crypto_utils, bitstring, random, label
+import crypto_utils, random, label, os, tracing
+from Crypto.Cipher import AES
 from Crypto.Util import number
 
+# The number of base OTs performed by OT extension, i.e. its security parameter
+KAPPA = 128
+
 def egcd(a, b):
     if a == 0:
         return (b, 0, 1)
@@ -22,13 +26,16 @@ let Alice be the sender and Bob the receiver.
 In a real implementation, we would employ twisted Edwards curves as the paper suggests.
 Since this is a toy implementation, we will the multiplicative group of integers modulo p for some small prime p
 so that computations can be verified manually without too much difficulty if desired.
+If verbose is False, the steps of the protocol are not printed (e.g. when it is used for the base OTs of OT extension).
 
 This implementation is NOT cryptographically secure whatsoever;
 it exists to demonstrate the simple OT protocol using a toy group (Z_p) with toy parameters (<2^16)
 
 '''
-def simplest_OT(m0, m1, i):
-    print("OT: Alice, the sender, has messages m0 = {} and m1 = {}. Bob, the receiver wishes to receive message m{}.".format(m0, m1, i))
+def simplest_OT(m0, m1, i, verbose=True):
+    log = tracing.log if verbose else lambda *args: None
+    log(tracing.GATE, "OT: Alice, the sender, has messages m0 = {} and m1 = {}. Bob, the receiver wishes to receive "
+                      "message m{}.", m0, m1, i)
     # the finite group of integers upon which we operate; 65521 is the largest 16 bit prime. 
     # We use a group of prime order so that every element is a generator
     G = 65521 
@@ -38,44 +45,386 @@ def simplest_OT(m0, m1, i):
     a = random.randint(2, 2 ** 16 - 1) # Sender (Alice's) secret a
     b = random.randint(2, 2 ** 16 - 1) # Receiver (Bob's) secret b
 
-    print("OT: Alice generates a = {}, and keeps a secret from Bob".format(a))
-    print("OT: Bob generates b = {}, and keeps b secret from Alice".format(b))
+    log(tracing.GATE, "OT: Alice generates a = {}, and keeps a secret from Bob", a)
+    log(tracing.GATE, "OT: Bob generates b = {}, and keeps b secret from Alice", b)
 
 
-    A = (g ** a) % G
-    print("OT: Alice transfers A = g^a = {} to Bob".format(A))
+    A = pow(g, a, G)
+    log(tracing.GATE, "OT: Alice transfers A = g^a = {} to Bob", A)
     B = 0
     if i == 0:
-        B = (g ** b) % G
-        print("OT: Since i = 0, Bob calculates B = g^b = {} and transfers it to Alice".format(B))
+        B = pow(g, b, G)
+        log(tracing.GATE, "OT: Since i = 0, Bob calculates B = g^b = {} and transfers it to Alice", B)
     elif i == 1:
-        B = (((g ** b) % G) * A) % G
-        print("OT: Since i = 0, Bob calculates B = Ag^b = {} and transfers it to Alice".format(B))
+        B = (pow(g, b, G) * A) % G
+        log(tracing.GATE, "OT: Since i = 0, Bob calculates B = Ag^b = {} and transfers it to Alice", B)
     else:
         raise ValueError("The receiver must choose an index from (0, 1)")
     
-    k = (A ** b) % G
-    print("OT: Bob transfers B to Alice, and computes k = A^b = {}".format(k))
+    k = pow(A, b, G)
+    log(tracing.GATE, "OT: Bob transfers B to Alice, and computes k = A^b = {}", k)
 
-    k0 = (B ** a) % G
-    k1 = (((B * modinv(A, G) % G)) ** a) % G
-    print("OT: Alice computes k0 = B^a = {}, kl (B/A)^a = {}".format(k0, k1))
-    c0 = crypto_utils.encrypt(bitstring.Bits(uint=k0, length=2 ** 16), m0)
-    c1 = crypto_utils.encrypt(bitstring.Bits(uint=k1, length=2 ** 16), m1)
-    print("OT: Alice encrypts m0 with key k0 and transfers to Bob c0 = E(k0, m0) = {}".format(c0))
-    print("OT: Alice encrypts m1 with key k1 and transfers to Bob c1 = E(k1, m1) = {}".format(c1))
+    k0 = pow(B, a, G)
+    k1 = pow(B * modinv(A, G) % G, a, G)
+    log(tracing.GATE, "OT: Alice computes k0 = B^a = {}, kl (B/A)^a = {}", k0, k1)
+    c0 = crypto_utils.encrypt(k0, m0)
+    c1 = crypto_utils.encrypt(k1, m1)
+    log(tracing.GATE, "OT: Alice encrypts m0 with key k0 and transfers to Bob c0 = E(k0, m0) = 0x{:032x}", c0)
+    log(tracing.GATE, "OT: Alice encrypts m1 with key k1 and transfers to Bob c1 = E(k1, m1) = 0x{:032x}", c1)
 
     if i == 0:
-        decrypted_c0 = label.from_bitstring(crypto_utils.decrypt(bitstring.BitArray(uint=k, length=2 ** 16), c0.bytes))
-        print("OT: Bob successfully decrypts c0 to yield {}".format(decrypted_c0))
+        decrypted_c0 = label.Label(crypto_utils.decrypt(k, c0))
+        log(tracing.GATE, "OT: Bob successfully decrypts c0 to yield {}", decrypted_c0)
         # assert(decrypted_c0 == m0)
         return decrypted_c0
     else:
-        decrypted_c1 = label.from_bitstring(crypto_utils.decrypt(bitstring.BitArray(uint=k, length=2 ** 16), c1.bytes))
-        print("OT: Bob successfully decrypts c0 to yield {}".format(decrypted_c1))
+        decrypted_c1 = label.Label(crypto_utils.decrypt(k, c1))
+        log(tracing.GATE, "OT: Bob successfully decrypts c0 to yield {}", decrypted_c1)
         return decrypted_c1
+
+
+# the group of simplest_OT, the integers modulo the largest 16-bit prime, so that every element fits in 16 bits
+GROUP = 65521
+
+
+'''
+The sender's half of a batch of simplest OTs (see simplest_OT), for when the sender and the receiver are separate 
+processes that can only exchange messages: the sender opens every transfer with g and A = g^a, the receiver answers 
+with B, and the sender then sends both messages, encrypted under k0 = B^a and k1 = (B/A)^a. Every transfer has its own 
+g, a and b, as in simplest_OT, but a whole batch of transfers only takes those three messages. As insecure as 
+simplest_OT!
+'''
+
+
+class BaseSender:
+
+    def __init__(self, n):
+        self.g = [random.randint(2, GROUP - 1) for _ in range(n)]
+        self.a = [random.randint(2, 2 ** 16 - 1) for _ in range(n)]  # secret!
+        self.A = [pow(g, a, GROUP) for g, a in zip(self.g, self.a)]
+
+    '''
+    Returns the pairs (g, A) that open each transfer.
+    '''
+
+    def open(self):
+        return list(zip(self.g, self.A))
+
+    '''
+    Given the receiver's answers B, encrypt each pair of messages (m0, m1) under k0 = B^a and k1 = (B/A)^a. Returns the 
+    pairs of ciphertexts (c0, c1), as 128-bit integers.
+    '''
+
+    def encrypt(self, B, messages):
+        encrypted = []
+        for a, A, answer, (m0, m1) in zip(self.a, self.A, B, messages):
+            k0 = pow(answer, a, GROUP)
+            k1 = pow(answer * modinv(A, GROUP) % GROUP, a, GROUP)
+            encrypted.append((crypto_utils.encrypt(k0, m0), crypto_utils.encrypt(k1, m1)))
+        return encrypted
+
+
+'''
+The receiver's half of a batch of simplest OTs, with one choice bit per transfer.
+'''
+
+
+class BaseReceiver:
+
+    def __init__(self, choices):
+        if any(c not in (0, 1) for c in choices):
+            raise ValueError("The receiver must choose an index from (0, 1)")
+        self.choices = choices
+        self.keys = []  # the keys k = A^b, which decrypt the chosen messages. Secret!
+
+    '''
+    Answer the sender's openings (g, A) with B = g^b if the choice bit is 0, or B = A g^b if it is 1. 
+    Returns the answers B.
+    '''
+
+    def respond(self, openings):
+        B = []
+        for (g, A), c in zip(openings, self.choices):
+            b = random.randint(2, 2 ** 16 - 1)
+            self.keys.append(pow(A, b, GROUP))
+            B.append(pow(g, b, GROUP) * (A if c else 1) % GROUP)
+        return B
+
+    '''
+    Decrypt the message of his choice from each pair of ciphertexts. Returns the messages, as labels.
+    '''
+
+    def decrypt(self, encrypted):
+        return [label.Label(crypto_utils.decrypt(k, pair[c])) for k, pair, c in zip(self.keys, encrypted, self.choices)]
         
 
 
 
 
+
+
+'''
+Returns n pseudorandom bits, as an n-bit integer, expanded from a 16-byte seed with AES in counter mode. This is the PRG 
+G of OT extension.
+'''
+
+
+def _expand(seed, n):
+    stream = AES.new(seed, AES.MODE_CTR, nonce=b'').encrypt(bytes((n + 7) // 8))
+    return int.from_bytes(stream, 'big') >> (8 * len(stream) - n)
+
+
+'''
+Transpose a matrix of bits, given as a list of columns, each column an n-bit integer, into a list of n rows, each row 
+an integer with one bit per column (the bit of column i being bit i of the row). Row j holds the (n - 1 - j)th least 
+significant bit of each column, i.e. rows are numbered from the most significant end, like the bits of the choices.
+
+Rather than extracting len(columns) * n bits one at a time, we write out every column as a string of binary digits, 
+and let zip do the transposition.
+'''
+
+
+def _transpose(columns, n):
+    strings = ['{:0{}b}'.format(column, n) for column in reversed(columns)]
+    return [int(''.join(row), 2) for row in zip(*strings)]
+
+
+'''
+The sender (Alice) of the IKNP OT extension protocol (Ishai, Kilian, Nissim and Petrank, "Extending Oblivious 
+Transfers Efficiently").
+
+OT extension turns KAPPA "base" OTs, which need public-key cryptography, into any number of OTs which only need 
+symmetric-key cryptography (a PRG and a hash). The roles are reversed for the base OTs: Alice acts as the receiver, and 
+picks one of each of Bob's KAPPA pairs of seeds according to her secret KAPPA-bit string s.
+'''
+
+
+class ExtensionSender:
+
+    def __init__(self):
+        self.s = int.from_bytes(os.urandom(KAPPA // 8), 'big')  # secret!
+        self.seeds = []  # the seeds k_i^{s_i} that Alice picked in the base OTs. Secret, too!
+
+    '''
+    Returns Alice's choice bit for the ith base OT.
+    '''
+
+    def base_choice(self, i):
+        return (self.s >> i) & 1
+
+    '''
+    Given the KAPPA columns u_i = G(k_i^0) XOR G(k_i^1) XOR r that Bob sent, compute the columns 
+    q_i = G(k_i^{s_i}) XOR s_i u_i = t_i XOR s_i r, whose rows q_j = t_j XOR r_j s give the keys for each transfer: 
+    H(j, q_j) for message x_j^0 and H(j, q_j XOR s) for message x_j^1. Bob knows t_j, so he knows exactly one of the 
+    two keys, namely the one for x_j^{r_j}.
+
+    Returns the pairs of encrypted messages (y_j^0, y_j^1) to send to Bob.
+    '''
+
+    def encrypt(self, u, messages):
+        n = len(messages)
+        columns = [_expand(seed, n) ^ (u[i] if self.base_choice(i) else 0) for i, seed in enumerate(self.seeds)]
+        rows = _transpose(columns, n)
+        keys = []
+        for j, q in enumerate(rows):
+            keys.append((q, 0, j))
+            keys.append((q ^ self.s, 0, j))
+        pads = crypto_utils.fixed_key_hash_batch(keys)
+        return [(crypto_utils.to_int(m0) ^ pads[2 * j], crypto_utils.to_int(m1) ^ pads[2 * j + 1])
+                for j, (m0, m1) in enumerate(messages)]
+
+
+'''
+The receiver (Bob) of the IKNP OT extension protocol, with his choice bits r_1, ..., r_n, one per transfer.
+'''
+
+
+class ExtensionReceiver:
+
+    def __init__(self, choices):
+        self.choices = choices
+        self.n = len(choices)
+        self.r = int(''.join(str(c) for c in choices), 2) if choices else 0  # r_1 is the most significant bit
+        # Bob's KAPPA pairs of seeds for the base OTs, in which he is the sender
+        self.seeds = [(os.urandom(16), os.urandom(16)) for _ in range(KAPPA)]
+        self.t = []
+
+    '''
+    Expand the seeds into the KAPPA columns t_i = G(k_i^0), and return the columns u_i = t_i XOR G(k_i^1) XOR r, 
+    which Bob sends to Alice. Since Alice only knows one seed of each pair, u_i reveals nothing about r.
+    '''
+
+    def columns(self):
+        self.t = [_expand(k0, self.n) for k0, k1 in self.seeds]
+        return [t ^ _expand(k1, self.n) ^ self.r for t, (k0, k1) in zip(self.t, self.seeds)]
+
+    '''
+    Decrypt the message of his choice from each pair of encrypted messages, with the key H(j, t_j).
+    '''
+
+    def decrypt(self, encrypted):
+        rows = _transpose(self.t, self.n)
+        pads = crypto_utils.fixed_key_hash_batch([(t, 0, j) for j, t in enumerate(rows)])
+        return [label.Label(pair[choice] ^ pad) for pair, choice, pad in zip(encrypted, self.choices, pads)]
+
+
+'''
+Simulates the IKNP OT extension protocol for a whole batch of transfers at once: messages is a list of pairs (m0, m1) 
+held by Alice, the sender, and choices the list of Bob's corresponding choice bits. Only KAPPA base OTs (using 
+simplest_OT) are performed, whatever the number of transfers; every transfer after that costs two hashes for Alice and 
+one for Bob, all of which are computed with bulk fixed-key AES calls.
+
+Returns the list of messages Bob chose, as labels.
+'''
+
+
+def extended_OT(messages, choices):
+    if any(c not in (0, 1) for c in choices):
+        raise ValueError("The receiver must choose an index from (0, 1)")
+    if not choices:
+        return []
+    sender = ExtensionSender()
+    receiver = ExtensionReceiver(choices)
+
+    tracing.log(tracing.SUMMARY, "OT: Performing {} base OTs, in which Bob is the sender and Alice the receiver", KAPPA)
+    for i, (k0, k1) in enumerate(receiver.seeds):
+        seed = simplest_OT(k0, k1, sender.base_choice(i), verbose=False)
+        sender.seeds.append(seed.to_bytes())
+
+    u = receiver.columns()
+    tracing.log(tracing.SUMMARY, "OT: Bob expands his seeds, and transfers {} columns of {} bits to Alice", len(u),
+                receiver.n)
+    encrypted = sender.encrypt(u, messages)
+    tracing.log(tracing.SUMMARY, "OT: Alice encrypts her {} pairs of messages and transfers them to Bob", len(encrypted))
+    chosen = receiver.decrypt(encrypted)
+    tracing.log(tracing.SUMMARY, "OT: Bob decrypts the {} messages of his choice", len(chosen))
+    return chosen
+
+
+'''
+Alice's half of a pool of precomputed random OTs: for each random OT, the pair of random 128-bit values (r0, r1) that 
+she sent. Random OTs are used up in order, and must never be used twice.
+'''
+
+
+class SenderPool:
+
+    def __init__(self, pairs):
+        self.pairs = pairs  # secret!
+
+    def __len__(self):
+        return len(self.pairs)
+
+    '''
+    Answer Bob's derandomization bits e_j: mask each pair of messages (m0, m1) as (m0 XOR r_{e_j}, m1 XOR r_{1 - e_j}), 
+    using up the next random OTs of the pool. Returns the masked pairs to send to Bob.
+    '''
+
+    def respond(self, e_bits, messages):
+        if len(messages) > len(self.pairs):
+            raise ValueError("Only {} precomputed OTs are left, but {} are needed".format(len(self.pairs),
+                                                                                         len(messages)))
+        pairs, self.pairs = self.pairs[:len(messages)], self.pairs[len(messages):]
+        return [(crypto_utils.to_int(m0) ^ r[e], crypto_utils.to_int(m1) ^ r[1 - e])
+                for (m0, m1), r, e in zip(messages, pairs, e_bits)]
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(b''.join(r0.to_bytes(16, 'big') + r1.to_bytes(16, 'big') for r0, r1 in self.pairs))
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        return SenderPool([(int.from_bytes(data[i:i + 16], 'big'), int.from_bytes(data[i + 16:i + 32], 'big'))
+                           for i in range(0, len(data), 32)])
+
+
+'''
+Bob's half of a pool of precomputed random OTs: for each random OT, his random choice bit c and the value r_c he 
+received.
+'''
+
+
+class ReceiverPool:
+
+    def __init__(self, choices, values):
+        self.choices = choices  # secret!
+        self.values = values
+        self._pending = 0  # the number of random OTs used by derandomize, not yet consumed by receive
+
+    def __len__(self):
+        return len(self.choices)
+
+    '''
+    Returns the derandomization bits e_j = b_j XOR c_j for Bob's actual choice bits b_j, which he sends to Alice. 
+    Since c_j is uniformly random and unknown to Alice, e_j tells her nothing about b_j.
+    '''
+
+    def derandomize(self, choices):
+        if len(choices) > len(self.choices):
+            raise ValueError("Only {} precomputed OTs are left, but {} are needed".format(len(self.choices),
+                                                                                         len(choices)))
+        self._pending = len(choices)
+        return [b ^ c for b, c in zip(choices, self.choices)]
+
+    '''
+    Unmask the message of his choice from each pair Alice sent: if b_j = c_j, Alice masked m_{b_j} with r_{c_j}; 
+    otherwise e_j = 1 and she masked it with r_{1 - b_j}, which is r_{c_j} again. Either way, Bob XORs it with r_{c_j}.
+    '''
+
+    def receive(self, choices, masked):
+        values = self.values[:self._pending]
+        self.choices = self.choices[self._pending:]
+        self.values = self.values[self._pending:]
+        self._pending = 0
+        return [label.Label(pair[b] ^ r) for pair, b, r in zip(masked, choices, values)]
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(b''.join(bytes([c]) + r.to_bytes(16, 'big') for c, r in zip(self.choices, self.values)))
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        return ReceiverPool([data[i] for i in range(0, len(data), 17)],
+                            [int.from_bytes(data[i + 1:i + 17], 'big') for i in range(0, len(data), 17)])
+
+
+'''
+The offline phase: precompute n random OTs, before either party knows its inputs. Alice picks random pairs (r0, r1), 
+Bob picks random choice bits c, and they run OT extension so that Bob learns r_c. 
+
+Returns Alice's and Bob's halves of the pool.
+'''
+
+
+def random_OTs(n):
+    pairs = [(int.from_bytes(os.urandom(16), 'big'), int.from_bytes(os.urandom(16), 'big')) for _ in range(n)]
+    choices = [b & 1 for b in os.urandom(n)]
+    tracing.log(tracing.SUMMARY, "OT: Precomputing {} random OTs", n)
+    values = [l.value for l in extended_OT(pairs, choices)]
+    return SenderPool(pairs), ReceiverPool(choices, values)
+
+
+'''
+The online phase: transfer a batch of messages using up precomputed random OTs (Beaver's derandomization). Bob sends 
+one bit per transfer, and Alice answers with two XOR-masked messages; no cryptographic operation is needed at all.
+
+Returns the list of messages Bob chose, as labels.
+'''
+
+
+def precomputed_OT(sender_pool, receiver_pool, messages, choices):
+    if any(c not in (0, 1) for c in choices):
+        raise ValueError("The receiver must choose an index from (0, 1)")
+    e_bits = receiver_pool.derandomize(choices)
+    tracing.log(tracing.SUMMARY, "OT: Bob transfers {} derandomization bits e = b XOR c to Alice", len(e_bits))
+    masked = sender_pool.respond(e_bits, messages)
+    tracing.log(tracing.SUMMARY, "OT: Alice masks her {} pairs of messages with her precomputed random pairs and "
+                                 "transfers them to Bob", len(masked))
+    chosen = receiver_pool.receive(choices, masked)
+    tracing.log(tracing.SUMMARY, "OT: Bob unmasks the {} messages of his choice; {} precomputed OTs are left",
+                len(chosen), len(receiver_pool))
+    return chosen
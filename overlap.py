@@ -0,0 +1,262 @@
+import asyncio
+import time
+
+import network
+import tracing
+
+'''
+An asyncio driver for the two-party runtime of network.py, with the same messages, in which the phases of the protocol
+overlap instead of running one after the other. Alice garbles the gates one batch at a time (see Alice.garble_stream)
+and sends each batch as soon as it is garbled, while the OTs of Bob's input labels run alongside; Bob evaluates every
+gate whose input labels he already knows as soon as its table arrives, and only leaves the gates that depend on his
+inputs until the OTs are done. Since the parties run in separate processes, garbling, the transfer of the tables and
+evaluation all happen at once, so a run takes about as long as the slowest of them, rather than their sum.
+
+Within each party, the OTs and the tables take turns on a single thread: every message is read as soon as it arrives
+and put in the inbox of its kind, and the party's tasks pick up the messages they are waiting for in between batches of
+gates. Batches are therefore smaller than in network.py, so that neither party keeps the other waiting for an OT
+message for long.
+
+Traffic is counted by the kind of message (see PHASES), since the phases are not one after the other anymore; and
+timings are the time from the start of the run until each phase was over.
+'''
+
+# the phase of the protocol that each kind of message counts towards
+PHASES = {network.HELLO: 'setup', network.CIRCUIT: 'transfer', network.TABLES: 'stream',
+          network.INPUT_LABELS: 'inputs', network.OT_OPEN: 'inputs', network.OT_ANSWER: 'inputs',
+          network.OT_ENCRYPTED: 'inputs', network.OT_COLUMNS: 'inputs', network.OT_PAIRS: 'inputs',
+          network.OUTPUT_LABELS: 'outputs', network.RESULT: 'outputs'}
+TABLE_BATCH = 512
+
+
+'''
+A connection to the other party over asyncio streams, with the framing of network.Channel. A task reads every message
+as soon as it arrives, and puts it in the inbox of its kind, so that several tasks can each wait for their own kind of
+message.
+'''
+
+
+class AsyncChannel:
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._inbox = {kind: asyncio.Queue() for kind in PHASES}
+        self._traffic = network.Traffic()
+        self._receiving = asyncio.ensure_future(self._receive_all())
+
+    @staticmethod
+    async def open(sock):
+        return AsyncChannel(*await asyncio.open_connection(sock=sock, limit=network.BUFFER_BYTES))
+
+    async def _receive_all(self):
+        try:
+            while True:
+                kind, length = network.FRAME.unpack(await self._reader.readexactly(network.FRAME.size))
+                if kind not in self._inbox:
+                    raise ConnectionError("Received a message of unknown kind {}".format(kind))
+                self._inbox[kind].put_nowait(await self._reader.readexactly(length))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # wake up whoever is waiting for a message that will never come
+            for inbox in self._inbox.values():
+                inbox.put_nowait(None)
+
+    def send(self, kind, payload=b''):
+        self._writer.writelines([network.FRAME.pack(kind, len(payload)), payload])
+        self._traffic.sent(PHASES[kind], network.FRAME.size + len(payload))
+
+    '''
+    Wait until the messages sent so far have been handed over to the operating system, if there are too many of them,
+    and give the party's other tasks a chance to run.
+    '''
+
+    async def drain(self):
+        await self._writer.drain()
+        await asyncio.sleep(0)
+
+    async def receive(self, kind):
+        await self._writer.drain()
+        payload = await self._inbox[kind].get()
+        if payload is None:
+            raise ConnectionError("The other party closed the connection")
+        # counted once it is taken from the inbox, since messages of the next run may well arrive before this one ends
+        self._traffic.received(PHASES[kind], network.FRAME.size + len(payload))
+        return payload
+
+    def traffic(self):
+        traffic = self._traffic.report()
+        self._traffic = network.Traffic()
+        return traffic
+
+    async def close(self):
+        self._receiving.cancel()
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+'''
+Run either side of the OTs (see network.OTSender and network.OTReceiver) over the channel, until it is done.
+'''
+
+
+async def run_ot(channel, party):
+    for kind, payload in party.start():
+        channel.send(kind, payload)
+    while party.expecting is not None:
+        for kind, payload in party.handle(await channel.receive(party.expecting)):
+            channel.send(kind, payload)
+    await channel.drain()
+
+
+'''
+Alice's side of one run of the protocol: she sends the structure of the circuit and the labels of her inputs, and then
+garbles the gates and sends their tables while the OTs run. Returns the values of the output wires, the timings and the
+traffic of each phase.
+'''
+
+
+async def run_alice(channel, circuit, alice, bob_wires):
+    timings = dict()
+    start = time.perf_counter()
+    alice.circuit = circuit
+    tracing.log(tracing.SUMMARY, "\nAlice generates labels for the input wires of the circuit:")
+    alice.prepare_labels()
+    timings['garble'] = time.perf_counter() - start
+
+    tracing.log(tracing.SUMMARY, "\nAlice sends the structure of the circuit and the labels of her inputs to Bob.")
+    channel.send(network.CIRCUIT, network.encode_circuit(circuit, bob_wires))
+    timings['transfer'] = time.perf_counter() - start
+    wires = [circuit.wire_ids[wire] for wire in alice.input_wires]
+    channel.send(network.INPUT_LABELS, network.encode_labels(
+        wires, [alice.input_labels(w)[v] for w, v in zip(wires, alice.input_wires.values())]))
+
+    async def send_inputs():
+        await run_ot(channel, network.OTSender([alice.input_labels(w) for w in bob_wires]))
+        timings['inputs'] = time.perf_counter() - start
+
+    inputs = asyncio.ensure_future(send_inputs())
+    tracing.log(tracing.SUMMARY, "\nAlice garbles the gates, {} at a time, and sends their tables to Bob while the "
+                                 "labels of his inputs are transferred by OT:", TABLE_BATCH)
+    for payload in network.encode_tables(alice.garble_stream(), TABLE_BATCH):
+        channel.send(network.TABLES, payload)
+        await channel.drain()
+    timings['stream'] = time.perf_counter() - start
+    await inputs
+
+    output_labels = network.decode_output_labels(await channel.receive(network.OUTPUT_LABELS))
+    tracing.log(tracing.SUMMARY, "\nAlice reveals the values of the labels that Bob computed as the circuit's outputs:")
+    outputs = alice.reveal_result(output_labels)
+    channel.send(network.RESULT, bytes(outputs))
+    await channel.drain()
+    timings['outputs'] = time.perf_counter() - start
+
+    traffic = channel.traffic()
+    network.report("ALICE", traffic)
+    return outputs, timings, traffic
+
+
+'''
+Bob's side of one run of the protocol: he evaluates each gate as soon as its table arrives, if he knows the labels of
+its inputs by then, and otherwise puts it aside until the OTs are done. Since the tables arrive in topological order,
+the gates put aside can then be evaluated in the order in which they arrived. Returns the values of the output wires,
+the timings and the traffic of each phase.
+'''
+
+
+async def run_bob(channel, bob, values):
+    timings = dict()
+    start = time.perf_counter()
+    circuit, bob_wires = network.decode_circuit(await channel.receive(network.CIRCUIT))
+    if len(values) != len(bob_wires):
+        raise ValueError("Bob has {} input bits, but the circuit has {} input wires for him".format(len(values),
+                                                                                                  len(bob_wires)))
+    bob.receive_circuit(circuit)
+    bob.input_wires = dict(zip(bob_wires, values))
+    timings['transfer'] = time.perf_counter() - start
+    known_labels = bob.known_labels
+    for w, l in network.decode_labels(await channel.receive(network.INPUT_LABELS)):
+        known_labels[w] = l
+
+    async def receive_inputs():
+        receiver = network.OTReceiver(values)
+        await run_ot(channel, receiver)
+        for w, l in zip(bob_wires, receiver.labels):
+            known_labels[w] = l
+        timings['inputs'] = time.perf_counter() - start
+
+    inputs = asyncio.ensure_future(receive_inputs())
+    tracing.log(tracing.SUMMARY, "\nBob evaluates each gate as soon as its table arrives and its input labels are "
+                                 "known, while the labels of his inputs are transferred by OT:")
+    bob._start_evaluation(circuit.offsets)
+    gates = circuit.gates
+    waiting = []
+    early = 0
+    remaining = len(gates)
+    while remaining:
+        for gate_id, table in network.decode_tables(await channel.receive(network.TABLES)):
+            gate = gates[gate_id]
+            gate.table = table
+            if known_labels[gate.in1_id] is None or known_labels[gate.in2_id] is None:
+                waiting.append(gate)
+            else:
+                known_labels[gate.out_id] = bob._evaluate(gate)
+                gate.table = None
+                if not inputs.done():
+                    early += 1
+            remaining -= 1
+        if waiting and inputs.done():
+            _evaluate_waiting(bob, waiting)
+        await asyncio.sleep(0)
+    await inputs
+    _evaluate_waiting(bob, waiting)
+    timings['stream'] = time.perf_counter() - start
+    tracing.log(tracing.SUMMARY, "BOB: Evaluated {} of the {} gates before the OTs were done", early, len(gates))
+
+    channel.send(network.OUTPUT_LABELS, network.encode_output_labels([known_labels[w] for w in circuit.output_wires]))
+    outputs = list(await channel.receive(network.RESULT))
+    tracing.log(tracing.SUMMARY, "BOB: Alice reveals that the outputs of the circuit are {}", ''.join(map(str, outputs)))
+    timings['outputs'] = time.perf_counter() - start
+
+    traffic = channel.traffic()
+    network.report("BOB", traffic)
+    return outputs, timings, traffic
+
+
+def _evaluate_waiting(bob, waiting):
+    for gate in waiting:
+        bob.known_labels[gate.out_id] = bob._evaluate(gate)
+        gate.table = None
+    waiting.clear()
+
+
+'''
+Alice's side of a session with Bob, as network.serve_alice, but with the phases of each run overlapping.
+'''
+
+
+async def serve_alice(sock, circuit, bob_wires, output_sizes, runs, new_alice, done):
+    channel = await AsyncChannel.open(sock)
+    try:
+        channel.send(network.HELLO, network.encode_hello(runs, len(bob_wires), output_sizes, network.OVERLAPPED))
+        for run in range(runs):
+            done(run, *await run_alice(channel, circuit, new_alice(run), bob_wires))
+    finally:
+        await channel.close()
+
+
+'''
+Bob's side of a session with Alice, as network.serve_bob, but with the phases of each run overlapping.
+'''
+
+
+async def serve_bob(sock, new_bob, inputs, done):
+    channel = await AsyncChannel.open(sock)
+    try:
+        protocol, runs, bob_inputs, output_sizes = network.decode_hello(await channel.receive(network.HELLO))
+        if not protocol & network.OVERLAPPED:
+            raise ValueError("Alice runs the phases of the protocol one after the other, so Bob must as well "
+                             "(without --overlap)")
+        for run, values in enumerate(inputs(runs, bob_inputs)):
+            done(run, values, output_sizes, *await run_bob(channel, new_bob(), values))
+    finally:
+        await channel.close()
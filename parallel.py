@@ -0,0 +1,208 @@
+import gc
+import math
+import multiprocessing
+import os
+
+import config
+import label
+import tracing
+
+'''
+Garbles and evaluates a circuit with a pool of worker processes, one dependency layer at a time.
+
+Gates in the same layer never depend on one another (see Circuit.layers), so each layer is cut into chunks of
+consecutive gates, which the workers garble (or evaluate) at the same time, with the very same methods Alice (or Bob)
+uses on her own. Only the labels of free-XOR-style gates depend on labels computed earlier, and those always come from
+an earlier layer. Every gate's result depends on nothing but its inputs, so the result is the same whatever the number
+of processes, and however the chunks are scheduled.
+
+Labels and garbled tables are not pickled back and forth as Label objects: they live in shared buffers of raw bytes,
+which every process maps into memory.
+ - when garbling, the labels buffer holds the two 16-byte labels of every wire, indexed by wire id, the tables buffer
+   holds up to MAX_ROWS 16-byte ciphertexts per gate, indexed by gate id, and the rows buffer holds how many of them
+   each gate uses,
+ - when evaluating, the labels buffer holds the one 16-byte label Bob knows for every wire, and the tables are only
+   read, so they need no buffer.
+A worker reads the labels of its gates' input wires from the labels buffer, and writes the labels of their output wires
+(and their tables) into the buffers; the only thing sent to a worker is which chunk of which layer to work on.
+
+The workers are forked once the circuit, and the labels of its input wires, are known, so they inherit Alice's (or
+Bob's) state without pickling it. This requires a platform on which processes can be forked. Processes rather than
+threads, since garbling and evaluating a gate is mostly Python code, which holds the GIL.
+'''
+
+LABEL_BYTES = 16
+MAX_ROWS = 4
+
+# a layer is cut into about this many chunks per process, so that processes that finish early can pick up more work
+CHUNKS_PER_PROCESS = 4
+# chunks are never smaller than this, so that each chunk is worth the round trip to a worker; layers that would fit in
+# a single chunk are garbled by Alice's own process
+MIN_CHUNK_GATES = 256
+
+# the state that the worker processes inherit when they are forked: the garbler or evaluator, the layers and the shared
+# buffers
+_state = dict()
+
+
+def _write_labels(labels, w, pair):
+    position = 2 * LABEL_BYTES * w
+    labels[position:position + LABEL_BYTES] = pair[0].to_bytes()
+    labels[position + LABEL_BYTES:position + 2 * LABEL_BYTES] = pair[1].to_bytes()
+
+
+def _read_labels(labels, w):
+    position = 2 * LABEL_BYTES * w
+    return (label.from_bytes(labels[position:position + LABEL_BYTES]),
+            label.from_bytes(labels[position + LABEL_BYTES:position + 2 * LABEL_BYTES]))
+
+
+'''
+Garble the gates of the given chunk (layer, start, end), i.e. the gates layers[layer][start:end], reading their input
+labels from the shared buffers and writing their output labels and tables back into them.
+'''
+
+
+def _garble_chunk(chunk):
+    alice = _state['alice']
+    labels, tables, rows = _state['labels'], _state['tables'], _state['rows']
+    layer, start, end = chunk
+    gates = _state['layers'][layer][start:end]
+
+    for w in {w for gate in gates for w in (gate.in1_id, gate.in2_id)}:
+        alice.wire_labels[w] = _read_labels(labels, w)
+        if config.USE_FLEXOR:
+            # the offset of a class whose labels are fixed by a GRR2 gate is only known once that gate is garbled,
+            # possibly by another process; but it is always the difference between the two labels of its wires
+            alice.deltas[alice.circuit.offsets[w]] = alice.wire_labels[w][0].value ^ alice.wire_labels[w][1].value
+
+    if config.USE_BATCHED_GARBLING:
+        alice.garble_layer(gates)
+    else:
+        for gate in gates:
+            alice.garble_gate(gate)
+
+    for gate in gates:
+        _write_labels(labels, gate.out_id, alice.wire_labels[gate.out_id])
+        position = MAX_ROWS * LABEL_BYTES * gate.id
+        for entry in gate.table:
+            tables[position:position + LABEL_BYTES] = entry.to_bytes(LABEL_BYTES, 'big')
+            position += LABEL_BYTES
+        rows[gate.id] = len(gate.table)
+
+
+'''
+Evaluate the gates of the given chunk (layer, start, end) for Bob: read the labels of their input wires from the shared 
+buffer, and write the labels of their output wires back into it.
+'''
+
+
+def _evaluate_chunk(chunk):
+    bob = _state['bob']
+    labels = _state['labels']
+    layer, start, end = chunk
+    gates = _state['layers'][layer][start:end]
+
+    for w in {w for gate in gates for w in (gate.in1_id, gate.in2_id)}:
+        bob.known_labels[w] = label.from_bytes(labels[LABEL_BYTES * w:LABEL_BYTES * (w + 1)])
+
+    if config.USE_BATCHED_GARBLING:
+        bob._evaluate_layer(gates)
+    else:
+        for gate in gates:
+            bob.known_labels[gate.out_id] = bob._evaluate(gate)
+
+    for gate in gates:
+        labels[LABEL_BYTES * gate.out_id:LABEL_BYTES * (gate.out_id + 1)] = bob.known_labels[gate.out_id].to_bytes()
+
+
+'''
+Cut a layer of the given number of gates into chunks for the given number of processes.
+'''
+
+
+def _chunks(layer, size, processes):
+    chunk_size = max(MIN_CHUNK_GATES, math.ceil(size / (processes * CHUNKS_PER_PROCESS)))
+    return [(layer, start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+
+
+'''
+Work through the layers in order with a pool of the given number of processes, which are forked with the given state: 
+the chunks of each layer are handed out to the processes with the given function, and the next layer starts once they 
+are all done.
+'''
+
+
+def _run(layers, processes, work, **state):
+    _state.update(state, layers=layers)
+    # Move every object allocated so far out of the garbage collector's reach, so that collections in the workers
+    # don't touch (and thereby copy) the memory pages they share with the parent process.
+    gc.freeze()
+    try:
+        # the workers are forked here, and print nothing: interleaving their output would make no sense anyway
+        context = multiprocessing.get_context('fork')
+        with tracing.at_level(tracing.OFF), context.Pool(processes) as pool:
+            for i, layer in enumerate(layers):
+                chunks = _chunks(i, len(layer), processes)
+                if len(chunks) == 1:
+                    work(chunks[0])
+                else:
+                    pool.map(work, chunks)
+    finally:
+        gc.unfreeze()
+        _state.clear()
+
+
+'''
+Garble the gates of Alice's circuit with the given number of processes (by default config.PARALLEL_PROCESSES, or one
+per core). The labels of the circuit's input wires must already have been generated. Requires single-pass garbling
+(see config.USE_SINGLE_PASS_PERMUTE), since the rows of each table must be in their final order by the time a worker
+hands the table back.
+'''
+
+
+def garble(alice, processes=None):
+    circuit = alice.circuit
+    processes = processes or config.PARALLEL_PROCESSES or os.cpu_count()
+    labels = memoryview(multiprocessing.RawArray('B', 2 * LABEL_BYTES * len(circuit.wires))).cast('B')
+    tables = memoryview(multiprocessing.RawArray('B', MAX_ROWS * LABEL_BYTES * len(circuit.gates))).cast('B')
+    rows = multiprocessing.RawArray('B', len(circuit.gates))
+    for w in circuit.input_wires:
+        _write_labels(labels, w, alice.wire_labels[w])
+
+    layers = circuit.layers()
+    tracing.log(tracing.SUMMARY, "ALICE: Garbling {} gates in {} layers with {} processes", len(circuit.gates),
+                len(layers), processes)
+    _run(layers, processes, _garble_chunk, alice=alice, labels=labels, tables=tables, rows=rows)
+
+    for gate in circuit.gates:
+        alice.wire_labels[gate.out_id] = _read_labels(labels, gate.out_id)
+        position = MAX_ROWS * LABEL_BYTES * gate.id
+        gate.table = [int.from_bytes(tables[position + LABEL_BYTES * i:position + LABEL_BYTES * (i + 1)], 'big')
+                      for i in range(rows[gate.id])]
+        if config.USE_FLEXOR:
+            alice.deltas[circuit.offsets[gate.out_id]] = (alice.wire_labels[gate.out_id][0].value ^
+                                                          alice.wire_labels[gate.out_id][1].value)
+
+
+'''
+Evaluate the gates of Bob's garbled circuit with the given number of processes (by default config.PARALLEL_PROCESSES, 
+or one per core). The labels of the circuit's input wires must already be known, and Bob's evaluation methods chosen. 
+Only the labels of the circuit's output wires are copied back into Bob's known labels.
+'''
+
+
+def evaluate(bob, processes=None):
+    circuit = bob.circuit
+    processes = processes or config.PARALLEL_PROCESSES or os.cpu_count()
+    labels = memoryview(multiprocessing.RawArray('B', LABEL_BYTES * len(circuit.wires))).cast('B')
+    for w in circuit.input_wires:
+        labels[LABEL_BYTES * w:LABEL_BYTES * (w + 1)] = bob.known_labels[w].to_bytes()
+
+    layers = circuit.layers()
+    tracing.log(tracing.SUMMARY, "BOB: Evaluating {} gates in {} layers with {} processes", len(circuit.gates),
+                len(layers), processes)
+    _run(layers, processes, _evaluate_chunk, bob=bob, labels=labels)
+
+    for w in circuit.output_wires:
+        bob.known_labels[w] = label.from_bytes(labels[LABEL_BYTES * w:LABEL_BYTES * (w + 1)])
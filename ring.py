@@ -0,0 +1,129 @@
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+'''
+A ring buffer in shared memory, through which Alice hands the garbled tables over to Bob when both run on the same
+host, instead of pushing them through the socket (see network.py). Alice copies each batch of tables into the ring with
+a single slice assignment, and only tells Bob where it is, over the socket; Bob decodes the tables in place, through a
+memoryview of the ring, and then releases the space they took, so that Alice can reuse it.
+
+The shared memory block starts with a header of HEADER_BYTES bytes, of which Bob writes the first 8: how many bytes of
+the ring he has released so far, which only ever grows. The rest is the ring itself. Batches are written one after the
+other, each in a single piece: one that would not fit before the end of the ring starts back at its beginning. Positions
+in the ring are counted from the first byte ever written, like the bytes released, and wrap around modulo its capacity.
+'''
+
+RELEASED = struct.Struct('<Q')
+HEADER_BYTES = 64
+# how long Alice sleeps between checks for free space, in seconds, when the ring is full
+POLL_INTERVAL = 0.0002
+
+
+'''
+Alice's end of the ring: she creates the shared memory block, and must unlink it once she is done with it (close does).
+'''
+
+
+class RingWriter:
+
+    def __init__(self, capacity):
+        self._memory = shared_memory.SharedMemory(create=True, size=HEADER_BYTES + capacity)
+        self._header = self._memory.buf[:HEADER_BYTES]
+        self._ring = self._memory.buf[HEADER_BYTES:HEADER_BYTES + capacity]
+        self.name = self._memory.name
+        self.capacity = capacity
+        self._written = 0
+        RELEASED.pack_into(self._header, 0, 0)
+
+    '''
+    Copy the given payload into the ring, and return its position, to tell Bob. If there isn't enough free space,
+    call wait (which must make sure Bob knows about everything written so far) and then wait until Bob releases enough.
+    '''
+
+    def write(self, payload, wait):
+        length = len(payload)
+        if length > self.capacity:
+            raise ValueError("A batch of {} bytes does not fit in a ring of {} bytes".format(length, self.capacity))
+        offset = self._written % self.capacity
+        if offset + length > self.capacity:
+            # skip the end of the ring
+            self._written += self.capacity - offset
+            offset = 0
+        if self._written + length - self._released() > self.capacity:
+            wait()
+            while self._written + length - self._released() > self.capacity:
+                time.sleep(POLL_INTERVAL)
+        self._ring[offset:offset + length] = payload
+        position = self._written
+        self._written += length
+        return position
+
+    def _released(self):
+        return RELEASED.unpack_from(self._header)[0]
+
+    def close(self):
+        self._header.release()
+        self._ring.release()
+        self._memory.close()
+        self._memory.unlink()
+
+
+'''
+Bob's end of the ring, attached to the shared memory block Alice created, by its name.
+'''
+
+
+class RingReader:
+
+    def __init__(self, name, capacity):
+        self._memory = _attach(name)
+        self._header = self._memory.buf[:HEADER_BYTES]
+        self._ring = self._memory.buf[HEADER_BYTES:HEADER_BYTES + capacity]
+        self.capacity = capacity
+
+    '''
+    A view of the payload of the given length that Alice wrote at the given position. It must be released before
+    release is called, since Alice may then write over it.
+    '''
+
+    def read(self, position, length):
+        offset = position % self.capacity
+        return self._ring[offset:offset + length]
+
+    '''
+    Let Alice reuse everything up to the end of the payload of the given length at the given position.
+    '''
+
+    def release(self, position, length):
+        RELEASED.pack_into(self._header, 0, position + length)
+
+    def close(self):
+        self._header.release()
+        self._ring.release()
+        self._memory.close()
+
+
+'''
+Attach to the shared memory block with the given name, without registering it with this process's resource tracker: 
+the tracker would unlink the block (with a warning) when the process exits, although it is Alice's to unlink. Python 
+3.13 can be told not to register it; before that, SharedMemory always does, so the registration is skipped by briefly 
+replacing resource_tracker.register, which only works with CPython's implementation of shared_memory.
+'''
+
+
+def _attach(name):
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+
+    def register_others(resource, resource_type):
+        if resource_type != 'shared_memory':
+            register(resource, resource_type)
+
+    resource_tracker.register = register_others
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
@@ -0,0 +1,55 @@
+import contextlib
+
+import config
+
+'''
+Tracing of the protocol, at one of several levels of detail:
+ - OFF prints nothing at all,
+ - SUMMARY prints the phases of the protocol, and the result,
+ - GATE also prints a line or two for every gate garbled or evaluated, and for every OT,
+ - ROW also prints every row of every garbled table: this is the full step-by-step output of the written tutorial.
+
+Messages are only formatted if their level is enabled, so that a disabled level costs no string formatting, and no
+conversion of labels or ciphertexts to hexadecimal. Pass the values to log() as arguments, rather than formatting them
+yourself. In the hottest loops, check config.TRACE_LEVEL directly before even calling log().
+'''
+
+OFF = 0
+SUMMARY = 1
+GATE = 2
+ROW = 3
+
+LEVELS = {'off': OFF, 'summary': SUMMARY, 'gate': GATE, 'row': ROW}
+
+'''
+Print the message, formatted with the given arguments, if tracing is enabled at the given level.
+'''
+
+
+def log(level, message, *args):
+    if config.TRACE_LEVEL >= level:
+        print(message.format(*args) if args else message)
+
+
+'''
+Returns whether tracing is enabled at the given level.
+'''
+
+
+def enabled(level):
+    return config.TRACE_LEVEL >= level
+
+
+'''
+Trace at the given level within a with block, e.g. to silence the protocol while benchmarking it.
+'''
+
+
+@contextlib.contextmanager
+def at_level(level):
+    saved = config.TRACE_LEVEL
+    config.TRACE_LEVEL = level
+    try:
+        yield
+    finally:
+        config.TRACE_LEVEL = saved